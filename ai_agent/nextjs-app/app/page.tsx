@@ -7,10 +7,10 @@ import UsersTable from '@/components/UsersTable'
 import ActionButtons from '@/components/ActionButtons'
 import Header from '@/components/Header'
 import Footer from '@/components/Footer'
-import { User, Message } from '@/types'
+import { ProcessedUpload, Message } from '@/types'
 
 export default function Home() {
-  const [processedUsers, setProcessedUsers] = useState<User[] | null>(null)
+  const [upload, setUpload] = useState<ProcessedUpload | null>(null)
   const [messages, setMessages] = useState<Message[]>([])
   const [isLoading, setIsLoading] = useState(false)
   const [showChat, setShowChat] = useState(false)
@@ -26,17 +26,17 @@ export default function Home() {
     }
   }, [])
 
-  const handleFileProcessed = (users: User[]) => {
-    setProcessedUsers(users)
+  const handleFileProcessed = (processed: ProcessedUpload) => {
+    setUpload(processed)
   }
 
   const handleUsersUpdated = () => {
     // Optionally clear processed users after update
-    // setProcessedUsers(null)
+    // setUpload(null)
   }
 
   const handleClearData = () => {
-    setProcessedUsers(null)
+    setUpload(null)
   }
 
   return (
@@ -48,7 +48,7 @@ export default function Home() {
         <div className="mb-6 flex flex-wrap items-center justify-between gap-4">
           <div className="flex flex-wrap gap-3">
             <ActionButtons
-              users={processedUsers || []}
+              upload={upload}
               onUsersUpdated={handleUsersUpdated}
               onClearData={handleClearData}
             />
@@ -65,8 +65,8 @@ export default function Home() {
         </div>
 
         {/* Users Table */}
-        {processedUsers && processedUsers.length > 0 ? (
-          <UsersTable users={processedUsers} />
+        {upload && upload.count > 0 ? (
+          <UsersTable uploadId={upload.upload_id} />
         ) : (
           <div className="bg-white rounded-lg shadow-sm border border-gray-200 p-12 text-center">
             <p className="text-gray-500 text-lg">
@@ -92,7 +92,7 @@ export default function Home() {
                 <ChatInterface
                   messages={messages}
                   setMessages={setMessages}
-                  processedUsers={processedUsers}
+                  uploadId={upload?.upload_id ?? null}
                   isLoading={isLoading}
                   setIsLoading={setIsLoading}
                 />
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark: encoding and decoding of large user payloads.
+
+Usage:
+    python benchmark_serialization.py [--sizes 10000 100000] [--repeat 3]
+
+For each size it times, in process:
+  - response encoding: json + jsonable_encoder (FastAPI's default) vs encode_json
+  - request decoding: the pydantic UpdateUsersRequest vs decode_update_users
+  - a full request/response round trip through FastAPI (TestClient), with a
+    pydantic List[Dict] endpoint and with the msgspec/FastJSONResponse one
+
+The round trips echo the users back, so they measure the serialization stack
+rather than the user service.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from serialization import FastJSONResponse, decode_update_users, encode_json, msgspec, orjson
+
+
+class UpdateUsersRequest(BaseModel):
+    users: Optional[List[Dict]] = None
+    upload_id: Optional[str] = None
+    full: bool = False
+
+
+def make_users(count: int) -> List[Dict]:
+    """Synthetic users shaped like ExcelProcessor output."""
+    return [
+        {
+            'id': str(i),
+            'data': {
+                'name': f"User {i}",
+                'email': f"user{i}@example.com",
+                'phone': f"555-{i % 1000:03d}-{i % 10000:04d}",
+                'role': 'admin' if i % 10 == 0 else 'user',
+                'status': 'active',
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(func, repeat: int) -> float:
+    """Best wall time of `repeat` calls, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/pydantic")
+    async def echo_pydantic(request: UpdateUsersRequest):
+        return {"users": request.users, "count": len(request.users or [])}
+
+    @app.post("/fast", response_class=FastJSONResponse)
+    async def echo_fast(request: Request):
+        body = decode_update_users(await request.body(), UpdateUsersRequest)
+        payload = {"users": body['users'], "count": len(body['users'] or [])}
+        return FastJSONResponse(content=payload)
+
+    return app
+
+
+def report(label: str, seconds: float, count: int):
+    print(f"  {label:<38} {seconds * 1000:9.1f} ms  {count / seconds:12,.0f} users/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    encoder = 'orjson' if orjson is not None else 'msgspec' if msgspec is not None else 'json'
+    decoder = 'msgspec' if msgspec is not None else 'pydantic'
+    print(f"encode_json uses {encoder}; decode_update_users uses {decoder}")
+    client = TestClient(build_app())
+
+    for count in args.sizes:
+        users = make_users(count)
+        payload = {'users': users, 'full': False}
+        body = json.dumps(payload).encode('utf-8')
+        print(f"\n{count:,} users ({len(body) / 1e6:.1f} MB of JSON)")
+
+        report("encode: jsonable_encoder + json", best_of(
+            lambda: json.dumps(jsonable_encoder(payload)).encode('utf-8'), args.repeat), count)
+        report(f"encode: encode_json ({encoder})", best_of(lambda: encode_json(payload), args.repeat), count)
+        report("decode: pydantic List[Dict]", best_of(
+            lambda: UpdateUsersRequest.model_validate_json(body), args.repeat), count)
+        report(f"decode: decode_update_users ({decoder})", best_of(
+            lambda: decode_update_users(body, UpdateUsersRequest), args.repeat), count)
+
+        headers = {'Content-Type': 'application/json'}
+        for path in ('/pydantic', '/fast'):
+            def round_trip():
+                response = client.post(path, content=body, headers=headers)
+                response.raise_for_status()
+                assert response.json()['count'] == count
+            report(f"round trip: {path}", best_of(round_trip, args.repeat), count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""Background job subsystem for long-running user updates."""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Tuple
+
+from user_table import user_ids
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_CANCELLED = "cancelled"
+JOB_FAILED = "failed"
+FINISHED_STATUSES = {JOB_COMPLETED, JOB_CANCELLED, JOB_FAILED}
+
+
+class JobStore(ABC):
+    """
+    Interface for job state storage.
+
+    Finished jobs and their results are kept for finished_ttl_seconds, and at
+    most max_finished_jobs of them; older ones are pruned when a job is created.
+    """
+
+    def __init__(self, max_finished_jobs: int = 1000, finished_ttl_seconds: float = 24 * 3600):
+        self.max_finished_jobs = max(0, max_finished_jobs)
+        self.finished_ttl_seconds = finished_ttl_seconds
+
+    def expired_job_ids(self, jobs: List[Dict]) -> List[str]:
+        """Ids of the finished jobs that are past the TTL or beyond max_finished_jobs, oldest first."""
+        finished = sorted((job for job in jobs if job["status"] in FINISHED_STATUSES),
+                          key=lambda job: job["updated_at"])
+        cutoff = time.time() - self.finished_ttl_seconds
+        excess = len(finished) - self.max_finished_jobs
+        return [job["job_id"] for i, job in enumerate(finished) if i < excess or job["updated_at"] < cutoff]
+
+    def close(self):
+        """Release background resources; the store stays readable."""
+
+    @abstractmethod
+    def create(self, job_id: str, total: int) -> Dict:
+        """Create a queued job and return it."""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return a copy of the job, or None if it does not exist."""
+
+    @abstractmethod
+    def update(self, job_id: str, **fields):
+        """Set fields of the job and bump its updated_at."""
+
+    @abstractmethod
+    def add_results(self, job_id: str, results: Dict[str, bool]):
+        """Record per-user results and bump the processed/successful/failed counters."""
+
+    @abstractmethod
+    def get_results(self, job_id: str, offset: int = 0, limit: Optional[int] = None,
+                    failed_only: bool = False) -> Dict[str, bool]:
+        """Return the per-user results of the job (or only the failures), optionally one page of them."""
+
+    @staticmethod
+    def new_job(job_id: str, total: int) -> Dict:
+        now = time.time()
+        return {
+            "job_id": job_id,
+            "status": JOB_QUEUED,
+            "total": total,
+            "processed": 0,
+            "successful": 0,
+            "failed": 0,
+            "unchanged": 0,
+            "skipped": 0,
+            "cancel_requested": False,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+
+class InMemoryJobStore(JobStore):
+    """Job store kept in process memory; state is lost on restart."""
+
+    def __init__(self, max_finished_jobs: int = 1000, finished_ttl_seconds: float = 24 * 3600):
+        super().__init__(max_finished_jobs, finished_ttl_seconds)
+        self.jobs = {}
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def create(self, job_id: str, total: int) -> Dict:
+        job = self.new_job(job_id, total)
+        with self.lock:
+            for expired_id in self.expired_job_ids(list(self.jobs.values())):
+                del self.jobs[expired_id]
+                del self.results[expired_id]
+            self.jobs[job_id] = job
+            self.results[job_id] = {}
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id: str, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields, updated_at=time.time())
+
+    def add_results(self, job_id: str, results: Dict[str, bool]):
+        successful = sum(1 for success in results.values() if success)
+        with self.lock:
+            job = self.jobs[job_id]
+            self.results[job_id].update(results)
+            job["processed"] += len(results)
+            job["successful"] += successful
+            job["failed"] += len(results) - successful
+            job["updated_at"] = time.time()
+
+    def get_results(self, job_id: str, offset: int = 0, limit: Optional[int] = None,
+                    failed_only: bool = False) -> Dict[str, bool]:
+        with self.lock:
+            items = [(user_id, success) for user_id, success in self.results.get(job_id, {}).items()
+                     if not (failed_only and success)]
+        end = None if limit is None else offset + limit
+        return dict(items[offset:end])
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Job store persisted in a SQLite database, shared across workers and restarts.
+
+    Every process that opens the store is a worker with its own id, stamped on
+    the jobs it creates. Workers record a heartbeat every heartbeat_seconds;
+    unfinished jobs of a worker silent for stale_seconds are failed as
+    interrupted, so starting a worker never fails jobs a live one is running.
+    """
+
+    def __init__(self, path: str = "jobs.db", max_finished_jobs: int = 1000,
+                 finished_ttl_seconds: float = 24 * 3600, heartbeat_seconds: float = 10,
+                 stale_seconds: float = 60):
+        super().__init__(max_finished_jobs, finished_ttl_seconds)
+        self.path = path
+        # pid alone is not unique across restarts (e.g. pid 1 in a container)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = max(stale_seconds, 2 * heartbeat_seconds)
+        self.stopped = threading.Event()
+        self.heartbeat_thread = None
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_results (
+                    job_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    success INTEGER NOT NULL,
+                    PRIMARY KEY (job_id, user_id)
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS workers (
+                    worker_id TEXT PRIMARY KEY,
+                    heartbeat_at REAL NOT NULL
+                )
+            """)
+        self.heartbeat()
+
+    def _write(self, job: Dict):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, data) VALUES (?, ?)",
+            (job["job_id"], json.dumps(job))
+        )
+
+    def _read(self, job_id: str) -> Optional[Dict]:
+        row = self.conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def create(self, job_id: str, total: int) -> Dict:
+        job = dict(self.new_job(job_id, total), worker_id=self.worker_id)
+        with self.lock, self.conn:
+            jobs = [json.loads(row["data"]) for row in self.conn.execute("SELECT data FROM jobs").fetchall()]
+            expired = [(expired_id,) for expired_id in self.expired_job_ids(jobs)]
+            self.conn.executemany("DELETE FROM job_results WHERE job_id = ?", expired)
+            self.conn.executemany("DELETE FROM jobs WHERE job_id = ?", expired)
+            self._write(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self.lock:
+            return self._read(job_id)
+
+    def update(self, job_id: str, **fields):
+        with self.lock, self.conn:
+            job = self._read(job_id)
+            job.update(fields, updated_at=time.time())
+            self._write(job)
+
+    def add_results(self, job_id: str, results: Dict[str, bool]):
+        successful = sum(1 for success in results.values() if success)
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO job_results (job_id, user_id, success) VALUES (?, ?, ?)",
+                [(job_id, str(user_id), int(bool(success))) for user_id, success in results.items()]
+            )
+            job = self._read(job_id)
+            job["processed"] += len(results)
+            job["successful"] += successful
+            job["failed"] += len(results) - successful
+            job["updated_at"] = time.time()
+            self._write(job)
+
+    def get_results(self, job_id: str, offset: int = 0, limit: Optional[int] = None,
+                    failed_only: bool = False) -> Dict[str, bool]:
+        where = "job_id = ? AND success = 0" if failed_only else "job_id = ?"
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT user_id, success FROM job_results WHERE {where} ORDER BY rowid LIMIT ? OFFSET ?",
+                (job_id, -1 if limit is None else limit, offset)
+            ).fetchall()
+        return {row["user_id"]: bool(row["success"]) for row in rows}
+
+    def heartbeat(self):
+        """Record that this worker is alive."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, heartbeat_at) VALUES (?, ?)",
+                (self.worker_id, time.time())
+            )
+
+    def mark_interrupted(self):
+        """Fail jobs left queued/running by workers that stopped sending heartbeats."""
+        cutoff = time.time() - self.stale_seconds
+        with self.lock, self.conn:
+            live = {row["worker_id"] for row in self.conn.execute(
+                "SELECT worker_id FROM workers WHERE heartbeat_at >= ?", (cutoff,)
+            ).fetchall()}
+            for row in self.conn.execute("SELECT data FROM jobs").fetchall():
+                job = json.loads(row["data"])
+                # Jobs from before worker ids were recorded have none and count as orphaned
+                if job["status"] not in FINISHED_STATUSES and job.get("worker_id") not in live:
+                    job.update(status=JOB_FAILED, error="Interrupted by server restart", updated_at=time.time())
+                    self._write(job)
+            self.conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (cutoff,))
+
+    def start_heartbeat(self):
+        """Beat in a background thread, failing the jobs of dead workers as it goes."""
+        def beat():
+            while not self.stopped.wait(self.heartbeat_seconds):
+                try:
+                    self.heartbeat()
+                    self.mark_interrupted()
+                except sqlite3.Error as e:
+                    logger.warning(f"Job store heartbeat failed: {str(e)}")
+
+        self.heartbeat_thread = threading.Thread(target=beat, name="job-store-heartbeat", daemon=True)
+        self.heartbeat_thread.start()
+
+    def close(self):
+        self.stopped.set()
+
+
+def create_job_store(kind: str = "memory", path: str = "jobs.db", max_finished_jobs: int = 1000,
+                     finished_ttl_seconds: float = 24 * 3600) -> JobStore:
+    """Create a job store by name ('memory' or 'sqlite')."""
+    if kind == "memory":
+        return InMemoryJobStore(max_finished_jobs, finished_ttl_seconds)
+    if kind == "sqlite":
+        store = SQLiteJobStore(path, max_finished_jobs, finished_ttl_seconds)
+        store.mark_interrupted()
+        store.start_heartbeat()
+        return store
+    raise ValueError(f"Unknown job store '{kind}'. Use 'memory' or 'sqlite'")
+
+
+class JobManager:
+    """Runs user update batches in the background and records progress in a JobStore."""
+
+    def __init__(self, store: JobStore, user_service_client, executor: Executor, chunk_size: int = 500,
+                 user_snapshot=None, update_journal=None):
+        """
+        Args:
+            store: Where job state and results are kept
+            user_service_client: Client used to PATCH users
+            executor: Executor the jobs run on (bounds concurrent jobs)
+            chunk_size: Users processed between progress updates and cancellation checks
+            user_snapshot: Optional UserSnapshot; when set, only changed users and fields are sent
+            update_journal: Optional UpdateJournal; when set, applied users are checkpointed and
+                a job resubmitted after a crash skips them
+        """
+        self.store = store
+        self.user_snapshot = user_snapshot
+        self.update_journal = update_journal
+        self.user_service_client = user_service_client
+        self.executor = executor
+        self.chunk_size = max(1, chunk_size)
+
+    def submit(self, users: List[Dict], full: bool = False) -> Dict:
+        """Create a job for the users and queue it. Returns the new job."""
+        job = self.store.create(uuid.uuid4().hex, len(users))
+        self.executor.submit(self._run, job["job_id"], users, full)
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Request cancellation; the job stops after the chunk in flight."""
+        job = self.store.get(job_id)
+        if job and job["status"] not in FINISHED_STATUSES:
+            self.store.update(job_id, cancel_requested=True)
+            job = self.store.get(job_id)
+        return job
+
+    def _patch_chunk(self, users: List[Dict], full: bool, on_result=None) -> Tuple[Dict[str, bool], int]:
+        """PATCH one chunk; returns its results and the number of users skipped as unchanged."""
+        if self.user_snapshot is None:
+            return self.user_service_client.patch_users_batch(users, on_result=on_result), 0
+        if full:
+            results = self.user_service_client.patch_users_batch(users, on_result=on_result)
+            self.user_snapshot.record(users, results)
+            return results, 0
+        results, diff_stats = self.user_snapshot.patch_changed(self.user_service_client, users, on_result=on_result)
+        return results, diff_stats['unchanged']
+
+    def _run(self, job_id: str, users: List[Dict], full: bool = False):
+        journal_key = writer = None
+        try:
+            if self.store.get(job_id)["cancel_requested"]:
+                self.store.update(job_id, status=JOB_CANCELLED)
+                return
+            self.store.update(job_id, status=JOB_RUNNING, started_at=time.time())
+            unchanged = 0
+            skipped = []
+
+            # Users applied by an interrupted earlier run of the same batch count as done
+            if self.update_journal is not None:
+                journal_key, pending, resume_stats = self.update_journal.start(users)
+                if resume_stats["skipped"]:
+                    skipped = self.update_journal.skipped_users(users, pending)
+                    self.store.add_results(job_id, {user_id: True for user_id in user_ids(skipped)})
+                    self.store.update(job_id, skipped=resume_stats["skipped"])
+                users = pending
+                writer = self.update_journal.writer(journal_key)
+
+            failed = False
+            for start in range(0, len(users), self.chunk_size):
+                if self.store.get(job_id)["cancel_requested"]:
+                    logger.info(f"Job {job_id} cancelled after {start} users")
+                    self.store.update(job_id, status=JOB_CANCELLED, finished_at=time.time())
+                    return
+                results, chunk_unchanged = self._patch_chunk(users[start:start + self.chunk_size], full, writer)
+                self.store.add_results(job_id, results)
+                failed = failed or not all(results.values())
+                if chunk_unchanged:
+                    unchanged += chunk_unchanged
+                    self.store.update(job_id, unchanged=unchanged)
+
+            if self.user_snapshot is not None and len(skipped):
+                # The earlier run died before recording them in the snapshot
+                self.user_snapshot.record(skipped, {user_id: True for user_id in user_ids(skipped)})
+            if journal_key is not None and not failed:
+                self.update_journal.finish(journal_key)
+            self.store.update(job_id, status=JOB_COMPLETED, finished_at=time.time())
+            logger.info(f"Job {job_id} completed")
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            self.store.update(job_id, status=JOB_FAILED, error=str(e), finished_at=time.time())
+        finally:
+            if writer is not None:
+                writer.close()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Load-test harness: measures /health latency while heavy imports are running.
+
+Usage:
+    python load_test.py [--url http://localhost:8000] [--imports 8] [--rows 50000]
+
+Run it against a live backend. It samples /health latency with no load, then again
+while --imports concurrent /api/process-excel uploads are in flight. With blocking
+work off the event loop, the two latency distributions should be about the same.
+"""
+import argparse
+import statistics
+import threading
+import time
+from io import BytesIO
+
+import pandas as pd
+import requests
+
+
+def make_workbook(rows: int) -> bytes:
+    """Build an in-memory Excel workbook with synthetic users."""
+    df = pd.DataFrame({
+        'id': [str(i) for i in range(1, rows + 1)],
+        'name': [f"User {i}" for i in range(rows)],
+        'email': [f"user{i}@example.com" for i in range(rows)],
+    })
+    buffer = BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def sample_health(url: str, duration: float) -> list:
+    """Call /health back to back for `duration` seconds and return latencies in ms."""
+    latencies = []
+    session = requests.Session()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        session.get(f"{url}/health", timeout=30).raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def upload(url: str, workbook: bytes, timings: list):
+    start = time.perf_counter()
+    files = {'file': ('users.xlsx', workbook, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')}
+    requests.post(f"{url}/api/process-excel", files=files, timeout=600)
+    timings.append(time.perf_counter() - start)
+
+
+def summarize(label: str, latencies: list):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+    print(f"{label:<20} n={len(latencies):<6} p50={statistics.median(latencies):7.2f}ms "
+          f"p95={p95:7.2f}ms max={latencies[-1]:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--imports', type=int, default=8, help='Concurrent Excel uploads')
+    parser.add_argument('--rows', type=int, default=50000, help='Rows per uploaded workbook')
+    parser.add_argument('--baseline', type=float, default=3.0, help='Seconds of idle /health sampling')
+    args = parser.parse_args()
+
+    print(f"Building workbook with {args.rows} rows...")
+    workbook = make_workbook(args.rows)
+
+    summarize("/health idle", sample_health(args.url, args.baseline))
+
+    timings = []
+    threads = [threading.Thread(target=upload, args=(args.url, workbook, timings)) for _ in range(args.imports)]
+    for thread in threads:
+        thread.start()
+
+    latencies = []
+    while any(thread.is_alive() for thread in threads):
+        latencies.extend(sample_health(args.url, 0.5))
+    for thread in threads:
+        thread.join()
+
+    summarize("/health under load", latencies)
+    print(f"{len(timings)} imports finished, slowest {max(timings):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
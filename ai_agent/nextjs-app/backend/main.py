@@ -1,8 +1,13 @@
 """FastAPI backend for the Next.js AI Agent application."""
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+import functools
+import json
 import sys
 import os
 
@@ -11,9 +16,18 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../src'))
 
 from ai_agent import AIAgent
 from excel_processor import ExcelProcessor
+from user_table import UserTable
 from user_service_client import UserServiceClient
+from upload_cache import ParsedUploadCache
+from response_cache import create_response_cache
+from jobs import JobManager, create_job_store
+from sessions import SessionBusy, SessionManager
+from uploads import UploadStore, parse_filters
+from serialization import FastJSONResponse, encode_json, decode_update_users
+from user_snapshot import UserSnapshot
+from update_journal import UpdateJournal
 
-app = FastAPI(title="User Data AI Agent API")
+app = FastAPI(title="User Data AI Agent API", default_response_class=FastJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -22,27 +36,122 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-Id"],
 )
 
 # Initialize services
 try:
-    agent = AIAgent()
     excel_processor = ExcelProcessor()
     user_service_client = UserServiceClient()
+    base_agent = AIAgent(excel_processor=excel_processor, user_service_client=user_service_client)
 except ValueError as e:
     print(f"Warning: Failed to initialize services: {e}")
-    agent = None
+    base_agent = None
     excel_processor = None
     user_service_client = None
 
 
+# Model responses keyed by the full prompt, shared by all sessions; off unless RESPONSE_CACHE=memory or file
+response_cache = create_response_cache(
+    os.getenv("RESPONSE_CACHE", "none"),
+    os.getenv("RESPONSE_CACHE_PATH", ".response_cache"),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+)
+
+
+def create_session_agent() -> AIAgent:
+    """A fresh agent for one chat session, sharing the model and clients of base_agent."""
+    return AIAgent(
+        model=base_agent.model,
+        excel_processor=base_agent.excel_processor,
+        user_service_client=base_agent.user_service_client,
+        response_cache=response_cache,
+    )
+
+
+# Each client gets its own conversation state; idle or excess sessions are evicted
+session_manager = SessionManager(
+    create_session_agent,
+    ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "1800")),
+    max_sessions=int(os.getenv("MAX_SESSIONS", "1000")),
+    max_memory_bytes=int(os.getenv("MAX_SESSION_MEMORY_MB", "256")) * 1024 * 1024,
+)
+
+
+# Blocking work never runs on the event loop. CPU-bound Excel parsing goes to a
+# process pool (it holds the GIL); parse coordination, large encodes and upload
+# queries go to a thread pool of the same size. LLM calls and streamed chunks wait
+# on the network, so they get their own pool and are never queued behind parsing.
+# Cheap in-memory lookups (sessions, jobs, the upload cache) run on the loop.
+# All pools are bounded; extra work waits in the executor queue.
+MAX_CONCURRENT_HEAVY_JOBS = int(os.getenv("MAX_CONCURRENT_HEAVY_JOBS", "4"))
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "16"))
+cpu_executor = ProcessPoolExecutor(max_workers=MAX_CONCURRENT_HEAVY_JOBS)
+io_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_HEAVY_JOBS, thread_name_prefix="heavy-job")
+llm_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_LLM_CALLS, thread_name_prefix="llm")
+
+
+async def run_blocking(func, *args, executor: Executor = io_executor, **kwargs):
+    """Run a blocking call in a bounded executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+async def large_json_response(payload) -> Response:
+    """Build a JSON response, encoding the (potentially large) payload off the event loop."""
+    return Response(content=await run_blocking(encode_json, payload), media_type="application/json")
+
+
+# Parsed uploads keyed by content hash, so identical files are only parsed once
+upload_cache = ParsedUploadCache(disk_dir=os.getenv("UPLOAD_CACHE_DIR") or None)
+
+# Processed uploads by upload id; clients page through them instead of holding every user
+upload_store = UploadStore(
+    ttl_seconds=float(os.getenv("UPLOAD_TTL_SECONDS", "3600")),
+    max_uploads=int(os.getenv("MAX_UPLOADS", "20")),
+)
+EXPORT_CHUNK_SIZE = 1000  # users per NDJSON chunk
+
+
+# Background update jobs run on their own pool so they never starve chat/parsing.
+MAX_CONCURRENT_UPDATE_JOBS = int(os.getenv("MAX_CONCURRENT_UPDATE_JOBS", "2"))
+job_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_UPDATE_JOBS, thread_name_prefix="update-job")
+job_store = create_job_store(
+    os.getenv("JOB_STORE", "memory"),
+    os.getenv("JOB_STORE_PATH", "jobs.db"),
+    max_finished_jobs=int(os.getenv("MAX_FINISHED_JOBS", "1000")),
+    finished_ttl_seconds=float(os.getenv("JOB_RETENTION_SECONDS", "86400")),
+)
+# Optional snapshot of applied user data; with it, updates only send what changed
+user_snapshot = UserSnapshot(os.getenv("USER_SNAPSHOT_PATH")) if os.getenv("USER_SNAPSHOT_PATH") else None
+# Optional checkpoint journal; a batch resubmitted after a crash skips users already applied
+update_journal = UpdateJournal(os.getenv("UPDATE_JOURNAL_DIR")) if os.getenv("UPDATE_JOURNAL_DIR") else None
+job_manager = JobManager(
+    job_store, user_service_client, job_executor,
+    user_snapshot=user_snapshot, update_journal=update_journal
+) if user_service_client else None
+
+
+@app.on_event("shutdown")
+def shutdown_executors():
+    cpu_executor.shutdown(wait=False, cancel_futures=True)
+    io_executor.shutdown(wait=False, cancel_futures=True)
+    llm_executor.shutdown(wait=False, cancel_futures=True)
+    job_executor.shutdown(wait=False, cancel_futures=True)
+    job_store.close()
+
+
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None
     processed_users: Optional[List[Dict]] = None
+    upload_id: Optional[str] = None  # used instead of processed_users when given
 
 
 class UpdateUsersRequest(BaseModel):
-    users: List[Dict]
+    users: Optional[List[Dict]] = None
+    upload_id: Optional[str] = None  # update the users of a stored upload instead
+    full: bool = False  # bypass the user snapshot and send every user in full
 
 
 @app.get("/")
@@ -56,8 +165,17 @@ async def health():
 
 
 @app.post("/api/process-excel")
-async def process_excel(file: UploadFile = File(...)):
-    """Process an uploaded Excel file and return user data."""
+async def process_excel(file: UploadFile = File(...), sheets: Optional[str] = None, include_users: bool = False):
+    """
+    Process an uploaded Excel file and return user data.
+    
+    Only the first sheet is read by default. Pass sheets=all, or a comma-separated
+    list of sheet names, to process several sheets in parallel and merge them.
+    Rows that break the column schema are left out and listed under "rejected".
+    
+    The result is kept under the returned upload_id for /api/uploads. The users
+    are only included in the response with include_users=true.
+    """
     if not excel_processor:
         raise HTTPException(status_code=500, detail="Excel processor not initialized")
     
@@ -68,14 +186,46 @@ async def process_excel(file: UploadFile = File(...)):
         if not file_content:
             raise HTTPException(status_code=400, detail="Empty file uploaded")
         
-        # Process Excel file
-        users = excel_processor.process_excel_file(file_content)
+        if sheets:
+            # Multi-sheet mode: one task per sheet on the process pool
+            sheet_names = None if sheets == "all" else [name.strip() for name in sheets.split(",") if name.strip()]
+            result = await run_blocking(excel_processor.process_workbook, file_content, sheet_names, cpu_executor)
+            rejected = [
+                {**report, "sheet": name}
+                for name, sheet in result["sheets"].items() for report in sheet["rejected"]
+            ]
+            response = {
+                "success": True,
+                "upload_id": upload_store.add(result["users"], rejected),
+                "count": len(result["users"]),
+                "rejected": rejected,
+                "sheets": result["sheets"],
+                "duplicate_ids": result["duplicate_ids"]
+            }
+            if include_users:
+                response["users"] = result["users"]
+            return await large_json_response(response)
         
-        return {
+        # Process Excel file, unless an identical upload was already parsed
+        cache_key = upload_cache.make_key(file_content, None, excel_processor)
+        # A memory-only cache is a dict lookup; the disk tier reads a file
+        cached = await run_blocking(upload_cache.get, cache_key) if upload_cache.disk_dir else upload_cache.get(cache_key)
+        if cached is not None:
+            users, rejected = cached
+        else:
+            users, rejected = await run_blocking(excel_processor.process_excel_file_with_report, file_content,
+                                                 executor=cpu_executor)
+            await run_blocking(upload_cache.put, cache_key, users, rejected)
+        
+        response = {
             "success": True,
-            "users": users,
-            "count": len(users)
+            "upload_id": upload_store.add(users, rejected),
+            "count": len(users),
+            "rejected": rejected
         }
+        if include_users:
+            response["users"] = users
+        return await large_json_response(response)
     except ValueError as e:
         import traceback
         print(f"ValueError in process_excel: {str(e)}")
@@ -88,72 +238,274 @@ async def process_excel(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
 
+def get_upload_or_404(upload_id: str):
+    upload = upload_store.get(upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found or expired")
+    return upload
+
+
+@app.get("/api/uploads")
+async def get_uploads():
+    """Number of stored uploads and the users they hold."""
+    return upload_store.stats()
+
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Size and age of a stored upload."""
+    return get_upload_or_404(upload_id).info()
+
+
+@app.get("/api/uploads/{upload_id}/users")
+async def get_upload_users(
+    upload_id: str,
+    offset: int = 0,
+    limit: int = Query(50, ge=1, le=1000),
+    sort: Optional[str] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    search: Optional[str] = None,
+    filter: Optional[List[str]] = Query(None),
+):
+    """
+    One page of a stored upload's users.
+    
+    Sort by 'id' or any data field; filter with repeated filter=field:value
+    (exact, case-insensitive) and search in the id and all data values.
+    """
+    get_upload_or_404(upload_id)
+    try:
+        filters = parse_filters(filter)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    page = await run_blocking(upload_store.query, upload_id, offset, limit, sort, order == "desc", search, filters)
+    if page is None:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found or expired")
+    return page
+
+
+async def ndjson_lines(users):
+    """Encode users as NDJSON, a chunk of lines at a time off the event loop."""
+    done = object()
+
+    def next_chunk():
+        chunk = [user for _, user in zip(range(EXPORT_CHUNK_SIZE), users)]
+        return b"".join(encode_json(user) + b"\n" for user in chunk) if chunk else done
+
+    while True:
+        chunk = await run_blocking(next_chunk)
+        if chunk is done:
+            break
+        yield chunk
+
+
+@app.get("/api/uploads/{upload_id}/export")
+async def export_upload(
+    upload_id: str,
+    sort: Optional[str] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    search: Optional[str] = None,
+    filter: Optional[List[str]] = Query(None),
+):
+    """Stream a stored upload's users as NDJSON (one user per line), with the same sort and filters as /users."""
+    get_upload_or_404(upload_id)
+    try:
+        filters = parse_filters(filter)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    users = await run_blocking(upload_store.iter_users, upload_id, sort, order == "desc", search, filters)
+    if users is None:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found or expired")
+    return StreamingResponse(
+        ndjson_lines(users),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="users-{upload_id}.ndjson"'},
+    )
+
+
+@app.delete("/api/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    """Forget a stored upload."""
+    if not upload_store.drop(upload_id):
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+    return {"upload_id": upload_id, "deleted": True}
+
+
+def with_user_context(request: ChatRequest) -> str:
+    """Append context about the processed users, if any, to the chat message."""
+    user_message = request.message
+    users = request.processed_users
+    if request.upload_id:
+        upload = upload_store.get(request.upload_id)
+        users = upload.users if upload is not None else None
+    if users:
+        num_users = len(users)
+        user_context = f"\n[System: User has uploaded an Excel file with {num_users} users. "
+        user_context += f"Users are ready to be updated in the service. Sample users: {users[:3]}]"
+        user_message += user_context
+    return user_message
+
+
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
     """Handle chat messages with the AI agent."""
-    if not agent:
+    if not base_agent:
         raise HTTPException(status_code=500, detail="AI agent not initialized")
     
     try:
-        # Add context about processed users if available
-        user_message = request.message
-        if request.processed_users:
-            num_users = len(request.processed_users)
-            user_context = f"\n[System: User has uploaded an Excel file with {num_users} users. "
-            user_context += f"Users are ready to be updated in the service. Sample users: {request.processed_users[:3]}]"
-            user_message += user_context
-        
-        response = agent.chat(user_message, None)
+        session = session_manager.get(request.session_id)
+        response = await run_blocking(session.chat, with_user_context(request), executor=llm_executor)
         
         return {
             "message": response,
+            "session_id": session.session_id,
             "success": True
         }
+    except SessionBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
 
 
-@app.post("/api/update-users")
-async def update_users(request: UpdateUsersRequest):
-    """Update users in the user service."""
-    if not user_service_client:
+async def sse_events(chunks: Iterator[str]):
+    """Relay a blocking chunk generator as server-sent events, pulling each chunk in the LLM executor."""
+    done = object()
+    try:
+        while True:
+            chunk = await run_blocking(next, chunks, done, executor=llm_executor)
+            if chunk is done:
+                break
+            yield f"data: {json.dumps({'delta': chunk})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    finally:
+        # Release the session if the client went away mid-stream; a chunk still
+        # being produced in the executor ends the turn when it is ready
+        chunks.close()
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Stream the AI agent's response as server-sent events ({"delta": text} per chunk)."""
+    if not base_agent:
+        raise HTTPException(status_code=500, detail="AI agent not initialized")
+    
+    session = session_manager.get(request.session_id)
+    try:
+        # Takes the session without waiting and returns before the model is called,
+        # so it runs on the loop; the chunks are pulled in the LLM executor
+        chunks = session.chat_stream(with_user_context(request))
+    except SessionBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return StreamingResponse(
+        sse_events(chunks),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Session-Id": session.session_id},
+    )
+
+
+@app.get("/api/sessions")
+async def get_sessions(details: bool = False):
+    """Number of chat sessions and their estimated memory."""
+    return session_manager.stats(include_sessions=details)
+
+
+@app.get("/api/response-cache")
+async def get_response_cache_stats():
+    """Hit/miss counters and size of the model response cache."""
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **await run_blocking(response_cache.stats)}
+
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Forget a chat session (its history and processed users)."""
+    if not session_manager.drop(session_id):
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return {"session_id": session_id, "deleted": True}
+
+
+@app.post(
+    "/api/update-users",
+    status_code=202,
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": UpdateUsersRequest.model_json_schema()}},
+    }},
+)
+async def update_users(raw_request: Request):
+    """
+    Queue a background job that updates users in the user service.
+    
+    The body (see UpdateUsersRequest) is decoded with msgspec into typed structs
+    when it is installed, which is much faster than pydantic for large user lists.
+    """
+    if not job_manager:
         raise HTTPException(status_code=500, detail="User service client not initialized")
     
     try:
-        # Convert users to the format expected by the client
-        users = []
-        for user in request.users:
-            user_id = user.get('id')
-            user_data = user.get('data', {})
-            if user_id:
-                users.append({
-                    'id': user_id,
-                    'data': user_data
-                })
+        request = await run_blocking(decode_update_users, await raw_request.body(), UpdateUsersRequest)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid request body: {str(e)}")
+    
+    try:
+        source = request['users'] or []
+        if request['upload_id']:
+            upload = upload_store.get(request['upload_id'])
+            if upload is None:
+                raise HTTPException(status_code=404, detail=f"Upload {request['upload_id']} not found or expired")
+            source = upload.users
+        
+        # Both sources are already in the {'id', 'data'} format expected by the client;
+        # a stored UserTable only holds users with an id and is passed on as is
+        users = source if isinstance(source, UserTable) else [user for user in source if user['id']]
         
         if not users:
             raise HTTPException(status_code=400, detail="No valid users provided")
         
-        # Update users
-        results = user_service_client.patch_users_batch(users)
-        
-        # Calculate statistics
-        total = len(results)
-        successful = sum(1 for success in results.values() if success)
-        failed = total - successful
-        
-        return {
-            "total": total,
-            "successful": successful,
-            "failed": failed,
-            "results": results
-        }
+        job = await run_blocking(job_manager.submit, users, request['full'])
+        return job
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating users: {str(e)}")
 
 
+def get_job_or_404(job_id: str) -> Dict:
+    job = job_store.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Report progress and stats of an update job."""
+    return get_job_or_404(job_id)
+
+
+@app.get("/api/jobs/{job_id}/results")
+async def get_job_results(job_id: str, offset: int = 0, limit: Optional[int] = None, failed_only: bool = False):
+    """Return per-user results recorded so far (partial while the job is running), or only the failures."""
+    job = get_job_or_404(job_id)
+    results = await run_blocking(job_store.get_results, job_id, offset, limit, failed_only)
+    return await large_json_response({
+        "job_id": job_id,
+        "status": job["status"],
+        "offset": offset,
+        "results": results
+    })
+
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Request cancellation of an update job."""
+    get_job_or_404(job_id)
+    return await run_blocking(job_manager.cancel, job_id)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,112 @@
+"""Fast JSON encoding and decoding for the backend's large payloads (thousands of users)."""
+import datetime
+import decimal
+import json
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional: fastest encoder for responses
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # optional: typed request decoding without pydantic
+    msgspec = None
+
+
+def encode_default(value: Any) -> Any:
+    """Fallback for values the fast encoders do not handle (NumPy/pandas scalars, Decimal, ...)."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'to_list'):
+        return value.to_list()  # UserTable (or a pandas Series)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()  # pandas Timestamp
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return None  # pandas NA/NaT
+    return jsonable_encoder(value)
+
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+if msgspec is not None:
+    _json_encoder = msgspec.json.Encoder(enc_hook=encode_default)
+
+
+def encode_json(payload: Any) -> bytes:
+    """Encode a payload to JSON bytes with the fastest encoder installed (orjson, then msgspec, then json)."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=encode_default, option=ORJSON_OPTIONS)
+    if msgspec is not None:
+        return _json_encoder.encode(payload)
+    return json.dumps(payload, default=encode_default).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered with encode_json instead of json.dumps."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+
+if msgspec is not None:
+    # gc=False: these structs never form reference cycles, and skipping GC tracking
+    # roughly halves decode time for 100k users
+    class UserRecord(msgspec.Struct, gc=False):
+        """One user as sent by clients: its id (text or a number) and the fields to update."""
+        id: Union[str, int, None] = None
+        data: Dict[str, Any] = {}
+
+    class UpdateUsersBody(msgspec.Struct, gc=False):
+        """Body of /api/update-users."""
+        users: Optional[List[UserRecord]] = None
+        upload_id: Optional[str] = None
+        full: bool = False
+
+    _update_users_decoder = msgspec.json.Decoder(UpdateUsersBody)
+
+
+def user_id_text(user_id: Any) -> Optional[str]:
+    """Ids are keyed as text everywhere else (UserTable, snapshot, journal), so 7 and "7" are one user."""
+    return None if user_id is None else str(user_id)
+
+
+def decode_update_users(body: bytes, fallback_model) -> Dict:
+    """
+    Decode and validate an /api/update-users body.
+
+    Uses the typed msgspec decoder when msgspec is installed, and the given
+    pydantic model otherwise. Both raise ValueError on an invalid body.
+
+    Args:
+        body: Raw request body
+        fallback_model: Pydantic model with the same fields as UpdateUsersBody
+
+    Returns:
+        Dictionary with 'users' (list of {'id', 'data'} dicts or None, each id
+        as text), 'upload_id' and 'full'
+    """
+    if msgspec is None:
+        request = fallback_model.model_validate_json(body)
+        users = None
+        if request.users is not None:
+            users = [{'id': user_id_text(user.get('id')), 'data': user.get('data', {})} for user in request.users]
+        return {'users': users, 'upload_id': request.upload_id, 'full': request.full}
+
+    try:
+        request = _update_users_decoder.decode(body)
+    except msgspec.DecodeError as e:  # ValidationError is a subclass
+        raise ValueError(str(e)) from e
+    users = None
+    if request.users is not None:
+        users = [{'id': user_id_text(user.id), 'data': user.data} for user in request.users]
+    return {'users': users, 'upload_id': request.upload_id, 'full': request.full}
@@ -0,0 +1,252 @@
+"""Per-client chat sessions, each with its own lightweight agent state."""
+import logging
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# processed_users can hold many thousands of users; their size is extrapolated from a sample
+MEMORY_SAMPLE_SIZE = 100
+
+
+def estimate_agent_memory(agent) -> int:
+    """Rough size in bytes of an agent's per-session state (history and processed users)."""
+    total = sys.getsizeof(agent.conversation_history)
+    for turn in agent.conversation_history:
+        total += sys.getsizeof(turn) + sum(sys.getsizeof(text) for text in turn.values())
+
+    users = getattr(agent, 'processed_users', None)
+    if hasattr(users, 'memory_bytes'):
+        total += users.memory_bytes()  # UserTable: measured, not sampled
+    elif users:
+        sample = users[:MEMORY_SAMPLE_SIZE]
+        sample_size = sum(
+            sys.getsizeof(user) + sys.getsizeof(user['data'])
+            + sum(sys.getsizeof(key) + sys.getsizeof(value) for key, value in user['data'].items())
+            for user in sample
+        )
+        total += sys.getsizeof(users) + sample_size * len(users) // len(sample)
+    return total
+
+
+class SessionBusy(Exception):
+    """Raised when a message arrives for a session that is still answering another one."""
+
+
+class TurnStream:
+    """
+    Chunks of one streamed turn; ends the turn when exhausted or closed.
+
+    The session is already held when this is created. Each chunk may be pulled
+    on a different executor thread, so nothing here blocks waiting for the
+    session. close() may be called while a chunk is being produced; the turn
+    then ends as soon as that chunk is ready.
+
+    A stream dropped without being exhausted or closed still releases the
+    session when it is collected. That finalizer can run on any thread, in the
+    middle of code holding the manager's lock, so it takes no locks: it only
+    releases the session and skips the end-of-turn bookkeeping and eviction.
+    """
+
+    def __init__(self, session: 'AgentSession', chunks: Iterator[str]):
+        self.session = session
+        self.chunks = chunks
+        self.lock = threading.Lock()
+        self.running = False
+        self.close_requested = False
+        self.closed = False
+        self.finalizer = weakref.finalize(self, session.lock.release)
+        self.finalizer.atexit = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        with self.lock:
+            if self.closed:
+                raise StopIteration
+            self.running = True
+        try:
+            chunk = next(self.chunks)
+        except BaseException:
+            self._end()
+            raise
+        with self.lock:
+            self.running = False
+            close_now = self.close_requested
+        if close_now:
+            self._end()
+            raise StopIteration
+        return chunk
+
+    def close(self):
+        with self.lock:
+            if self.running:
+                self.close_requested = True
+                return
+        self._end()
+
+    def _end(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.running = False
+        self.finalizer.detach()
+        try:
+            self.chunks.close()
+        finally:
+            self.session._end_turn()
+
+
+class AgentSession:
+    """One client's agent plus the bookkeeping needed for eviction."""
+
+    def __init__(self, session_id: str, agent, max_history_turns: int,
+                 on_turn_finished: Optional[Callable[[], None]] = None):
+        self.session_id = session_id
+        self.agent = agent
+        self.max_history_turns = max_history_turns
+        self.on_turn_finished = on_turn_finished
+        # Serialises turns of the same session. Never waited on: a second message
+        # while a turn is running gets SessionBusy instead of tying up an executor thread
+        self.lock = threading.Lock()
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.memory_bytes = 0
+
+    def _begin_turn(self):
+        if not self.lock.acquire(blocking=False):
+            raise SessionBusy("This session is still answering a previous message")
+
+    def _end_turn(self):
+        try:
+            history = self.agent.conversation_history
+            if len(history) > self.max_history_turns:
+                del history[:len(history) - self.max_history_turns]
+            self.memory_bytes = estimate_agent_memory(self.agent)
+            self.last_used = time.time()
+        finally:
+            # Released from whichever thread ends the turn (a plain Lock allows that)
+            self.lock.release()
+        if self.on_turn_finished:
+            self.on_turn_finished()
+
+    def chat(self, user_message: str) -> str:
+        self._begin_turn()
+        try:
+            return self.agent.chat(user_message, None)
+        finally:
+            self._end_turn()
+
+    def chat_stream(self, user_message: str) -> TurnStream:
+        """Start a streamed turn; raises SessionBusy right away if another turn is running."""
+        self._begin_turn()
+        try:
+            chunks = self.agent.chat_stream(user_message, None)
+        except BaseException:
+            self._end_turn()
+            raise
+        return TurnStream(self, chunks)
+
+    def info(self) -> Dict:
+        # No session_id: it is the only credential needed to continue a conversation
+        return {
+            'turns': len(self.agent.conversation_history),
+            'memory_bytes': self.memory_bytes,
+            'created_at': self.created_at,
+            'last_used': self.last_used,
+        }
+
+
+class SessionManager:
+    """
+    Keeps one AgentSession per client id, with TTL and LRU eviction.
+
+    Sessions idle for longer than ttl_seconds are dropped. When there are more than
+    max_sessions, or their estimated memory exceeds max_memory_bytes, the least
+    recently used ones are dropped first. The agent factory is expected to share
+    the heavy model and service clients between sessions.
+    """
+
+    def __init__(self, agent_factory: Callable[[], object], ttl_seconds: float = 1800,
+                 max_sessions: int = 1000, max_memory_bytes: int = 256 * 1024 * 1024,
+                 max_history_turns: int = 50):
+        """
+        Args:
+            agent_factory: Callable returning a fresh agent for a new session
+            ttl_seconds: Idle time after which a session is evicted
+            max_sessions: Maximum number of live sessions
+            max_memory_bytes: Budget for the estimated memory of all sessions
+            max_history_turns: Turns of conversation history kept per session
+        """
+        self.agent_factory = agent_factory
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max(1, max_sessions)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_history_turns = max(1, max_history_turns)
+        self.sessions = OrderedDict()
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def get(self, session_id: Optional[str] = None) -> AgentSession:
+        """Return the session for an id, creating it (and an id, if none is given) when missing."""
+        session_id = session_id or uuid.uuid4().hex
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+                session.last_used = time.time()
+                return session
+
+        # Build the agent outside the lock; if two requests race, the first one wins
+        session = AgentSession(session_id, self.agent_factory(), self.max_history_turns, self.enforce_limits)
+        with self.lock:
+            session = self.sessions.setdefault(session_id, session)
+            self.sessions.move_to_end(session_id)
+        self.enforce_limits()
+        return session
+
+    def drop(self, session_id: str) -> bool:
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def enforce_limits(self):
+        """Evict expired sessions, then least recently used ones until within limits."""
+        now = time.time()
+        with self.lock:
+            expired = [sid for sid, s in self.sessions.items() if now - s.last_used > self.ttl_seconds]
+            for sid in expired:
+                del self.sessions[sid]
+            evicted = len(expired)
+
+            total_memory = sum(s.memory_bytes for s in self.sessions.values())
+            while len(self.sessions) > 1 and (
+                    len(self.sessions) > self.max_sessions or total_memory > self.max_memory_bytes):
+                _, session = self.sessions.popitem(last=False)
+                total_memory -= session.memory_bytes
+                evicted += 1
+            self.evicted += evicted
+
+        if evicted:
+            logger.info(f"Evicted {evicted} chat sessions")
+
+    def stats(self, include_sessions: bool = False) -> Dict:
+        """Session count and estimated memory, optionally with per-session details."""
+        with self.lock:
+            sessions = list(self.sessions.values())
+            evicted = self.evicted
+        stats = {
+            'sessions': len(sessions),
+            'memory_bytes': sum(s.memory_bytes for s in sessions),
+            'max_memory_bytes': self.max_memory_bytes,
+            'evicted': evicted,
+        }
+        if include_sessions:
+            stats['details'] = [s.info() for s in sessions]
+        return stats
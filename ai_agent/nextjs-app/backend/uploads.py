@@ -0,0 +1,236 @@
+"""Processed uploads kept server-side, so clients page through users instead of downloading them all."""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from numbers import Number
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from user_table import UserTable
+
+logger = logging.getLogger(__name__)
+
+# Sorted orders and filtered results cached per upload; paging through one view only slices
+MAX_CACHED_VIEWS = 4
+# Users materialised at a time when exporting a UserTable
+EXPORT_BATCH_SIZE = 1000
+
+
+def sort_key(value) -> Tuple:
+    """Order numbers numerically and everything else as text; missing values come last."""
+    if value is None:
+        return (2, 0, "")
+    if isinstance(value, Number) and not isinstance(value, bool):
+        return (0, value, "")
+    return (1, 0, str(value).lower())
+
+
+def parse_filters(filters: Optional[List[str]]) -> Dict[str, str]:
+    """Turn ["field:value", ...] into {field: value}."""
+    parsed = {}
+    for item in filters or []:
+        field, separator, value = item.partition(":")
+        if not separator or not field:
+            raise ValueError(f"Invalid filter '{item}'. Use field:value")
+        parsed[field] = value
+    return parsed
+
+
+def field_value(user: Dict, field: str):
+    return user['id'] if field == 'id' else user['data'].get(field)
+
+
+def field_values(users, field: str) -> List:
+    """One field of every user; read straight from the column for a UserTable."""
+    if isinstance(users, UserTable):
+        return users.field_values(field)
+    return [field_value(user, field) for user in users]
+
+
+def users_at(users, indices: List[int]) -> List[Dict]:
+    """The users at the given positions, as dicts."""
+    if isinstance(users, UserTable):
+        return users.take(indices).to_list()
+    return [users[i] for i in indices]
+
+
+class StoredUpload:
+    """One processed upload plus its cached views."""
+
+    def __init__(self, upload_id: str, users: List[Dict], rejected: List[Dict]):
+        self.upload_id = upload_id
+        self.users = users
+        self.rejected = rejected
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.views = OrderedDict()  # (sort, descending, search, filters) -> indices into users
+        self.lock = threading.Lock()
+
+    def _order(self, sort: Optional[str], descending: bool) -> List[int]:
+        if sort is None:
+            return range(len(self.users))
+        keys = [sort_key(value) for value in field_values(self.users, sort)]
+        order = sorted(range(len(keys)), key=keys.__getitem__, reverse=descending)
+        if descending:
+            # Keep missing values last in both directions
+            order = [i for i in order if keys[i][0] != 2] + [i for i in order if keys[i][0] == 2]
+        return order
+
+    def view(self, sort: Optional[str] = None, descending: bool = False, search: Optional[str] = None,
+             filters: Optional[Dict[str, str]] = None) -> List[int]:
+        """Indices of the users matching search and filters, in the requested order."""
+        search = (search or "").strip().lower() or None
+        filters = filters or {}
+        key = (sort, descending, search, tuple(sorted(filters.items())))
+        with self.lock:
+            if key in self.views:
+                self.views.move_to_end(key)
+                return self.views[key]
+
+        indices = self._order(sort, descending)
+        for field, value in filters.items():
+            values = field_values(self.users, field)
+            value = value.lower()
+            indices = [i for i in indices if str(values[i]).lower() == value]
+        if search:
+            matches = [
+                search in str(user['id']).lower() or any(search in str(value).lower() for value in user['data'].values())
+                for user in self.users
+            ]
+            indices = [i for i in indices if matches[i]]
+        indices = list(indices)
+
+        with self.lock:
+            self.views[key] = indices
+            while len(self.views) > MAX_CACHED_VIEWS:
+                self.views.popitem(last=False)
+        return indices
+
+    def info(self) -> Dict:
+        return {
+            'upload_id': self.upload_id,
+            'count': len(self.users),
+            'rejected_count': len(self.rejected),
+            'created_at': self.created_at,
+            'last_used': self.last_used,
+        }
+
+
+class UploadStore:
+    """
+    Processed uploads by upload id, with TTL and LRU eviction.
+
+    Uploads idle for longer than ttl_seconds are dropped. When there are more than
+    max_uploads, or more than max_users users in total, the least recently used
+    ones are dropped first.
+    """
+
+    def __init__(self, ttl_seconds: float = 3600, max_uploads: int = 20, max_users: int = 2_000_000):
+        """
+        Args:
+            ttl_seconds: Idle time after which an upload is evicted
+            max_uploads: Maximum number of uploads kept
+            max_users: Maximum number of users across all uploads
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_uploads = max(1, max_uploads)
+        self.max_users = max_users
+        self.uploads = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, users: List[Dict], rejected: Optional[List[Dict]] = None) -> str:
+        """Store a processed upload and return its id."""
+        upload = StoredUpload(uuid.uuid4().hex, users, rejected or [])
+        with self.lock:
+            self.uploads[upload.upload_id] = upload
+        self.enforce_limits(keep=upload.upload_id)
+        return upload.upload_id
+
+    def get(self, upload_id: str) -> Optional[StoredUpload]:
+        with self.lock:
+            upload = self.uploads.get(upload_id)
+            if upload is not None:
+                self.uploads.move_to_end(upload_id)
+                upload.last_used = time.time()
+        return upload
+
+    def drop(self, upload_id: str) -> bool:
+        with self.lock:
+            return self.uploads.pop(upload_id, None) is not None
+
+    def enforce_limits(self, keep: Optional[str] = None):
+        """Evict expired uploads, then least recently used ones until within limits."""
+        now = time.time()
+        with self.lock:
+            expired = [uid for uid, u in self.uploads.items() if uid != keep and now - u.last_used > self.ttl_seconds]
+            for uid in expired:
+                del self.uploads[uid]
+            evicted = len(expired)
+
+            total_users = sum(len(u.users) for u in self.uploads.values())
+            for uid in list(self.uploads):
+                if len(self.uploads) <= self.max_uploads and total_users <= self.max_users:
+                    break
+                if uid == keep:
+                    continue
+                total_users -= len(self.uploads.pop(uid).users)
+                evicted += 1
+
+        if evicted:
+            logger.info(f"Evicted {evicted} stored uploads")
+
+    def query(self, upload_id: str, offset: int = 0, limit: int = 50, sort: Optional[str] = None,
+              descending: bool = False, search: Optional[str] = None,
+              filters: Optional[Dict[str, str]] = None) -> Optional[Dict]:
+        """
+        One page of an upload's users.
+
+        Args:
+            upload_id: Id returned by add()
+            offset: Index of the first user to return, after filtering and sorting
+            limit: Maximum number of users to return
+            sort: Field to sort by ('id' or a data field); file order if not given
+            descending: Sort in descending order
+            search: Case-insensitive text searched in the id and every data value
+            filters: Exact (case-insensitive) field values to match
+
+        Returns:
+            Dictionary with 'total' users in the upload, 'matched' users after
+            filtering, and the page under 'users'; None if the upload is unknown
+        """
+        upload = self.get(upload_id)
+        if upload is None:
+            return None
+        indices = upload.view(sort, descending, search, filters)
+        offset = max(0, offset)
+        return {
+            'upload_id': upload_id,
+            'total': len(upload.users),
+            'matched': len(indices),
+            'offset': offset,
+            'limit': limit,
+            'users': users_at(upload.users, indices[offset:offset + max(0, limit)]),
+        }
+
+    def iter_users(self, upload_id: str, sort: Optional[str] = None, descending: bool = False,
+                   search: Optional[str] = None, filters: Optional[Dict[str, str]] = None) -> Optional[Iterator[Dict]]:
+        """All matching users of an upload, in order, for export; None if the upload is unknown."""
+        upload = self.get(upload_id)
+        if upload is None:
+            return None
+        indices = upload.view(sort, descending, search, filters)
+        return (
+            user
+            for start in range(0, len(indices), EXPORT_BATCH_SIZE)
+            for user in users_at(upload.users, indices[start:start + EXPORT_BATCH_SIZE])
+        )
+
+    def stats(self) -> Dict:
+        with self.lock:
+            uploads = list(self.uploads.values())
+        return {
+            'uploads': len(uploads),
+            'users': sum(len(u.users) for u in uploads),
+            'max_users': self.max_users,
+        }
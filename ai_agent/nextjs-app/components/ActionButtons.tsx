@@ -2,44 +2,66 @@
 
 import { useState } from 'react'
 import { RefreshCw, CheckCircle2, AlertCircle, XCircle } from 'lucide-react'
-import { User, UpdateResults } from '@/types'
-import { updateUsers } from '@/lib/api'
+import { ProcessedUpload, UpdateResults, UpdateJob } from '@/types'
+import { updateUsers, cancelUpdateJob, getFailedUsers } from '@/lib/api'
 
 interface ActionButtonsProps {
-  users: User[]
+  upload: ProcessedUpload | null
   onUsersUpdated: () => void
   onClearData: () => void
 }
 
 export default function ActionButtons({
-  users,
+  upload,
   onUsersUpdated,
   onClearData,
 }: ActionButtonsProps) {
   const [isUpdating, setIsUpdating] = useState(false)
   const [results, setResults] = useState<UpdateResults | null>(null)
   const [showDetails, setShowDetails] = useState(false)
+  const [job, setJob] = useState<UpdateJob | null>(null)
+  const [isLoadingFailures, setIsLoadingFailures] = useState(false)
 
   const handleUpdateUsers = async () => {
+    if (!upload) return
     setIsUpdating(true)
     setResults(null)
+    setJob(null)
 
     try {
-      const updateResults = await updateUsers(users)
+      const updateResults = await updateUsers(upload.upload_id, setJob)
       setResults(updateResults)
       if (!updateResults.error) {
         onUsersUpdated()
       }
     } catch (error: any) {
       setResults({
-        total: users.length,
+        total: upload.count,
         successful: 0,
-        failed: users.length,
-        results: {},
+        failed: upload.count,
+        failedUsers: [],
         error: error.message || 'Failed to update users',
       })
     } finally {
       setIsUpdating(false)
+      setJob(null)
+    }
+  }
+
+  const handleLoadMoreFailures = async () => {
+    if (!results?.jobId) return
+    setIsLoadingFailures(true)
+    try {
+      const more = await getFailedUsers(results.jobId, results.failedUsers.length)
+      setResults({ ...results, failedUsers: [...results.failedUsers, ...more] })
+    } finally {
+      setIsLoadingFailures(false)
+    }
+  }
+
+  const handleCancel = async () => {
+    if (job) {
+      await cancelUpdateJob(job.job_id)
     }
   }
 
@@ -49,18 +71,27 @@ export default function ActionButtons({
       <div className="flex flex-wrap gap-3">
         <button
           onClick={handleUpdateUsers}
-          disabled={isUpdating}
+          disabled={isUpdating || !upload}
           className="px-4 py-2 bg-intapp-green text-white rounded hover:bg-intapp-green-hover disabled:opacity-50 disabled:cursor-not-allowed flex items-center gap-2 transition-colors font-medium text-sm"
         >
           {isUpdating ? (
             <>
               <RefreshCw className="w-4 h-4 animate-spin" />
-              Updating...
+              {job ? `Updating... ${job.processed}/${job.total}` : 'Updating...'}
             </>
           ) : (
             'Update Users in Service'
           )}
         </button>
+        {isUpdating && job && (
+          <button
+            onClick={handleCancel}
+            disabled={job.cancel_requested}
+            className="px-4 py-2 bg-intapp-green text-white rounded hover:bg-intapp-green-hover disabled:opacity-50 disabled:cursor-not-allowed flex items-center gap-2 transition-colors font-medium text-sm"
+          >
+            {job.cancel_requested ? 'Cancelling...' : 'Cancel Update'}
+          </button>
+        )}
         <button
           onClick={onClearData}
           className="px-4 py-2 bg-intapp-green text-white rounded hover:bg-intapp-green-hover flex items-center gap-2 transition-colors font-medium text-sm"
@@ -96,18 +127,31 @@ export default function ActionButtons({
                 )}
               </div>
 
-              <button
-                onClick={() => setShowDetails(!showDetails)}
-                className="text-sm text-blue-600 hover:text-blue-800 py-2"
-              >
-                {showDetails ? 'Hide' : 'Show'} Detailed Results
-              </button>
+              {results.failed > 0 && (
+                <button
+                  onClick={() => setShowDetails(!showDetails)}
+                  className="text-sm text-blue-600 hover:text-blue-800 py-2"
+                >
+                  {showDetails ? 'Hide' : 'Show'} Failed Users
+                </button>
+              )}
 
-              {showDetails && (
+              {showDetails && results.failed > 0 && (
                 <div className="p-3 bg-gray-50 rounded-lg border border-gray-200 max-h-60 overflow-y-auto">
                   <pre className="text-xs text-gray-700">
-                    {JSON.stringify(results.results, null, 2)}
+                    {results.failedUsers.join('\n')}
                   </pre>
+                  {results.failedUsers.length < results.failed && (
+                    <button
+                      onClick={handleLoadMoreFailures}
+                      disabled={isLoadingFailures}
+                      className="text-xs text-blue-600 hover:text-blue-800 disabled:opacity-50 mt-2"
+                    >
+                      {isLoadingFailures
+                        ? 'Loading...'
+                        : `Load more (${results.failedUsers.length}/${results.failed})`}
+                    </button>
+                  )}
                 </div>
               )}
             </>
@@ -2,13 +2,13 @@
 
 import { useState, useRef, useEffect } from 'react'
 import { Send, Bot, User as UserIcon } from 'lucide-react'
-import { Message, User } from '@/types'
-import { sendChatMessage } from '@/lib/api'
+import { Message } from '@/types'
+import { streamChatMessage } from '@/lib/api'
 
 interface ChatInterfaceProps {
   messages: Message[]
   setMessages: (messages: Message[] | ((prev: Message[]) => Message[])) => void
-  processedUsers: User[] | null
+  uploadId: string | null
   isLoading: boolean
   setIsLoading: (loading: boolean) => void
 }
@@ -16,11 +16,12 @@ interface ChatInterfaceProps {
 export default function ChatInterface({
   messages,
   setMessages,
-  processedUsers,
+  uploadId,
   isLoading,
   setIsLoading,
 }: ChatInterfaceProps) {
   const [input, setInput] = useState('')
+  const [isStreaming, setIsStreaming] = useState(false)
   const messagesEndRef = useRef<HTMLDivElement>(null)
 
   const scrollToBottom = () => {
@@ -44,20 +45,27 @@ export default function ChatInterface({
     setInput('')
     setIsLoading(true)
 
-    try {
-      const response = await sendChatMessage(input, processedUsers)
-      const assistantMessage: Message = {
-        role: 'assistant',
-        content: response.message,
+    // The assistant message is created on the first chunk and grows as chunks arrive
+    let started = false
+    const appendDelta = (delta: string) => {
+      if (!started) {
+        started = true
+        setIsStreaming(true)
+        setMessages((prev) => [...prev, { role: 'assistant', content: delta }])
+        return
       }
-      setMessages((prev) => [...prev, assistantMessage])
+      setMessages((prev) => {
+        const last = prev[prev.length - 1]
+        return [...prev.slice(0, -1), { ...last, content: last.content + delta }]
+      })
+    }
+
+    try {
+      await streamChatMessage(input, uploadId, appendDelta)
     } catch (error: any) {
-      const errorMessage: Message = {
-        role: 'assistant',
-        content: `Error: ${error.message || 'Failed to get response. Please try again.'}`,
-      }
-      setMessages((prev) => [...prev, errorMessage])
+      appendDelta(`${started ? '\n\n' : ''}Error: ${error.message || 'Failed to get response. Please try again.'}`)
     } finally {
+      setIsStreaming(false)
       setIsLoading(false)
     }
   }
@@ -101,7 +109,7 @@ export default function ChatInterface({
           </div>
         ))}
 
-        {isLoading && (
+        {isLoading && !isStreaming && (
           <div className="flex gap-4 justify-start">
             <div className="flex-shrink-0 w-8 h-8 rounded-full bg-intapp-light/20 flex items-center justify-center">
               <Bot className="w-5 h-5 text-intapp-light" />
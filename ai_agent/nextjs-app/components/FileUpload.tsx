@@ -2,11 +2,11 @@
 
 import { useState, useRef } from 'react'
 import { Upload, AlertCircle, CheckCircle2 } from 'lucide-react'
-import { User } from '@/types'
+import { ProcessedUpload } from '@/types'
 import { processExcelFile } from '@/lib/api'
 
 interface FileUploadProps {
-  onFileProcessed: (users: User[]) => void
+  onFileProcessed: (upload: ProcessedUpload) => void
 }
 
 export default function FileUpload({ onFileProcessed }: FileUploadProps) {
@@ -19,10 +19,10 @@ export default function FileUpload({ onFileProcessed }: FileUploadProps) {
 
   const processFile = async (file: File) => {
     // Validate file type
-    if (!file.name.match(/\.(xlsx|xls)$/i)) {
+    if (!file.name.match(/\.(xlsx|xls|csv|parquet|arrow|feather)$/i)) {
       setUploadStatus({
         type: 'error',
-        message: 'Please upload a valid Excel file (.xlsx or .xls)',
+        message: 'Please upload an Excel (.xlsx, .xls), CSV, Parquet or Arrow file',
       })
       return
     }
@@ -34,11 +34,15 @@ export default function FileUpload({ onFileProcessed }: FileUploadProps) {
       const formData = new FormData()
       formData.append('file', file)
 
-      const users = await processExcelFile(formData)
-      onFileProcessed(users)
+      const upload = await processExcelFile(formData)
+      const { count, rejected } = upload
+      onFileProcessed(upload)
+      const rejectedNote = rejected.length
+        ? ` (${rejected.length} invalid rows skipped, first at row ${rejected[0].row}: ${rejected[0].errors.join('; ')})`
+        : ''
       setUploadStatus({
         type: 'success',
-        message: `Successfully processed ${users.length} users`,
+        message: `Successfully processed ${count} users${rejectedNote}`,
       })
     } catch (error: any) {
       setUploadStatus({
@@ -87,7 +91,7 @@ export default function FileUpload({ onFileProcessed }: FileUploadProps) {
       <input
         ref={fileInputRef}
         type="file"
-        accept=".xlsx,.xls"
+        accept=".xlsx,.xls,.csv,.parquet,.arrow,.feather"
         onChange={handleFileChange}
         className="hidden"
       />
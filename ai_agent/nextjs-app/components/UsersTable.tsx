@@ -1,53 +1,102 @@
 'use client'
 
-import { useState } from 'react'
-import { User } from '@/types'
+import { useEffect, useState } from 'react'
+import { User, UserPage } from '@/types'
+import { getUploadUsers, getUploadExportUrl } from '@/lib/api'
 
 interface UsersTableProps {
-  users: User[]
+  uploadId: string
   onUserClick?: (user: User) => void
 }
 
-export default function UsersTable({ users, onUserClick }: UsersTableProps) {
+type SortField = 'id' | 'email' | 'status'
+
+const SEARCH_DEBOUNCE_MS = 300
+
+// Only the visible page is fetched and rendered; sorting, search and paging run on the server
+export default function UsersTable({ uploadId, onUserClick }: UsersTableProps) {
   const [currentPage, setCurrentPage] = useState(1)
   const [rowsPerPage, setRowsPerPage] = useState(10)
   const [searchTerm, setSearchTerm] = useState('')
+  const [search, setSearch] = useState('')
+  const [sort, setSort] = useState<SortField | undefined>(undefined)
+  const [order, setOrder] = useState<'asc' | 'desc'>('asc')
+  const [page, setPage] = useState<UserPage | null>(null)
+  const [error, setError] = useState<string | null>(null)
+
+  // Wait for typing to pause before querying
+  useEffect(() => {
+    const timer = setTimeout(() => setSearch(searchTerm), SEARCH_DEBOUNCE_MS)
+    return () => clearTimeout(timer)
+  }, [searchTerm])
 
-  // Filter users based on search term
-  const filteredUsers = users.filter(user => {
-    const searchLower = searchTerm.toLowerCase()
-    const userId = user.id.toLowerCase()
-    const email = (user.data.email || '').toLowerCase()
-    return userId.includes(searchLower) || email.includes(searchLower)
-  })
+  useEffect(() => {
+    setCurrentPage(1)
+  }, [uploadId])
 
-  // Calculate pagination
-  const totalPages = Math.ceil(filteredUsers.length / rowsPerPage)
-  const startIndex = (currentPage - 1) * rowsPerPage
-  const endIndex = startIndex + rowsPerPage
-  const paginatedUsers = filteredUsers.slice(startIndex, endIndex)
+  useEffect(() => {
+    let cancelled = false
+    getUploadUsers(uploadId, {
+      offset: (currentPage - 1) * rowsPerPage,
+      limit: rowsPerPage,
+      sort,
+      order,
+      search: search || undefined,
+    })
+      .then((result) => {
+        if (!cancelled) {
+          setPage(result)
+          setError(null)
+        }
+      })
+      .catch((err: any) => {
+        if (!cancelled) {
+          setError(err.response?.data?.detail || err.message || 'Failed to load users')
+        }
+      })
+    // Ignore responses to queries that were superseded
+    return () => {
+      cancelled = true
+    }
+  }, [uploadId, currentPage, rowsPerPage, sort, order, search])
+
+  const paginatedUsers = page?.users || []
+  const matchedRows = page?.matched || 0
+  const totalPages = Math.max(1, Math.ceil(matchedRows / rowsPerPage))
 
   // Get status from user data or default to 'Active'
   const getStatus = (user: User): string => {
     return user.data.status || 'Active'
   }
 
-  const handlePageChange = (page: number) => {
-    if (page >= 1 && page <= totalPages) {
-      setCurrentPage(page)
+  const handlePageChange = (pageNumber: number) => {
+    if (pageNumber >= 1 && pageNumber <= totalPages) {
+      setCurrentPage(pageNumber)
     }
   }
 
   const handleRowsPerPageChange = (e: React.ChangeEvent<HTMLInputElement>) => {
-    const value = parseInt(e.target.value) || 10
+    const value = Math.min(parseInt(e.target.value) || 10, 1000)
     setRowsPerPage(value)
     setCurrentPage(1) // Reset to first page
   }
 
+  const handleSort = (field: SortField) => {
+    if (sort === field) {
+      setOrder(order === 'asc' ? 'desc' : 'asc')
+    } else {
+      setSort(field)
+      setOrder('asc')
+    }
+    setCurrentPage(1)
+  }
+
+  const sortIndicator = (field: SortField) => (sort === field ? (order === 'asc' ? ' ▲' : ' ▼') : '')
+
   return (
     <div className="bg-white rounded-lg shadow-sm border border-gray-200">
       {/* Search Bar */}
-      <div className="p-4 border-b border-gray-200">
+      <div className="p-4 border-b border-gray-200 flex items-center justify-between gap-4">
         <input
           type="text"
           placeholder="Search"
@@ -58,21 +107,37 @@ export default function UsersTable({ users, onUserClick }: UsersTableProps) {
           }}
           className="px-4 py-2 border border-gray-300 rounded focus:outline-none focus:ring-2 focus:ring-intapp-light"
         />
+        <a
+          href={getUploadExportUrl(uploadId, { sort, order, search: search || undefined })}
+          className="text-sm text-blue-600 hover:text-blue-800 hover:underline"
+        >
+          Export (NDJSON)
+        </a>
       </div>
+      {error && <div className="px-4 py-2 text-sm text-red-700 bg-red-50">{error}</div>}
 
       {/* Table */}
       <div className="overflow-x-auto">
         <table className="w-full">
           <thead className="bg-gray-50 border-b border-gray-200">
             <tr>
-              <th className="px-6 py-3 text-left text-xs font-medium text-gray-700 uppercase tracking-wider">
-                User ID
+              <th
+                onClick={() => handleSort('id')}
+                className="px-6 py-3 text-left text-xs font-medium text-gray-700 uppercase tracking-wider cursor-pointer select-none"
+              >
+                User ID{sortIndicator('id')}
               </th>
-              <th className="px-6 py-3 text-left text-xs font-medium text-gray-700 uppercase tracking-wider">
-                Email
+              <th
+                onClick={() => handleSort('email')}
+                className="px-6 py-3 text-left text-xs font-medium text-gray-700 uppercase tracking-wider cursor-pointer select-none"
+              >
+                Email{sortIndicator('email')}
               </th>
-              <th className="px-6 py-3 text-left text-xs font-medium text-gray-700 uppercase tracking-wider">
-                Status
+              <th
+                onClick={() => handleSort('status')}
+                className="px-6 py-3 text-left text-xs font-medium text-gray-700 uppercase tracking-wider cursor-pointer select-none"
+              >
+                Status{sortIndicator('status')}
               </th>
             </tr>
           </thead>
@@ -80,7 +145,7 @@ export default function UsersTable({ users, onUserClick }: UsersTableProps) {
             {paginatedUsers.length === 0 ? (
               <tr>
                 <td colSpan={3} className="px-6 py-8 text-center text-gray-500">
-                  {searchTerm ? 'No users found matching your search.' : 'No users to display.'}
+                  {search ? 'No users found matching your search.' : page ? 'No users to display.' : 'Loading...'}
                 </td>
               </tr>
             ) : (
@@ -203,7 +268,7 @@ export default function UsersTable({ users, onUserClick }: UsersTableProps) {
         </div>
 
         <div className="text-sm text-gray-700">
-          Total rows: {filteredUsers.length}
+          Total rows: {matchedRows}
         </div>
       </div>
     </div>
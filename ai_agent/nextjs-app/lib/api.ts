@@ -1,5 +1,5 @@
 import axios from 'axios'
-import { User, ChatResponse, UpdateResults } from '@/types'
+import { ChatResponse, UpdateResults, UpdateJob, ProcessedUpload, UserPage, UserQuery } from '@/types'
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'
 
@@ -10,28 +10,169 @@ const api = axios.create({
   },
 })
 
-export async function processExcelFile(file: FormData): Promise<User[]> {
+// One chat session per page load, so the backend keeps this tab's history apart from others
+let sessionId: string | null = null
+
+function getSessionId(): string {
+  if (!sessionId) {
+    sessionId = crypto.randomUUID()
+  }
+  return sessionId
+}
+
+// Users stay on the server under the returned upload_id; see getUploadUsers
+export async function processExcelFile(file: FormData): Promise<ProcessedUpload> {
   const response = await api.post('/process-excel', file, {
+    params: { include_users: false },
     headers: {
       'Content-Type': 'multipart/form-data',
     },
   })
-  return response.data.users
+  return {
+    upload_id: response.data.upload_id,
+    count: response.data.count,
+    rejected: response.data.rejected || [],
+  }
+}
+
+export async function getUploadUsers(uploadId: string, query: UserQuery): Promise<UserPage> {
+  const response = await api.get(`/uploads/${uploadId}/users`, { params: query })
+  return response.data
+}
+
+export function getUploadExportUrl(uploadId: string, query: Omit<UserQuery, 'offset' | 'limit'>): string {
+  const params = new URLSearchParams()
+  for (const [key, value] of Object.entries(query)) {
+    if (value) params.set(key, value)
+  }
+  return `${API_URL}/api/uploads/${uploadId}/export?${params}`
 }
 
 export async function sendChatMessage(
   message: string,
-  processedUsers: User[] | null
+  uploadId: string | null
 ): Promise<ChatResponse> {
   const response = await api.post('/chat', {
     message,
-    processed_users: processedUsers,
+    session_id: getSessionId(),
+    upload_id: uploadId,
   })
   return response.data
 }
 
-export async function updateUsers(users: User[]): Promise<UpdateResults> {
-  const response = await api.post('/update-users', { users })
+// Streams the reply from /chat/stream (server-sent events), calling onDelta per chunk.
+// Resolves with the full reply once the stream ends.
+export async function streamChatMessage(
+  message: string,
+  uploadId: string | null,
+  onDelta: (delta: string) => void
+): Promise<string> {
+  const response = await fetch(`${API_URL}/api/chat/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ message, session_id: getSessionId(), upload_id: uploadId }),
+  })
+  if (!response.ok || !response.body) {
+    throw new Error(`Chat request failed with status ${response.status}`)
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let reply = ''
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    // Events are separated by a blank line; keep any incomplete tail in the buffer
+    const events = buffer.split('\n\n')
+    buffer = events.pop() || ''
+    for (const event of events) {
+      const lines = event.split('\n')
+      const type = lines.find((line) => line.startsWith('event: '))?.slice(7) || 'message'
+      const data = lines.find((line) => line.startsWith('data: '))?.slice(6)
+      if (!data) continue
+      if (type === 'error') {
+        throw new Error(JSON.parse(data).detail)
+      }
+      if (type === 'message') {
+        const delta: string = JSON.parse(data).delta
+        reply += delta
+        onDelta(delta)
+      }
+    }
+  }
+  return reply
+}
+
+const FINISHED_JOB_STATUSES = ['completed', 'cancelled', 'failed']
+const JOB_POLL_INTERVAL_MS = 1000
+export const FAILED_USERS_PAGE_SIZE = 100
+
+export async function startUpdateJob(uploadId: string): Promise<UpdateJob> {
+  const response = await api.post('/update-users', { upload_id: uploadId })
   return response.data
 }
 
+export async function getUpdateJob(jobId: string): Promise<UpdateJob> {
+  const response = await api.get(`/jobs/${jobId}`)
+  return response.data
+}
+
+export async function cancelUpdateJob(jobId: string): Promise<UpdateJob> {
+  const response = await api.post(`/jobs/${jobId}/cancel`)
+  return response.data
+}
+
+export async function getUpdateJobResults(
+  jobId: string,
+  offset = 0,
+  limit?: number,
+  failedOnly = false
+): Promise<Record<string, boolean>> {
+  const response = await api.get(`/jobs/${jobId}/results`, {
+    params: { offset, limit, failed_only: failedOnly },
+  })
+  return response.data.results
+}
+
+export async function getFailedUsers(
+  jobId: string,
+  offset = 0,
+  limit = FAILED_USERS_PAGE_SIZE
+): Promise<string[]> {
+  return Object.keys(await getUpdateJobResults(jobId, offset, limit, true))
+}
+
+export async function updateUsers(
+  uploadId: string,
+  onProgress?: (job: UpdateJob) => void
+): Promise<UpdateResults> {
+  let job = await startUpdateJob(uploadId)
+  onProgress?.(job)
+
+  while (!FINISHED_JOB_STATUSES.includes(job.status)) {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+    job = await getUpdateJob(job.job_id)
+    onProgress?.(job)
+  }
+
+  // The counts come with the job; only the first page of failures is downloaded
+  const failedUsers = job.failed > 0 ? await getFailedUsers(job.job_id) : []
+  return {
+    jobId: job.job_id,
+    total: job.processed,
+    successful: job.successful,
+    failed: job.failed,
+    failedUsers,
+    error:
+      job.status === 'failed'
+        ? job.error || 'Update job failed'
+        : job.status === 'cancelled'
+          ? `Update cancelled after ${job.processed}/${job.total} users`
+          : undefined,
+  }
+}
+
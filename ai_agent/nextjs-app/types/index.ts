@@ -3,20 +3,69 @@ export interface User {
   data: Record<string, any>
 }
 
+export interface RejectedRow {
+  row: number
+  id: string | null
+  errors: string[]
+  sheet?: string
+}
+
+// A processed file kept on the server; its users are fetched a page at a time
+export interface ProcessedUpload {
+  upload_id: string
+  count: number
+  rejected: RejectedRow[]
+}
+
+export interface UserPage {
+  upload_id: string
+  total: number
+  matched: number
+  offset: number
+  limit: number
+  users: User[]
+}
+
+export interface UserQuery {
+  offset: number
+  limit: number
+  sort?: string
+  order?: 'asc' | 'desc'
+  search?: string
+}
+
 export interface Message {
   role: 'user' | 'assistant'
   content: string
 }
 
 export interface UpdateResults {
+  jobId?: string
   total: number
   successful: number
   failed: number
-  results: Record<string, boolean>
+  // The first page of failed user ids; more are loaded on demand
+  failedUsers: string[]
   error?: string
 }
 
+export type JobStatus = 'queued' | 'running' | 'completed' | 'cancelled' | 'failed'
+
+export interface UpdateJob {
+  job_id: string
+  status: JobStatus
+  total: number
+  processed: number
+  successful: number
+  failed: number
+  unchanged: number
+  skipped: number
+  cancel_requested: boolean
+  error: string | null
+}
+
 export interface ChatResponse {
   message: string
+  session_id: string
 }
 
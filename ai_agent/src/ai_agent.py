@@ -1,10 +1,15 @@
 """AI Agent using Google AI SDK for chat interface."""
 import google.generativeai as genai
 import logging
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterator
 from config import GOOGLE_AI_API_KEY, MODEL_NAME
 from excel_processor import ExcelProcessor
 from user_service_client import UserServiceClient
+from context_builder import ContextBuilder
+from response_cache import ResponseCache
+from user_snapshot import UserSnapshot
+from update_journal import UpdateJournal
+from user_table import user_ids
 
 logger = logging.getLogger(__name__)
 
@@ -12,14 +17,39 @@ logger = logging.getLogger(__name__)
 class AIAgent:
     """AI Agent that handles chat interactions and user data processing."""
     
-    def __init__(self):
-        if not GOOGLE_AI_API_KEY:
-            raise ValueError("GOOGLE_AI_API_KEY must be set in environment variables or .env file")
-        
-        genai.configure(api_key=GOOGLE_AI_API_KEY)
-        self.model = genai.GenerativeModel(MODEL_NAME)
-        self.excel_processor = ExcelProcessor()
-        self.user_service_client = UserServiceClient()
+    def __init__(self, max_prompt_tokens: int = 4000, recent_turns: int = 5, model=None,
+                 excel_processor: Optional[ExcelProcessor] = None,
+                 user_service_client: Optional[UserServiceClient] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 user_snapshot: Optional[UserSnapshot] = None,
+                 update_journal: Optional[UpdateJournal] = None):
+        """
+        Args:
+            max_prompt_tokens: Token budget for each chat prompt
+            recent_turns: Number of most recent turns kept verbatim when they fit
+            model: Optional object with a generate_content method, used instead of
+                the Gemini model (e.g. a fake model in tests)
+            excel_processor: Optional processor to share with other agents
+            user_service_client: Optional client (and its connection pool) to share with other agents
+            response_cache: Optional cache of responses keyed by the full prompt, so repeated
+                turns (e.g. the greeting) skip the model call
+            user_snapshot: Optional snapshot of previously applied data; when set, updates
+                only send users and fields that changed since the last successful update
+            update_journal: Optional journal of applied users; when set, an update that was
+                interrupted resumes where it stopped instead of starting over
+        """
+        if model is None:
+            if not GOOGLE_AI_API_KEY:
+                raise ValueError("GOOGLE_AI_API_KEY must be set in environment variables or .env file")
+            
+            genai.configure(api_key=GOOGLE_AI_API_KEY)
+            model = genai.GenerativeModel(MODEL_NAME)
+        self.model = model
+        self.excel_processor = excel_processor or ExcelProcessor()
+        self.user_service_client = user_service_client or UserServiceClient()
+        self.response_cache = response_cache
+        self.user_snapshot = user_snapshot
+        self.update_journal = update_journal
         self.conversation_history = []
         
         # System prompt
@@ -32,6 +62,44 @@ class AIAgent:
         5. Provide clear feedback on the results
         
         Be friendly, professional, and helpful. Always confirm actions before executing them."""
+        
+        # Older turns are summarised or dropped to keep prompts within the budget
+        self.context_builder = ContextBuilder(self.system_prompt, max_prompt_tokens, recent_turns)
+        self.last_prompt_stats = None
+    
+    def _attach_file(self, user_message: str, file_content: bytes) -> str:
+        """Process an uploaded Excel file and append its context to the user message."""
+        users, rejected = self.excel_processor.process_excel_file_with_report(file_content)
+        num_users = len(users)
+        
+        # Add context about the processed file
+        file_context = f"\n[System: User uploaded an Excel file with {num_users} users. "
+        if rejected:
+            file_context += f"{len(rejected)} rows failed validation and were left out: {rejected[:3]}... "
+        file_context += f"Ready to update user service. Users: {users[:3]}...]"
+        
+        # Store processed users for potential update
+        self.processed_users = users
+        return user_message + file_context
+    
+    def _file_error_message(self, error: Exception) -> str:
+        logger.error(f"Error processing Excel file: {str(error)}")
+        return f"I encountered an error while processing your Excel file: {str(error)}\n\nPlease check that your file:\n- Is a valid Excel file (.xlsx or .xls)\n- Contains an 'id' column\n- Has no duplicate IDs\n\nWould you like to try uploading another file?"
+    
+    def _record_turn(self, user_message: str, assistant_message: str, prompt_stats: Dict, response):
+        """Store a completed turn and its prompt token counts."""
+        prompt_stats['cached'] = response is None
+        # Record the model's own count next to the estimate when it reports one
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None and getattr(usage, 'prompt_token_count', None):
+            prompt_stats['reported_prompt_tokens'] = usage.prompt_token_count
+        self.last_prompt_stats = prompt_stats
+        logger.info(f"Chat prompt tokens: {prompt_stats}")
+        
+        self.conversation_history.append({
+            'user': user_message,
+            'assistant': assistant_message
+        })
     
     def chat(self, user_message: str, file_content: Optional[bytes] = None) -> str:
         """
@@ -47,51 +115,87 @@ class AIAgent:
         # If file is provided, process it
         if file_content:
             try:
-                users = self.excel_processor.process_excel_file(file_content)
-                num_users = len(users)
-                
-                # Add context about the processed file
-                file_context = f"\n[System: User uploaded an Excel file with {num_users} users. "
-                file_context += f"Ready to update user service. Users: {users[:3]}...]"
-                user_message += file_context
-                
-                # Store processed users for potential update
-                self.processed_users = users
-                
+                user_message = self._attach_file(user_message, file_content)
             except Exception as e:
-                error_msg = f"Error processing Excel file: {str(e)}"
-                logger.error(error_msg)
-                return f"I encountered an error while processing your Excel file: {str(e)}\n\nPlease check that your file:\n- Is a valid Excel file (.xlsx or .xls)\n- Contains an 'id' column\n- Has no duplicate IDs\n\nWould you like to try uploading another file?"
+                return self._file_error_message(e)
+        
+        # Build conversation context within the token budget
+        conversation_text, prompt_stats = self.context_builder.build(self.conversation_history, user_message)
         
-        # Build conversation context
-        conversation_text = self.system_prompt + "\n\n"
-        for msg in self.conversation_history[-5:]:  # Keep last 5 messages for context
-            conversation_text += f"User: {msg['user']}\nAssistant: {msg['assistant']}\n\n"
-        conversation_text += f"User: {user_message}\nAssistant:"
+        cached = self.response_cache.get(conversation_text) if self.response_cache is not None else None
+        if cached is not None:
+            self._record_turn(user_message, cached, prompt_stats, None)
+            return cached
         
         try:
             # Generate response
             response = self.model.generate_content(conversation_text)
             assistant_message = response.text
             
-            # Store in conversation history
-            self.conversation_history.append({
-                'user': user_message,
-                'assistant': assistant_message
-            })
-            
+            self._record_turn(user_message, assistant_message, prompt_stats, response)
+            if self.response_cache is not None:
+                self.response_cache.put(conversation_text, assistant_message)
             return assistant_message
             
         except Exception as e:
             logger.error(f"Error generating AI response: {str(e)}")
             return f"I encountered an error: {str(e)}. Please try again."
     
-    def update_users(self, users: Optional[List[Dict]] = None) -> Dict:
+    def chat_stream(self, user_message: str, file_content: Optional[bytes] = None) -> Iterator[str]:
+        """
+        Like chat, but yields the response in chunks as the model generates it.
+        
+        The turn is added to the conversation history once the stream completes.
+        Errors are yielded as a final chunk rather than raised.
+        
+        Args:
+            user_message: The user's message
+            file_content: Optional bytes content of an uploaded Excel file
+            
+        Yields:
+            Text chunks of the agent's response
+        """
+        if file_content:
+            try:
+                user_message = self._attach_file(user_message, file_content)
+            except Exception as e:
+                yield self._file_error_message(e)
+                return
+        
+        conversation_text, prompt_stats = self.context_builder.build(self.conversation_history, user_message)
+        
+        cached = self.response_cache.get(conversation_text) if self.response_cache is not None else None
+        if cached is not None:
+            # Recorded before yielding: a consumer may close the stream after the only chunk
+            self._record_turn(user_message, cached, prompt_stats, None)
+            yield cached
+            return
+        
+        chunks = []
+        try:
+            response = self.model.generate_content(conversation_text, stream=True)
+            for chunk in response:
+                text = chunk.text
+                if text:
+                    chunks.append(text)
+                    yield text
+        except Exception as e:
+            logger.error(f"Error generating AI response: {str(e)}")
+            yield f"I encountered an error: {str(e)}. Please try again."
+            return
+        
+        assistant_message = "".join(chunks)
+        self._record_turn(user_message, assistant_message, prompt_stats, response)
+        if self.response_cache is not None:
+            self.response_cache.put(conversation_text, assistant_message)
+    
+    def update_users(self, users: Optional[List[Dict]] = None, full: bool = False) -> Dict:
         """
         Update users in the user service.
         
         Args:
-            users: Optional list of users to update (uses processed_users if not provided)
+            users: Optional list or UserTable of users to update (uses processed_users if not provided)
+            full: Send every user in full even when a user snapshot is configured
             
         Returns:
             Dictionary with update results
@@ -101,7 +205,33 @@ class AIAgent:
                 return {"error": "No users to update. Please upload an Excel file first."}
             users = self.processed_users
         
-        results = self.user_service_client.patch_users_batch(users)
+        # Skip users that an interrupted earlier run of this batch already applied
+        journal_key, writer, resume_stats = None, None, {'resumed': False, 'skipped': 0}
+        pending = users
+        if self.update_journal is not None:
+            journal_key, pending, resume_stats = self.update_journal.start(users)
+            writer = self.update_journal.writer(journal_key)
+        
+        diff_stats = None
+        try:
+            if self.user_snapshot is not None and not full:
+                results, diff_stats = self.user_snapshot.patch_changed(self.user_service_client, pending, on_result=writer)
+            else:
+                results = self.user_service_client.patch_users_batch(pending, on_result=writer)
+                if self.user_snapshot is not None:
+                    self.user_snapshot.record(pending, results)
+        finally:
+            if writer is not None:
+                writer.close()
+        
+        if self.user_snapshot is not None and resume_stats['skipped']:
+            # The interrupted run may have died before recording them in the snapshot
+            skipped = self.update_journal.skipped_users(users, pending)
+            self.user_snapshot.record(skipped, {user_id: True for user_id in user_ids(skipped)})
+        if journal_key is not None and all(results.values()):
+            self.update_journal.finish(journal_key)
+        for user_id in user_ids(users):
+            results.setdefault(user_id, True)
         
         # Calculate statistics
         total = len(results)
@@ -112,6 +242,9 @@ class AIAgent:
             "total": total,
             "successful": successful,
             "failed": failed,
+            "unchanged": diff_stats['unchanged'] if diff_stats else 0,
+            "resumed": resume_stats['resumed'],
+            "skipped": resume_stats['skipped'],
             "results": results
         }
     
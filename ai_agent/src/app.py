@@ -1,8 +1,14 @@
 """Streamlit app for the AI Agent."""
 import streamlit as st
 import logging
+import os
+from typing import Optional
 from ai_agent import AIAgent
 from excel_processor import ExcelProcessor
+from upload_cache import ParsedUploadCache
+from response_cache import ResponseCache, create_response_cache
+from user_snapshot import UserSnapshot
+from update_journal import UpdateJournal
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -14,10 +20,50 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def get_upload_cache() -> ParsedUploadCache:
+    """Process-wide cache of parsed uploads, shared across reruns and sessions."""
+    return ParsedUploadCache(disk_dir=os.getenv("UPLOAD_CACHE_DIR") or None)
+
+
+@st.cache_data(max_entries=8, show_spinner="Processing sheets...")
+def get_workbook_result(file_content: bytes) -> dict:
+    """Multi-sheet parse of a workbook, cached by content across reruns."""
+    return ExcelProcessor().process_workbook(file_content)
+
+
+@st.cache_resource
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide cache of model responses, if RESPONSE_CACHE enables one; repeated turns then skip the model."""
+    return create_response_cache(
+        os.getenv("RESPONSE_CACHE", "none"),
+        os.getenv("RESPONSE_CACHE_PATH", ".response_cache"),
+        ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+    )
+
+
+@st.cache_resource
+def get_user_snapshot():
+    """Snapshot of applied user data (USER_SNAPSHOT_PATH), so updates only send what changed."""
+    path = os.getenv("USER_SNAPSHOT_PATH")
+    return UserSnapshot(path) if path else None
+
+
+@st.cache_resource
+def get_update_journal():
+    """Checkpoint journal (UPDATE_JOURNAL_DIR), so an interrupted update resumes instead of restarting."""
+    directory = os.getenv("UPDATE_JOURNAL_DIR")
+    return UpdateJournal(directory) if directory else None
+
+
 # Initialize session state
 if 'agent' not in st.session_state:
     try:
-        st.session_state.agent = AIAgent()
+        st.session_state.agent = AIAgent(
+            response_cache=get_response_cache(),
+            user_snapshot=get_user_snapshot(),
+            update_journal=get_update_journal(),
+        )
         st.session_state.messages = []
     except ValueError as e:
         st.error(f"Configuration error: {str(e)}")
@@ -41,7 +87,7 @@ with st.sidebar:
     st.header("📁 Upload Excel File")
     uploaded_file = st.file_uploader(
         "Choose an Excel file",
-        type=['xlsx', 'xls'],
+        type=['xlsx', 'xls', 'csv', 'parquet', 'arrow', 'feather'],
         help="Upload an Excel file with user data. Must include an 'id' column."
     )
     
@@ -49,12 +95,32 @@ with st.sidebar:
         file_content = uploaded_file.read()
         st.success(f"File uploaded: {uploaded_file.name}")
         
-        # Process file immediately
+        all_sheets = st.checkbox("Process all sheets", help="Merge users from every sheet of the workbook")
+        
+        # Process file immediately (cached by content hash across reruns)
         try:
             processor = ExcelProcessor()
-            users = processor.process_excel_file(file_content)
+            if all_sheets:
+                result = get_workbook_result(file_content)
+                users = result['users']
+                rejected = [
+                    {**report, 'sheet': name}
+                    for name, sheet in result['sheets'].items() for report in sheet['rejected']
+                ]
+                with st.expander("Sheets"):
+                    st.json(result['sheets'])
+                if result['duplicate_ids']:
+                    st.warning(f"⚠️ {len(result['duplicate_ids'])} IDs appear in more than one sheet and were left out")
+            else:
+                users, rejected = get_upload_cache().get_or_process_with_report(processor, file_content)
             st.session_state.processed_users = users
             st.info(f"✅ Processed {len(users)} users from the file")
+            if rejected:
+                st.warning(f"⚠️ {len(rejected)} rows failed validation and were left out")
+                with st.expander("Rejected Rows"):
+                    st.dataframe([
+                        {**report, 'errors': "; ".join(report['errors'])} for report in rejected
+                    ])
             
             # Show preview
             with st.expander("Preview Users"):
@@ -75,6 +141,10 @@ with st.sidebar:
                     st.error(results["error"])
                 else:
                     st.success(f"✅ Updated {results['successful']}/{results['total']} users successfully")
+                    if results['resumed']:
+                        st.info(f"↩️ Resumed an interrupted update: {results['skipped']} users were already applied")
+                    if results['unchanged'] > 0:
+                        st.info(f"⏭️ {results['unchanged']} users were unchanged since the last update and were skipped")
                     if results['failed'] > 0:
                         st.warning(f"⚠️ {results['failed']} users failed to update")
                     
@@ -106,19 +176,16 @@ if prompt := st.chat_input("Ask me to help you upload and process user data...")
     if uploaded_file is not None and st.session_state.processed_users is None:
         file_content = uploaded_file.read()
     
-    # Generate and display assistant response
+    # Generate and display assistant response, rendering chunks as they arrive
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            response = st.session_state.agent.chat(prompt, file_content)
-            st.markdown(response)
+        response = st.write_stream(st.session_state.agent.chat_stream(prompt, file_content))
     
     st.session_state.messages.append({"role": "assistant", "content": response})
 
 # Initialize conversation if empty
 if len(st.session_state.messages) == 0:
-    initial_message = st.session_state.agent.chat("Hello! I'm ready to help you upload and process user data from Excel files.")
-    st.session_state.messages.append({"role": "assistant", "content": initial_message})
     with st.chat_message("assistant"):
-        st.markdown(initial_message)
+        initial_message = st.write_stream(st.session_state.agent.chat_stream("Hello! I'm ready to help you upload and process user data from Excel files."))
+    st.session_state.messages.append({"role": "assistant", "content": initial_message})
 
 
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Benchmarks for the user import pipeline.
+
+Usage:
+    python benchmark.py convert [rows ...]
+    python benchmark.py formats [rows ...]
+    python benchmark.py memory [rows ...]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+import numpy as np
+import pandas as pd
+from excel_processor import ExcelProcessor, pa
+
+
+def make_users_frame(rows: int, null_ratio: float = 0.1) -> pd.DataFrame:
+    """Build a synthetic user sheet with some missing values."""
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame({
+        'id': np.arange(1, rows + 1),
+        'name': [f"User {i}" for i in range(rows)],
+        'email': [f"user{i}@example.com" for i in range(rows)],
+        'phone': rng.integers(1_000_000_000, 9_999_999_999, rows).astype(str),
+        'role': rng.choice(['admin', 'user', 'viewer'], rows),
+        'score': rng.normal(50, 10, rows),
+    })
+    for col in ['email', 'phone', 'score']:
+        df.loc[rng.random(rows) < null_ratio, col] = None
+    return df
+
+
+def convert_iterrows(df: pd.DataFrame) -> list:
+    """The original row-by-row conversion, kept as the baseline."""
+    users = []
+    df = df.where(pd.notna(df), None)
+    for _, row in df.iterrows():
+        user_id = str(row.get('id', ''))
+        if not user_id:
+            continue
+        user_data = {col: row[col] for col in df.columns if col != 'id' and row[col] is not None}
+        users.append({'id': user_id, 'data': user_data})
+    return users
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def bench_convert(sizes):
+    processor = ExcelProcessor()
+    print(f"{'rows':>10} {'iterrows (s)':>14} {'columnar (s)':>14} {'speedup':>9}")
+    for rows in sizes:
+        df = make_users_frame(rows)
+        baseline = timed(convert_iterrows, df)
+        columnar = timed(processor.convert_to_user_format, df)
+        print(f"{rows:>10} {baseline:>14.3f} {columnar:>14.3f} {baseline / columnar:>8.1f}x")
+
+
+def encode_frame(df: pd.DataFrame, file_format: str) -> bytes:
+    """Serialize a frame as an upload in the given format."""
+    buffer = BytesIO()
+    if file_format == 'xlsx':
+        df.to_excel(buffer, index=False)
+    elif file_format == 'csv':
+        df.to_csv(buffer, index=False)
+    elif file_format == 'parquet':
+        df.to_parquet(buffer, index=False)
+    elif file_format == 'arrow':
+        df.to_feather(buffer)
+    return buffer.getvalue()
+
+
+def bench_formats(sizes):
+    processor = ExcelProcessor()
+    formats = ['xlsx', 'csv', 'parquet', 'arrow']
+    print(f"{'rows':>10} {'format':>8} {'size (MB)':>10} {'read (s)':>10} {'pipeline (s)':>13} {'vs xlsx':>8}")
+    for rows in sizes:
+        df = make_users_frame(rows)
+        xlsx_read = None
+        for file_format in formats:
+            content = encode_frame(df, file_format)
+            read = timed(processor.read_file, content)
+            pipeline = timed(processor.process_excel_file, content)
+            xlsx_read = xlsx_read or read
+            print(f"{rows:>10} {file_format:>8} {len(content) / 1e6:>10.1f} {read:>10.3f} "
+                  f"{pipeline:>13.3f} {xlsx_read / read:>7.1f}x")
+
+
+def retained_bytes(func, *args) -> int:
+    """Memory still held by the result of func(*args): Python heap plus Arrow buffers."""
+    gc.collect()
+    arrow_before = pa.total_allocated_bytes() if pa is not None else 0
+    tracemalloc.start()
+    result = func(*args)
+    gc.collect()
+    python_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    arrow_bytes = (pa.total_allocated_bytes() - arrow_before) if pa is not None else 0
+    del result
+    return python_bytes + arrow_bytes
+
+
+def bench_memory(sizes):
+    """Memory retained by the converted users, measured from the uploaded file onwards."""
+    processor = ExcelProcessor()
+    print(f"{'rows':>10} {'source':>8} {'dicts (MB)':>11} {'table (MB)':>11} {'ratio':>7}")
+    for rows in sizes:
+        content = encode_frame(make_users_frame(rows), 'csv')
+        # Excel uploads are read into object columns, CSV/Parquet/Arrow into Arrow-backed ones
+        loaders = {
+            'excel': lambda: make_users_frame(rows),
+            'csv': lambda: processor.read_file(content),
+        }
+        for source, load in loaders.items():
+            dicts = retained_bytes(lambda: processor.convert_to_user_format(load()))
+            table = retained_bytes(lambda: processor.convert_to_user_table(load()))
+            print(f"{rows:>10} {source:>8} {dicts / 1e6:>11.1f} {table / 1e6:>11.1f} {dicts / table:>6.1f}x")
+
+
+BENCHMARKS = {
+    'convert': (bench_convert, [10_000, 100_000, 1_000_000]),
+    'formats': (bench_formats, [10_000, 100_000]),
+    'memory': (bench_memory, [10_000, 100_000, 1_000_000]),
+}
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else 'convert'
+    if name not in BENCHMARKS:
+        print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+        sys.exit(1)
+    func, default_sizes = BENCHMARKS[name]
+    sizes = [int(arg) for arg in sys.argv[2:]] or default_sizes
+    func(sizes)
@@ -0,0 +1,114 @@
+"""Token-budgeted prompt builder for the AI agent's chat turns."""
+import logging
+import math
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about 4 characters per token for English text)."""
+    return math.ceil(len(text) / 4)
+
+
+class ContextBuilder:
+    """
+    Builds the prompt for a chat turn within a fixed token budget.
+
+    The system prompt prefix is rendered and counted once. The current message is
+    always included. The most recent turns are then added verbatim, newest first,
+    while they fit. Older turns, and recent ones that no longer fit, are condensed
+    into truncated one-line summaries. Whatever does not fit is dropped.
+    """
+
+    def __init__(self, system_prompt: str, max_prompt_tokens: int = 4000, recent_turns: int = 5,
+                 summary_chars: int = 160, token_counter: Optional[Callable[[str], int]] = None):
+        """
+        Args:
+            system_prompt: Static instructions placed at the top of every prompt
+            max_prompt_tokens: Token budget for the whole prompt
+            recent_turns: Number of most recent turns kept verbatim when they fit
+            summary_chars: Characters kept per message when a turn is summarised
+            token_counter: Optional callable returning the token count of a text
+                (defaults to estimate_tokens)
+        """
+        self.max_prompt_tokens = max_prompt_tokens
+        self.recent_turns = max(0, recent_turns)
+        self.summary_chars = summary_chars
+        # Memoise counts: history turns are re-counted on every call otherwise
+        self.count_tokens = lru_cache(maxsize=1024)(token_counter or estimate_tokens)
+        self.prefix = system_prompt + "\n\n"
+        self.prefix_tokens = self.count_tokens(self.prefix)
+
+    def _truncate(self, text: str) -> str:
+        text = " ".join(text.split())
+        if len(text) <= self.summary_chars:
+            return text
+        return text[:self.summary_chars].rstrip() + "..."
+
+    def _render_turn(self, turn: Dict) -> str:
+        return f"User: {turn['user']}\nAssistant: {turn['assistant']}\n\n"
+
+    def _render_summary(self, turn: Dict) -> str:
+        return f"- User: {self._truncate(turn['user'])} / Assistant: {self._truncate(turn['assistant'])}\n"
+
+    def build(self, history: List[Dict], user_message: str) -> Tuple[str, Dict]:
+        """
+        Build the prompt for a new user message.
+
+        Args:
+            history: Previous turns as {'user': ..., 'assistant': ...}, oldest first
+            user_message: The new user message
+
+        Returns:
+            Tuple of (prompt, stats) where stats holds the token counts per section
+            and how many turns were kept, summarised or dropped
+        """
+        current = f"User: {user_message}\nAssistant:"
+        current_tokens = self.count_tokens(current)
+        remaining = self.max_prompt_tokens - self.prefix_tokens - current_tokens
+        if remaining < 0:
+            logger.warning(f"Prompt exceeds the token budget by {-remaining} tokens before adding history")
+
+        summary_header = "Earlier in the conversation:\n"
+        summary_header_tokens = self.count_tokens(summary_header)
+
+        verbatim, summaries = [], []
+        history_tokens = summary_tokens = 0
+        for age, turn in enumerate(reversed(history)):
+            # Once one turn is summarised, older ones are too, so the order is kept
+            if age < self.recent_turns and not summaries:
+                text = self._render_turn(turn)
+                tokens = self.count_tokens(text)
+                if tokens <= remaining:
+                    verbatim.append(text)
+                    history_tokens += tokens
+                    remaining -= tokens
+                    continue
+            text = self._render_summary(turn)
+            tokens = self.count_tokens(text) + (0 if summaries else summary_header_tokens)
+            if tokens > remaining:
+                break
+            summaries.append(text)
+            summary_tokens += tokens
+            remaining -= tokens
+
+        parts = [self.prefix]
+        if summaries:
+            parts.append(summary_header + "".join(reversed(summaries)) + "\n")
+        parts.extend(reversed(verbatim))
+        parts.append(current)
+        prompt = "".join(parts)
+
+        stats = {
+            'system_tokens': self.prefix_tokens,
+            'history_tokens': history_tokens,
+            'summary_tokens': summary_tokens,
+            'message_tokens': current_tokens,
+            'prompt_tokens': self.prefix_tokens + history_tokens + summary_tokens + current_tokens,
+            'turns_verbatim': len(verbatim),
+            'turns_summarized': len(summaries),
+            'turns_dropped': len(history) - len(verbatim) - len(summaries),
+        }
+        return prompt, stats
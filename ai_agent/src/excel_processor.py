@@ -1,18 +1,108 @@
 """Module for processing Excel files with user data."""
 import pandas as pd
+import numpy as np
 import logging
-from typing import List, Dict, Optional, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Dict, Optional, Tuple, Iterator
 from io import BytesIO
+from openpyxl import load_workbook
+from user_table import UserTable
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional: needed for Parquet/Arrow uploads and the fast CSV reader
+    pa = None
 
 logger = logging.getLogger(__name__)
 
+# Leading bytes identifying each binary upload format; anything else is read as CSV
+FILE_SIGNATURES = [
+    (b'PK\x03\x04', 'xlsx'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'xls'),
+    (b'PAR1', 'parquet'),
+    (b'ARROW1', 'arrow'),
+    (b'\xff\xff\xff\xff', 'arrow_stream'),
+]
+
+
+def detect_format(file_content: bytes) -> str:
+    """Sniff the upload format from its leading bytes: xlsx, xls, parquet, arrow, arrow_stream or csv."""
+    for signature, file_format in FILE_SIGNATURES:
+        if file_content.startswith(signature):
+            return file_format
+    return 'csv'
+
+
+# Column rules applied by ExcelProcessor.validate_rows. Supported keys:
+#   required: the column must exist in the file
+#   nullable: empty cells are allowed (default True)
+#   type:     'string', 'integer', 'number', 'boolean' or 'date'
+#   pattern:  regex the whole value (as text) must match
+#   enum:     list of allowed values
+#   unique:   values must not repeat within the file (in streaming mode, the
+#             first occurrence is kept and later ones are rejected)
+# Free-form columns such as name, role and status carry no type rule: files hold
+# them as numbers or booleans too, and the user service accepts those as before.
+DEFAULT_SCHEMA = {
+    'id': {'required': True, 'nullable': False},
+    'email': {'pattern': r"[^@\s]+@[^@\s]+\.[^@\s]+"},
+    'phone': {'pattern': r"\+?[0-9][0-9 ().\-]{5,19}"},
+}
+
+BOOLEAN_VALUES = [True, False, 'true', 'false', 'True', 'False', 'TRUE', 'FALSE', 'yes', 'no', 1, 0]
+
+
+def _type_mask(values: pd.Series, expected: str) -> pd.Series:
+    """Boolean mask of the non-null values that are of (or convert cleanly to) the expected type."""
+    if expected == 'string':
+        if pd.api.types.is_string_dtype(values) and values.dtype != object:
+            return pd.Series(True, index=values.index)
+        return values.map(lambda value: isinstance(value, str))
+    if expected in ('integer', 'number'):
+        numbers = pd.to_numeric(values, errors='coerce')
+        if expected == 'number':
+            return numbers.notna()
+        numbers = numbers.astype('float64')
+        return pd.Series(np.isfinite(numbers) & (np.floor(numbers) == numbers), index=values.index)
+    if expected == 'boolean':
+        return values.isin(BOOLEAN_VALUES)
+    if expected == 'date':
+        return pd.to_datetime(values, errors='coerce', format='mixed').notna()
+    raise ValueError(f"Unknown column type '{expected}'")
+
+
+def _process_sheet(file_content: bytes, sheet_name: str, schema: Dict[str, Dict]) -> Dict:
+    """Parse, validate and convert one sheet; runs in a worker process in multi-sheet mode."""
+    processor = ExcelProcessor(schema)
+    result = {'sheet': sheet_name, 'rows': 0, 'users': UserTable.concat([]), 'valid': False, 'errors': [], 'rejected': []}
+    try:
+        df = processor.read_excel(file_content, sheet_name)
+        result['rows'] = len(df)
+        result['valid'], result['errors'] = processor.validate_data(df)
+        if result['valid']:
+            df, result['rejected'] = processor.filter_rejected(df)
+            result['users'] = processor.convert_to_user_table(df)
+    except Exception as e:
+        result['errors'] = [str(e)]
+    return result
+
 
 class ExcelProcessor:
     """Processes Excel files and converts them to the required format."""
     
-    def __init__(self):
-        self.required_fields = ['id']  # Minimum required field
-        self.optional_fields = ['name', 'email', 'phone', 'role', 'status']
+    def __init__(self, schema: Optional[Dict[str, Dict]] = None):
+        """
+        Args:
+            schema: Optional column rules (see DEFAULT_SCHEMA); defaults to DEFAULT_SCHEMA
+        """
+        self.schema = {column: dict(rules) for column, rules in (schema or DEFAULT_SCHEMA).items()}
+        self.required_fields = [column for column, rules in self.schema.items() if rules.get('required')]
+        self.optional_fields = [column for column, rules in self.schema.items() if not rules.get('required')]
+        self.stream_batch_size = 5000  # Rows per batch in streaming mode
+        self.max_sheet_workers = 4  # Worker processes in multi-sheet mode
     
     def read_excel(self, file_content: bytes, sheet_name: Optional[str] = None) -> pd.DataFrame:
         """
@@ -45,6 +135,59 @@ class ExcelProcessor:
             logger.error(f"Error reading Excel file: {str(e)}")
             raise
     
+    def read_columnar(self, file_content: bytes, file_format: str) -> pd.DataFrame:
+        """
+        Read a CSV, Parquet or Arrow IPC file from bytes.
+        
+        With pyarrow installed the result is backed by Arrow memory (pd.ArrowDtype
+        columns), so no per-value conversion to Python or NumPy objects happens here.
+        Without pyarrow only CSV is supported, through the default pandas parser.
+        
+        Args:
+            file_content: Bytes content of the file
+            file_format: One of 'csv', 'parquet', 'arrow' or 'arrow_stream'
+            
+        Returns:
+            DataFrame with the file data
+        """
+        if pa is None:
+            if file_format == 'csv':
+                return pd.read_csv(BytesIO(file_content))
+            raise ValueError(f"Reading {file_format} files requires pyarrow")
+        
+        source = pa.BufferReader(file_content)
+        if file_format == 'csv':
+            # Empty cells are nulls, as with pd.read_csv
+            table = pa.csv.read_csv(source, convert_options=pa.csv.ConvertOptions(strings_can_be_null=True))
+        elif file_format == 'parquet':
+            table = pa.parquet.read_table(source)
+        elif file_format == 'arrow':
+            table = pa.ipc.open_file(source).read_all()
+        elif file_format == 'arrow_stream':
+            table = pa.ipc.open_stream(source).read_all()
+        else:
+            raise ValueError(f"Unsupported columnar format: {file_format}")
+        
+        df = table.to_pandas(types_mapper=pd.ArrowDtype)
+        logger.info(f"Successfully read {file_format} file with {len(df)} rows")
+        return df
+    
+    def read_file(self, file_content: bytes, sheet_name: Optional[str] = None) -> pd.DataFrame:
+        """
+        Read an upload in any supported format (Excel, CSV, Parquet or Arrow IPC).
+        
+        Args:
+            file_content: Bytes content of the file
+            sheet_name: Optional sheet name to read (Excel files only)
+            
+        Returns:
+            DataFrame with the file data
+        """
+        file_format = detect_format(file_content)
+        if file_format in ('xlsx', 'xls'):
+            return self.read_excel(file_content, sheet_name)
+        return self.read_columnar(file_content, file_format)
+    
     def validate_data(self, df: pd.DataFrame) -> Tuple[bool, List[str]]:
         """
         Validate that the DataFrame has required fields.
@@ -63,8 +206,9 @@ class ExcelProcessor:
             return False, errors
         
         # Check for required fields
-        if 'id' not in df.columns:
-            errors.append("Excel file must contain an 'id' column")
+        for column in self.required_fields:
+            if column not in df.columns:
+                errors.append(f"Excel file must contain an '{column}' column")
         
         # Check for duplicate IDs
         if 'id' in df.columns:
@@ -74,51 +218,160 @@ class ExcelProcessor:
         
         return len(errors) == 0, errors
     
-    def convert_to_user_format(self, df: pd.DataFrame) -> List[Dict]:
+    def validate_rows(self, df: pd.DataFrame, row_numbers: Optional[np.ndarray] = None,
+                      seen: Optional[Dict[str, set]] = None) -> List[Dict]:
         """
-        Convert DataFrame to the format expected by the user service.
+        Check every row against the column schema.
+        
+        Each rule is evaluated on a whole column at once; only the rows that fail
+        are visited individually, to build the report.
         
         Args:
-            df: DataFrame with user data
+            df: DataFrame to validate (already checked with validate_data)
+            row_numbers: Sheet row number of each row of df; by default the rows
+                are taken to follow the header with no gaps
+            seen: Values of unique columns in earlier batches of the same file, by
+                column; rows repeating one of them are rejected as duplicated, and
+                the values of df are added to it
             
         Returns:
-            List of dictionaries in the format: [{'id': 'user_id', 'data': {...}}]
+            One report per rejected row: {'row': sheet row number (the header is
+            row 1), 'id': the row's id or None, 'errors': ["column: problem", ...]},
+            in row order
         """
-        users = []
-        
-        # Replace NaN values with None for JSON serialization
-        df = df.where(pd.notna(df), None)
-        
-        for _, row in df.iterrows():
-            user_id = str(row.get('id', ''))
-            if not user_id:
-                logger.warning(f"Skipping row without ID: {row.to_dict()}")
+        failures = []
+        for column, rules in self.schema.items():
+            if column not in df.columns:
                 continue
+            values = df[column]
+            present = values.notna().to_numpy()
             
-            # Extract all fields except 'id' as the data to update
-            user_data = {col: row[col] for col in df.columns if col != 'id' and row[col] is not None}
+            checks = []
+            if not rules.get('nullable', True):
+                checks.append((~present, "is required"))
+            if 'type' in rules:
+                checks.append((present & ~_type_mask(values, rules['type']).fillna(False).to_numpy(dtype=bool),
+                               f"must be of type {rules['type']}"))
+            if 'pattern' in rules:
+                text = values.astype(str)
+                matches = text.str.fullmatch(rules['pattern']).fillna(False).to_numpy(dtype=bool)
+                checks.append((present & ~matches, "has an invalid format"))
+            if 'enum' in rules:
+                allowed = values.isin(rules['enum']).to_numpy(dtype=bool)
+                checks.append((present & ~allowed, f"must be one of {', '.join(map(str, rules['enum']))}"))
+            if rules.get('unique'):
+                duplicated = values.duplicated(keep=False).to_numpy(dtype=bool)
+                if seen is not None:
+                    earlier = seen.setdefault(column, set())
+                    duplicated = duplicated | values.isin(earlier).to_numpy(dtype=bool)
+                    earlier.update(values[present])
+                checks.append((present & duplicated, "is duplicated"))
             
-            users.append({
-                'id': user_id,
-                'data': user_data
+            for mask, message in checks:
+                positions = mask.nonzero()[0]
+                if len(positions):
+                    failures.append(pd.DataFrame({'position': positions, 'error': f"{column}: {message}"}))
+        
+        if not failures:
+            return []
+        
+        if row_numbers is None:
+            row_numbers = np.arange(2, len(df) + 2)
+        failures = pd.concat(failures).sort_values('position', kind='stable')
+        ids = df['id'].to_numpy(dtype=object) if 'id' in df.columns else None
+        reports = []
+        for position, errors in failures.groupby('position', sort=True)['error']:
+            user_id = ids[position] if ids is not None else None
+            reports.append({
+                'row': int(row_numbers[position]),
+                'id': None if pd.isna(user_id) else str(user_id),
+                'errors': errors.tolist(),
             })
+        return reports
+    
+    def filter_rejected(self, df: pd.DataFrame, row_numbers: Optional[np.ndarray] = None,
+                        seen: Optional[Dict[str, set]] = None) -> Tuple[pd.DataFrame, List[Dict]]:
+        """
+        Drop the rows that break the column schema.
+        
+        Args:
+            df: DataFrame to filter
+            row_numbers: Sheet row number of each row of df (see validate_rows)
+            seen: Unique-column values of earlier batches (see validate_rows)
+            
+        Returns:
+            Tuple of (DataFrame with the valid rows, per-row reports from validate_rows)
+        """
+        if row_numbers is None:
+            row_numbers = np.arange(2, len(df) + 2)
+        rejected = self.validate_rows(df, row_numbers, seen)
+        if not rejected:
+            return df, rejected
+        
+        keep = np.ones(len(df), dtype=bool)
+        keep[pd.Index(row_numbers).get_indexer([report['row'] for report in rejected])] = False
+        logger.warning(f"Rejected {len(rejected)} rows that break the column schema")
+        return df[keep], rejected
+    
+    def convert_to_user_table(self, df: pd.DataFrame) -> UserTable:
+        """
+        Convert DataFrame to the format expected by the user service, kept column-wise.
+        
+        Args:
+            df: DataFrame with user data
+            
+        Returns:
+            UserTable, a sequence of {'id': 'user_id', 'data': {...}} dicts that
+            are only built on access
+        """
+        if 'id' not in df.columns:
+            logger.warning(f"Skipping {len(df)} rows without ID: no 'id' column")
+            return UserTable.concat([])
+        
+        # Mask out rows whose ID is missing or empty
+        ids = df['id']
+        id_strings = ids.astype(str)
+        has_id = (ids.notna() & (id_strings != '')).to_numpy()
+        skipped = int((~has_id).sum())
+        if skipped:
+            logger.warning(f"Skipping {skipped} rows without ID")
+        
+        # Extract all fields except 'id' as the data to update
+        data_columns = [col for col in df.columns if col != 'id']
+        users = UserTable.from_frame(id_strings[has_id], df.loc[has_id, data_columns])
         
         logger.info(f"Converted {len(users)} users to the required format")
         return users
     
-    def process_excel_file(self, file_content: bytes, sheet_name: Optional[str] = None) -> List[Dict]:
+    def convert_to_user_format(self, df: pd.DataFrame) -> List[Dict]:
+        """
+        Convert DataFrame to the format expected by the user service.
+        
+        Args:
+            df: DataFrame with user data
+            
+        Returns:
+            List of dictionaries in the format: [{'id': 'user_id', 'data': {...}}]
+        """
+        return self.convert_to_user_table(df).to_list()
+    
+    def process_excel_file_with_report(self, file_content: bytes,
+                                       sheet_name: Optional[str] = None) -> Tuple[UserTable, List[Dict]]:
         """
         Complete processing pipeline: read, validate, and convert Excel file.
         
+        CSV, Parquet and Arrow IPC files are accepted as well; see read_file.
+        Rows that break the column schema are left out and reported.
+        
         Args:
-            file_content: Bytes content of the Excel file
-            sheet_name: Optional sheet name to read
+            file_content: Bytes content of the file
+            sheet_name: Optional sheet name to read (Excel files only)
             
         Returns:
-            List of user dictionaries ready for API calls
+            Tuple of (UserTable of users ready for API calls, rejected row reports)
         """
-        # Read Excel file
-        df = self.read_excel(file_content, sheet_name)
+        # Read Excel (or columnar) file
+        df = self.read_file(file_content, sheet_name)
         
         # Validate data
         is_valid, errors = self.validate_data(df)
@@ -126,8 +379,203 @@ class ExcelProcessor:
             error_msg = "; ".join(errors)
             raise ValueError(f"Validation failed: {error_msg}")
         
-        # Convert to user format
-        users = self.convert_to_user_format(df)
+        # Reject rows locally instead of sending them to fail in the user service
+        df, rejected = self.filter_rejected(df)
+        
+        # Convert to user format, without building a dict per user
+        users = self.convert_to_user_table(df)
         
+        return users, rejected
+    
+    def process_excel_file(self, file_content: bytes, sheet_name: Optional[str] = None) -> UserTable:
+        """
+        Complete processing pipeline, without the report of rejected rows.
+        
+        Args:
+            file_content: Bytes content of the file
+            sheet_name: Optional sheet name to read (Excel files only)
+            
+        Returns:
+            UserTable of users ready for API calls (a sequence of user dictionaries)
+        """
+        users, _ = self.process_excel_file_with_report(file_content, sheet_name)
         return users
-
+    
+    def iter_excel_batches(self, file_content: bytes, sheet_name: Optional[str] = None,
+                           batch_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """
+        Read an Excel file row by row and yield it as DataFrame chunks.
+        
+        Uses openpyxl in read-only mode, so only one batch of rows is held in
+        memory at a time. Only .xlsx files are supported in this mode.
+        
+        Args:
+            file_content: Bytes content of the Excel file
+            sheet_name: Optional sheet name to read (reads first sheet if not specified)
+            batch_size: Number of rows per chunk (defaults to self.stream_batch_size)
+            
+        Yields:
+            DataFrames with up to batch_size rows each, indexed by sheet row number
+            (the header is row 1; skipped empty rows keep their numbers)
+        """
+        batch_size = batch_size or self.stream_batch_size
+        workbook = load_workbook(BytesIO(file_content), read_only=True, data_only=True)
+        try:
+            if sheet_name is not None:
+                worksheet = workbook[sheet_name]
+            elif workbook.worksheets:
+                worksheet = workbook.worksheets[0]
+            else:
+                raise ValueError("No sheets found in Excel file")
+            
+            rows = worksheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [
+                str(col) if col is not None else f"Unnamed: {i}"
+                for i, col in enumerate(header)
+            ]
+            
+            batch = []
+            row_numbers = []
+            for row_number, row in enumerate(rows, start=2):
+                # Skip completely empty rows, as pd.read_excel does
+                if all(value is None for value in row):
+                    continue
+                batch.append(row[:len(columns)])
+                row_numbers.append(row_number)
+                if len(batch) >= batch_size:
+                    yield pd.DataFrame.from_records(batch, columns=columns, index=row_numbers)
+                    batch = []
+                    row_numbers = []
+            
+            if batch:
+                yield pd.DataFrame.from_records(batch, columns=columns, index=row_numbers)
+        finally:
+            workbook.close()
+    
+    def process_excel_file_streaming(self, file_content: bytes, sheet_name: Optional[str] = None,
+                                     batch_size: Optional[int] = None) -> Iterator[List[Dict]]:
+        """
+        Streaming processing pipeline: read, validate, and convert an Excel file batch by batch.
+        
+        Peak memory is bounded by the batch size rather than the sheet size. Duplicate
+        IDs are still detected across the whole file, so the set of seen IDs is kept,
+        as are the values of unique columns. Rows that break the column schema are
+        left out of each batch and logged; a unique value repeated in a later batch
+        rejects only the later rows, since the first one was already yielded.
+        
+        Args:
+            file_content: Bytes content of the Excel file
+            sheet_name: Optional sheet name to read
+            batch_size: Number of rows per batch (defaults to self.stream_batch_size)
+            
+        Yields:
+            Lists of user dictionaries ready for API calls, one list per batch
+        """
+        seen_ids = set()
+        seen_unique = {}
+        total_rows = 0
+        
+        for df in self.iter_excel_batches(file_content, sheet_name, batch_size):
+            is_valid, errors = self.validate_data(df)
+            
+            if 'id' in df.columns:
+                batch_ids = set(df['id'].dropna())
+                duplicates = len(batch_ids & seen_ids)
+                if duplicates > 0:
+                    is_valid = False
+                    errors.append(f"Found {duplicates} duplicate IDs in the Excel file")
+                seen_ids |= batch_ids
+            
+            if not is_valid:
+                error_msg = "; ".join(errors)
+                raise ValueError(f"Validation failed (sheet rows {df.index[0]}-{df.index[-1]}): {error_msg}")
+            
+            df, rejected = self.filter_rejected(df, df.index.to_numpy(), seen_unique)
+            for report in rejected:
+                logger.warning(f"Rejected row {report['row']}: {'; '.join(report['errors'])}")
+            total_rows += len(df) + len(rejected)
+            yield self.convert_to_user_format(df)
+        
+        if total_rows == 0:
+            raise ValueError("Validation failed: Excel file is empty")
+        
+        logger.info(f"Streamed {total_rows} rows from Excel file")
+    
+    def get_sheet_names(self, file_content: bytes) -> List[str]:
+        """Return the sheet names of a workbook, in workbook order."""
+        with pd.ExcelFile(BytesIO(file_content)) as workbook:
+            return [str(name) for name in workbook.sheet_names]
+    
+    def process_workbook(self, file_content: bytes, sheet_names: Optional[List[str]] = None,
+                         executor: Optional[Executor] = None) -> Dict:
+        """
+        Multi-sheet pipeline: read, validate and convert several sheets in parallel and merge them.
+        
+        Each sheet is validated on its own; invalid sheets are reported and left out of
+        the merged list. IDs that appear in more than one valid sheet are ambiguous, so
+        they are reported and left out as well.
+        
+        Args:
+            file_content: Bytes content of the Excel file
+            sheet_names: Optional subset of sheets to process (all sheets if not specified)
+            executor: Optional executor to run sheets on, even a single one, so the
+                parse stays off the calling thread (if not specified, a single sheet
+                is parsed inline and several on a process pool with up to
+                self.max_sheet_workers workers)
+            
+        Returns:
+            Dictionary with the merged 'users' (a UserTable), per-sheet diagnostics under 'sheets'
+            ({'rows', 'users', 'valid', 'errors', 'rejected'} per sheet), and 'duplicate_ids'
+            mapping each cross-sheet duplicate to the sheets it appears in
+        """
+        available = self.get_sheet_names(file_content)
+        if not available:
+            raise ValueError("No sheets found in Excel file")
+        if sheet_names is None:
+            sheet_names = available
+        else:
+            missing = [name for name in sheet_names if name not in available]
+            if missing:
+                raise ValueError(f"Sheets not found in Excel file: {', '.join(missing)}")
+        
+        args = (self.schema,)
+        if executor is not None:
+            futures = [executor.submit(_process_sheet, file_content, name, *args) for name in sheet_names]
+            results = [future.result() for future in futures]
+        elif len(sheet_names) == 1:
+            results = [_process_sheet(file_content, sheet_names[0], *args)]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.max_sheet_workers, len(sheet_names))) as pool:
+                futures = [pool.submit(_process_sheet, file_content, name, *args) for name in sheet_names]
+                results = [future.result() for future in futures]
+        
+        # Find IDs shared by several valid sheets
+        id_sheets = {}
+        for result in results:
+            for user_id in result['users'].ids():
+                id_sheets.setdefault(user_id, []).append(result['sheet'])
+        duplicate_ids = {user_id: sheets for user_id, sheets in id_sheets.items() if len(sheets) > 1}
+        if duplicate_ids:
+            logger.warning(f"Found {len(duplicate_ids)} IDs in more than one sheet; they are left out")
+        
+        kept = [
+            result['users'].take(~result['users'].frame['id'].isin(list(duplicate_ids)).to_numpy())
+            for result in results
+        ]
+        users = UserTable.concat(kept)
+        sheets = {
+            result['sheet']: {
+                'rows': result['rows'],
+                'users': len(sheet_users),
+                'valid': result['valid'],
+                'errors': result['errors'],
+                'rejected': result['rejected'],
+            }
+            for result, sheet_users in zip(results, kept)
+        }
+        
+        logger.info(f"Merged {len(users)} users from {len(results)} sheets")
+        return {'users': users, 'sheets': sheets, 'duplicate_ids': duplicate_ids}
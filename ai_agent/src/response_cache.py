@@ -0,0 +1,167 @@
+"""Cache of model responses for repeated chat prompts."""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache(ABC):
+    """
+    Interface for response caches keyed by the normalised prompt.
+
+    Entries expire after ttl_seconds and at most max_entries are kept; the least
+    recently used entries are evicted first.
+    """
+
+    def __init__(self, ttl_seconds: float = 3600, max_entries: int = 1000):
+        """
+        Args:
+            ttl_seconds: Time after which a cached response is ignored
+            max_entries: Maximum number of cached responses
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt: str) -> str:
+        """Hash of the prompt with whitespace collapsed, so formatting differences still hit."""
+        return hashlib.sha256(" ".join(prompt.split()).encode('utf-8')).hexdigest()
+
+    @abstractmethod
+    def _load(self, key: str) -> Optional[Dict]:
+        """Return the stored entry for a key, or None."""
+
+    @abstractmethod
+    def _store(self, key: str, entry: Dict):
+        """Store an entry, evicting the least recently used beyond max_entries."""
+
+    def get(self, prompt: str) -> Optional[str]:
+        """Return the cached response for a prompt, or None on a miss."""
+        entry = self._load(self.make_key(prompt))
+        hit = entry is not None and entry['expires_at'] > time.time()
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry['response'] if hit else None
+
+    def put(self, prompt: str, response: str):
+        self._store(self.make_key(prompt), {'response': response, 'expires_at': time.time() + self.ttl_seconds})
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of stored entries."""
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size."""
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        return {'hits': hits, 'misses': misses, 'entries': len(self)}
+
+
+class InMemoryResponseCache(ResponseCache):
+    """Response cache kept in process memory."""
+
+    def __init__(self, ttl_seconds: float = 3600, max_entries: int = 1000):
+        super().__init__(ttl_seconds, max_entries)
+        self.entries = OrderedDict()
+
+    def _load(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def _store(self, key: str, entry: Dict):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.entries)
+
+
+class FileResponseCache(ResponseCache):
+    """Response cache stored as one JSON file per entry; survives restarts and is shared by processes."""
+
+    def __init__(self, directory: str, ttl_seconds: float = 3600, max_entries: int = 1000):
+        super().__init__(ttl_seconds, max_entries)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _entry_files(self):
+        return [name for name in os.listdir(self.directory) if name.endswith('.json')]
+
+    def _load(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)  # mtime tracks recency for LRU eviction
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable response cache file for {key}: {str(e)}")
+            return None
+
+    def _store(self, key: str, entry: Dict):
+        tmp_path = f"{self._path(key)}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not write response cache file for {key}: {str(e)}")
+            return
+        self._evict()
+
+    def _evict(self):
+        names = self._entry_files()
+        if len(names) <= self.max_entries:
+            return
+        paths = [os.path.join(self.directory, name) for name in names]
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except OSError:
+                pass  # removed by another process
+        for path in sorted(mtimes, key=mtimes.get)[:len(mtimes) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._entry_files())
+
+
+def create_response_cache(kind: str = "none", path: str = ".response_cache",
+                          ttl_seconds: float = 3600, max_entries: int = 1000) -> Optional[ResponseCache]:
+    """Create a response cache by name ('memory', 'file', or 'none' to disable caching)."""
+    if kind == "none":
+        return None
+    if kind == "memory":
+        return InMemoryResponseCache(ttl_seconds, max_entries)
+    if kind == "file":
+        return FileResponseCache(path, ttl_seconds, max_entries)
+    raise ValueError(f"Unknown response cache '{kind}'. Use 'memory', 'file' or 'none'")
@@ -0,0 +1,49 @@
+import os
+import sys
+import types
+
+import pytest
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+# The FastAPI backend (main, jobs, sessions, ...) imports the modules in SRC_DIR
+sys.path.append(os.path.join(os.path.dirname(SRC_DIR), 'nextjs-app', 'backend'))
+
+# config.py holds local credentials and is not checked in; the tests only need its names
+try:
+    import config  # noqa: F401
+except ImportError:
+    config = types.ModuleType('config')
+    config.GOOGLE_AI_API_KEY = 'test-key'
+    config.MODEL_NAME = 'test-model'
+    config.USER_SERVICE_URL = 'http://127.0.0.1:9/api/users'
+    config.USER_SERVICE_API_KEY = ''
+    sys.modules['config'] = config
+
+from stub_server import StubUserService  # noqa: E402
+
+
+@pytest.fixture
+def stub_service():
+    """Stub user service; assign stub_service.respond to change its answers."""
+    stub = StubUserService()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def make_client(stub_service):
+    """UserServiceClient factory pointed at the stub service."""
+    from user_service_client import UserServiceClient
+
+    clients = []
+
+    def make(**kwargs):
+        client = UserServiceClient(**kwargs)
+        client.base_url = f"{stub_service.url}/api/users"
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
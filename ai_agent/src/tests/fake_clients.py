@@ -0,0 +1,53 @@
+"""Fake user service clients and model for tests that do not need HTTP."""
+from user_table import UserTable
+
+
+class RecordingClient:
+    """Fake UserServiceClient that records what is sent and fails the given ids."""
+
+    def __init__(self, failing=()):
+        self.sent = []
+        self.failing = set(failing)
+
+    def patch_users_batch(self, users, on_result=None):
+        users = list(users)
+        self.sent.append(users)
+        results = {user['id']: user['id'] not in self.failing for user in users}
+        for user_id, success in results.items():
+            if on_result:
+                on_result(user_id, success)
+        return results
+
+
+def table(rows):
+    return UserTable.from_records([{'id': user_id, 'data': data} for user_id, data in rows])
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeResponse:
+    def __init__(self, chunks):
+        self.chunks = [FakeChunk(text) for text in chunks]
+        self.usage_metadata = None
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    @property
+    def text(self):
+        return "".join(chunk.text for chunk in self.chunks)
+
+
+class FakeModel:
+    """Stands in for the Gemini model; answers every prompt with the same chunks."""
+
+    def __init__(self, chunks=("Hel", "lo", "!")):
+        self.chunks = list(chunks)
+        self.prompts = []
+
+    def generate_content(self, prompt, stream=False):
+        self.prompts.append(prompt)
+        return FakeResponse(self.chunks)
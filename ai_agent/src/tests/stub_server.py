@@ -0,0 +1,70 @@
+"""
+Local stand-in for the user service, run on a ThreadingHTTPServer.
+
+respond(method, path, body) returns (status, headers, body) for each request;
+every request is recorded in StubUserService.requests with its arrival time
+and the client port, so tests can see retries, pauses and connection reuse.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_users(count):
+    return [{'id': str(i), 'data': {'name': f"user {i}"}} for i in range(count)]
+
+
+def ok(method, path, body):
+    return 200, {}, {'updated': True}
+
+
+class StubUserService:
+    def __init__(self, respond=ok):
+        self.respond = respond
+        self.requests = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is visible
+
+            def do_PATCH(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                body = json.loads(raw) if raw else None
+                with stub.lock:
+                    stub.requests.append({
+                        'method': 'PATCH', 'path': self.path, 'body': body,
+                        'port': self.client_address[1], 'time': time.monotonic(),
+                    })
+                status, headers, payload = stub.respond('PATCH', self.path, body)
+                data = json.dumps(payload).encode('utf-8') if payload is not None else b''
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def paths(self):
+        with self.lock:
+            return [request['path'] for request in self.requests]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,66 @@
+import pandas as pd
+
+from stub_server import make_users as users
+from user_service_client import bulk_body
+
+
+def bulk_client(stub_service, make_client, **kwargs):
+    return make_client(bulk_url=f"{stub_service.url}/api/users/bulk", **kwargs)
+
+
+def test_packing_respects_user_count(stub_service, make_client):
+    client = bulk_client(stub_service, make_client, bulk_max_users=3)
+    batches = list(client._pack_bulk_batches(users(7)))
+    assert [len(batch) for batch, encoded in batches] == [3, 3, 1]
+
+
+def test_packing_respects_payload_size(stub_service, make_client):
+    client = bulk_client(stub_service, make_client, bulk_max_bytes=200)
+    batches = list(client._pack_bulk_batches(users(20)))
+    assert len(batches) > 1
+    assert sum(len(batch) for batch, encoded in batches) == 20
+    for batch, encoded in batches:
+        assert len(encoded) == len(batch)
+        assert len(bulk_body(encoded)) <= 200
+
+
+def test_deterministic_failures_split_down_to_single_users(stub_service, make_client):
+    def respond(method, path, body):
+        if path.endswith('/bulk'):
+            ids = {user['id'] for user in body['users']}
+            if '5' in ids:
+                return 400, {}, {'error': 'bad data'}
+            return 200, {}, {'results': {user_id: True for user_id in ids}}
+        if path.endswith('/5'):
+            return 400, {}, {'error': 'bad data'}
+        return 200, {}, {'updated': True}
+
+    stub_service.respond = respond
+    client = bulk_client(stub_service, make_client, max_retries=0)
+    reported = {}
+    results = client.patch_users_batch(users(8), on_result=reported.__setitem__)
+
+    assert results == {str(i): i != 5 for i in range(8)}
+    assert reported == results
+    # Halves without the bad user succeed in bulk: 8 -> 4 + 4 -> 2 + 2 -> 1 + 1
+    bulk_sizes = sorted(len(r['body']['users']) for r in stub_service.requests if r['path'].endswith('/bulk'))
+    assert bulk_sizes == [2, 2, 4, 4, 8]
+    single = sorted(path for path in stub_service.paths() if not path.endswith('/bulk'))
+    assert single == ['/api/users/4', '/api/users/5']
+
+
+def test_values_without_a_json_type_are_sent_as_text(stub_service, make_client):
+    def respond(method, path, body):
+        return 200, {}, {'results': {user['id']: True for user in body['users']}}
+
+    stub_service.respond = respond
+    client = bulk_client(stub_service, make_client)
+    joined = pd.Timestamp('2024-03-01 12:00')
+    results = client.patch_users_batch([
+        {'id': '1', 'data': {'joined': joined}},
+        {'id': '2', 'data': {'joined': joined}},
+    ])
+
+    assert results == {'1': True, '2': True}
+    [request] = stub_service.requests
+    assert request['body']['users'][0]['data']['joined'] == str(joined)
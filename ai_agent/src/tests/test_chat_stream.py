@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from ai_agent import AIAgent
+from fake_clients import FakeModel, RecordingClient
+from response_cache import InMemoryResponseCache, create_response_cache
+
+
+def make_agent(model, response_cache=None):
+    return AIAgent(model=model, user_service_client=RecordingClient(), response_cache=response_cache)
+
+
+def test_stream_yields_model_chunks_and_records_the_turn():
+    cache = InMemoryResponseCache()
+    agent = make_agent(FakeModel(), cache)
+
+    assert list(agent.chat_stream("hi")) == ["Hel", "lo", "!"]
+    assert agent.conversation_history == [{'user': "hi", 'assistant': "Hello!"}]
+    assert agent.last_prompt_stats['cached'] is False
+    assert len(cache) == 1
+
+
+def test_cache_hit_is_recorded_even_if_the_stream_is_closed_early():
+    cache = InMemoryResponseCache()
+    model = FakeModel()
+    make_agent(model, cache).chat("hi")
+
+    agent = make_agent(model, cache)
+    stream = agent.chat_stream("hi")
+    assert next(stream) == "Hello!"
+    stream.close()  # e.g. the SSE client went away after the only chunk
+
+    assert len(model.prompts) == 1
+    assert agent.conversation_history == [{'user': "hi", 'assistant': "Hello!"}]
+    assert agent.last_prompt_stats['cached'] is True
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    pytest.importorskip('fastapi')
+    from fastapi.testclient import TestClient
+
+    import main
+
+    model = FakeModel()
+    monkeypatch.setattr(main, 'base_agent', make_agent(model))
+    monkeypatch.setattr(main, 'response_cache', InMemoryResponseCache())
+    # Not used as a context manager: its shutdown handler would stop the module's executors
+    return main, TestClient(main.app), model
+
+
+def sse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get('event', 'message'), json.loads(fields['data'])))
+    return events
+
+
+def test_sse_route_streams_deltas_and_ends_the_turn(backend):
+    main, client, model = backend
+
+    response = client.post("/api/chat/stream", json={'message': "hi"})
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith("text/event-stream")
+    assert sse_events(response.text) == [
+        ('message', {'delta': "Hel"}), ('message', {'delta': "lo"}), ('message', {'delta': "!"}),
+        ('done', {}),
+    ]
+
+    session = main.session_manager.get(response.headers['x-session-id'])
+    assert session.agent.conversation_history == [{'user': "hi", 'assistant': "Hello!"}]
+    # The turn has ended, so the session takes the next message
+    again = client.post("/api/chat/stream", json={'message': "hi", 'session_id': session.session_id})
+    assert again.status_code == 200
+
+
+def test_sse_route_serves_cache_hits_as_one_delta(backend):
+    main, client, model = backend
+
+    client.post("/api/chat/stream", json={'message': "hi"})
+    response = client.post("/api/chat/stream", json={'message': "hi"})
+
+    assert sse_events(response.text) == [('message', {'delta': "Hello!"}), ('done', {})]
+    assert len(model.prompts) == 1
+    session = main.session_manager.get(response.headers['x-session-id'])
+    assert session.agent.conversation_history == [{'user': "hi", 'assistant': "Hello!"}]
+
+
+def test_chat_is_not_queued_behind_heavy_jobs(backend):
+    main, client, model = backend
+    release = threading.Event()
+    busy = [main.io_executor.submit(release.wait, 5) for _ in range(main.MAX_CONCURRENT_HEAVY_JOBS)]
+    try:
+        start = time.monotonic()
+        response = client.post("/api/chat/stream", json={'message': "hi"})
+        assert sse_events(response.text)[-1] == ('done', {})
+        assert time.monotonic() - start < 2
+    finally:
+        release.set()
+        for future in busy:
+            future.result()
+
+
+def test_response_cache_is_off_by_default():
+    pytest.importorskip('fastapi')
+    if 'RESPONSE_CACHE' in os.environ:
+        pytest.skip("RESPONSE_CACHE is set")
+    import main
+
+    assert create_response_cache() is None
+    assert main.response_cache is None
+    from fastapi.testclient import TestClient
+    assert TestClient(main.app).get("/api/response-cache").json() == {'enabled': False}
@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pytest
+from openpyxl import Workbook
+
+from excel_processor import ExcelProcessor
+
+
+def xlsx_bytes(rows):
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def test_boolean_status_column_is_kept():
+    content = b"id,name,status\n1,Ann,true\n2,Bob,false\n3,Cy,true\n4,Di,false\n"
+    users, rejected = ExcelProcessor().process_excel_file_with_report(content)
+    assert rejected == []
+    assert [user['data']['status'] for user in users] == [True, False, True, False]
+
+
+def test_numeric_name_and_boolean_status_in_xlsx_are_kept():
+    content = xlsx_bytes([['id', 'name', 'status'], ['1', 42, True], ['2', 7.5, False]])
+    users, rejected = ExcelProcessor().process_excel_file_with_report(content)
+    assert rejected == []
+    assert len(users) == 2
+
+
+def test_opt_in_string_type_still_rejects():
+    content = xlsx_bytes([['id', 'status'], ['1', True], ['2', 'active']])
+    processor = ExcelProcessor({'id': {'required': True}, 'status': {'type': 'string'}})
+    users, rejected = processor.process_excel_file_with_report(content)
+    assert [user['id'] for user in users] == ['2']
+    assert rejected == [{'row': 2, 'id': '1', 'errors': ['status: must be of type string']}]
+
+
+def test_invalid_email_is_rejected_with_its_sheet_row():
+    content = xlsx_bytes([['id', 'email'], ['1', 'a@example.com'], ['2', 'not-an-email']])
+    users, rejected = ExcelProcessor().process_excel_file_with_report(content)
+    assert [user['id'] for user in users] == ['1']
+    assert rejected == [{'row': 3, 'id': '2', 'errors': ['email: has an invalid format']}]
+
+
+def test_streaming_reports_real_row_numbers_after_blank_rows():
+    content = xlsx_bytes([['id', 'email'], ['1', 'a@example.com'], [None, None], ['2', 'bad']])
+    processor = ExcelProcessor()
+    rejected = []
+    for df in processor.iter_excel_batches(content, batch_size=1):
+        rejected += processor.filter_rejected(df, df.index.to_numpy())[1]
+    assert [report['row'] for report in rejected] == [4]
+
+
+def test_streaming_rejects_unique_values_repeated_in_later_batches():
+    content = xlsx_bytes([['id', 'email'], ['1', 'a@x.com'], ['2', 'b@x.com'], ['3', 'a@x.com'], ['4', 'c@x.com']])
+    processor = ExcelProcessor({'id': {'required': True}, 'email': {'unique': True}})
+    batches = list(processor.process_excel_file_streaming(content, batch_size=2))
+    assert [[user['id'] for user in batch] for batch in batches] == [['1', '2'], ['4']]
+
+
+def test_single_sheet_runs_on_the_given_executor():
+    class RecordingExecutor(ThreadPoolExecutor):
+        submitted = 0
+
+        def submit(self, *args, **kwargs):
+            RecordingExecutor.submitted += 1
+            return super().submit(*args, **kwargs)
+
+    content = xlsx_bytes([['id', 'name'], ['1', 'Ann']])
+    with RecordingExecutor(max_workers=1) as executor:
+        result = ExcelProcessor().process_workbook(content, ['Sheet'], executor)
+    assert RecordingExecutor.submitted == 1
+    assert result['users'].ids() == ['1']
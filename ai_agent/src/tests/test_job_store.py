@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from jobs import JOB_COMPLETED, JOB_FAILED, JOB_RUNNING, InMemoryJobStore, SQLiteJobStore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_store(request, tmp_path):
+    stores = []
+
+    def make(**kwargs):
+        if request.param == 'memory':
+            store = InMemoryJobStore(**kwargs)
+        else:
+            store = SQLiteJobStore(str(tmp_path / "jobs.db"), **kwargs)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def finish(store, job_id):
+    store.create(job_id, 1)
+    store.add_results(job_id, {f"{job_id}-user": True})
+    store.update(job_id, status=JOB_COMPLETED)
+
+
+def test_create_prunes_finished_jobs_beyond_the_limit(make_store):
+    store = make_store(max_finished_jobs=2)
+    for job_id in ("a", "b", "c"):
+        finish(store, job_id)
+    store.create("running", 10)
+    store.update("running", status=JOB_RUNNING)
+    store.create("new", 1)
+
+    assert store.get("a") is None
+    assert store.get_results("a") == {}
+    assert store.get("b") and store.get("c")
+    assert store.get("running")["status"] == JOB_RUNNING
+
+
+def test_create_prunes_finished_jobs_past_the_ttl(make_store):
+    store = make_store(finished_ttl_seconds=0.2)
+    finish(store, "old")
+    time.sleep(0.3)
+    finish(store, "recent")
+    store.create("new", 1)
+
+    assert store.get("old") is None
+    assert store.get("recent")["status"] == JOB_COMPLETED
+
+
+def test_starting_a_worker_keeps_jobs_of_live_workers(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    first = SQLiteJobStore(path)
+    first.create("busy", 10)
+    first.update("busy", status=JOB_RUNNING)
+
+    second = SQLiteJobStore(path)
+    second.mark_interrupted()
+    assert second.get("busy")["status"] == JOB_RUNNING
+
+
+def test_jobs_of_a_silent_worker_are_failed(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    dead = SQLiteJobStore(path, heartbeat_seconds=0.05, stale_seconds=0.1)
+    dead.create("orphan", 10)
+    dead.update("orphan", status=JOB_RUNNING)
+
+    live = SQLiteJobStore(path, heartbeat_seconds=0.05, stale_seconds=0.1)
+    live.create("mine", 10)
+    live.start_heartbeat()
+    try:
+        time.sleep(0.4)
+        assert live.get("orphan")["status"] == JOB_FAILED
+        assert live.get("mine")["status"] == "queued"
+    finally:
+        live.close()
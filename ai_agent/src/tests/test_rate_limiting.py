@@ -0,0 +1,105 @@
+import threading
+import time
+
+from rate_limiter import AdaptiveConcurrencyLimiter, TokenBucket
+from stub_server import make_users as users
+
+
+def test_token_bucket_limits_the_sustained_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    # The first token is there already; the other ten take 1/50 s each
+    assert time.monotonic() - start >= 0.18
+
+
+def test_token_bucket_pause_holds_back_tokens():
+    bucket = TokenBucket(rate=1000)
+    bucket.pause(0.2)
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.18
+
+
+def test_concurrency_limiter_decreases_and_recovers():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=8, cooldown=0)
+    limiter.on_throttle()
+    assert int(limiter.limit) == 4
+    limiter.on_throttle()
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert int(limiter.limit) == 1  # never below min_limit
+
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 8  # additive increase back to, and capped at, max_limit
+
+
+def test_concurrency_limiter_cooldown_counts_a_burst_once():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=8, cooldown=60)
+    for _ in range(5):
+        limiter.on_throttle()
+    assert int(limiter.limit) == 4
+
+
+def test_retry_after_is_clamped_to_backoff_max(stub_service, make_client):
+    calls = []
+
+    def respond(method, path, body):
+        calls.append(path)
+        if len(calls) == 1:
+            return 429, {'Retry-After': '120'}, None
+        return 200, {}, {'updated': True}
+
+    stub_service.respond = respond
+    client = make_client(max_retries=2, backoff_base=0.01, backoff_max=0.2)
+    start = time.monotonic()
+    assert client.patch_user('1', {'name': 'a'}) == {'updated': True}
+    assert time.monotonic() - start < 2
+    assert len(calls) == 2
+
+
+def test_retry_after_pauses_every_worker(stub_service, make_client):
+    throttled_at = []
+    lock = threading.Lock()
+
+    def respond(method, path, body):
+        with lock:
+            if not throttled_at:
+                throttled_at.append(time.monotonic())
+                return 429, {'Retry-After': '1'}, None
+        return 200, {}, {'updated': True}
+
+    stub_service.respond = respond
+    # No rate_limit: the pause must reach the concurrency limiter on its own
+    client = make_client(max_workers=4, max_retries=3, backoff_base=0.01, backoff_max=0.5)
+    results = client.patch_users_batch(users(40))
+    assert all(results.values())
+
+    # Requests already on the wire when the 429 went out may land just after it
+    start, end = throttled_at[0] + 0.1, throttled_at[0] + 0.4
+    during_pause = [request for request in stub_service.requests if start < request['time'] < end]
+    assert during_pause == []
+
+
+def test_concurrency_shrinks_towards_what_the_server_accepts(stub_service, make_client):
+    in_flight = [0]
+    lock = threading.Lock()
+
+    def respond(method, path, body):
+        with lock:
+            if in_flight[0] >= 2:
+                return 429, {}, None
+            in_flight[0] += 1
+        time.sleep(0.02)
+        with lock:
+            in_flight[0] -= 1
+        return 200, {}, {'updated': True}
+
+    stub_service.respond = respond
+    client = make_client(max_workers=8, max_retries=10, backoff_base=0.01, backoff_max=0.05)
+    client.concurrency_limiter.cooldown = 0
+    results = client.patch_users_batch(users(60))
+    assert all(results.values())
+    assert client.concurrency_limiter.limit < 8
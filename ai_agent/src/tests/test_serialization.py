@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip('fastapi')
+
+import serialization  # noqa: E402
+from main import UpdateUsersRequest  # noqa: E402
+from serialization import decode_update_users  # noqa: E402
+
+
+BODY = b'{"users": [{"id": 7, "data": {"name": "Ann"}}, {"id": "8", "data": {}}, {"data": {}}]}'
+
+
+@pytest.mark.parametrize('use_msgspec', [True, False])
+def test_numeric_ids_are_decoded_as_text(monkeypatch, use_msgspec):
+    if use_msgspec and serialization.msgspec is None:
+        pytest.skip("msgspec is not installed")
+    if not use_msgspec:
+        monkeypatch.setattr(serialization, 'msgspec', None)
+
+    request = decode_update_users(BODY, UpdateUsersRequest)
+    assert [user['id'] for user in request['users']] == ['7', '8', None]
+    assert request['users'][0]['data'] == {'name': "Ann"}
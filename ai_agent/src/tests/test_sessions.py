@@ -0,0 +1,46 @@
+import gc
+
+import pytest
+
+from sessions import SessionBusy, SessionManager
+
+
+class StreamingAgent:
+    def __init__(self):
+        self.conversation_history = []
+
+    def chat_stream(self, user_message, file_content=None):
+        yield "Hello"
+        self.conversation_history.append({'user': user_message, 'assistant': "Hello"})
+
+
+def make_session():
+    manager = SessionManager(StreamingAgent)
+    session = manager.get("s")
+    finished = []
+    session.on_turn_finished = lambda: finished.append(1) or manager.enforce_limits()
+    return manager, session, finished
+
+
+def test_exhausted_stream_ends_the_turn():
+    manager, session, finished = make_session()
+
+    assert list(session.chat_stream("hi")) == ["Hello"]
+    assert len(finished) == 1
+    assert session.agent.conversation_history == [{'user': "hi", 'assistant': "Hello"}]
+
+
+def test_dropped_stream_releases_the_session_without_locks():
+    manager, session, finished = make_session()
+
+    stream = session.chat_stream("hi")
+    with pytest.raises(SessionBusy):
+        session.chat_stream("again")
+
+    # Dropped while another thread holds the manager lock: the finalizer must not wait for it
+    with manager.lock:
+        del stream
+        gc.collect()
+    assert finished == []
+
+    assert list(session.chat_stream("again")) == ["Hello"]
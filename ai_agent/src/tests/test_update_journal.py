@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from ai_agent import AIAgent
+from fake_clients import RecordingClient, table
+from update_journal import UpdateJournal
+from user_snapshot import UserSnapshot
+
+
+class CrashingClient(RecordingClient):
+    """Applies the first `applied` users, then dies like a killed process."""
+
+    def __init__(self, applied):
+        super().__init__()
+        self.applied = applied
+
+    def patch_users_batch(self, users, on_result=None):
+        for user in list(users)[:self.applied]:
+            on_result(user['id'], True)
+        raise RuntimeError("process killed")
+
+
+def batch():
+    return table([(str(i), {'name': f"user {i}"}) for i in range(5)])
+
+
+def agent(client, journal, snapshot=None):
+    return AIAgent(model=object(), user_service_client=client, update_journal=journal, user_snapshot=snapshot)
+
+
+def test_rerun_after_crash_skips_applied_users(tmp_path):
+    journal = UpdateJournal(str(tmp_path / 'journal'))
+    with pytest.raises(RuntimeError):
+        agent(CrashingClient(applied=3), journal).update_users(batch())
+
+    client = RecordingClient()
+    result = agent(client, journal).update_users(batch())
+    assert [user['id'] for user in client.sent[0]] == ['3', '4']
+    assert result['resumed'] and result['skipped'] == 3
+    assert result['successful'] == 5
+    # The journal of a batch that fully succeeded is deleted
+    assert os.listdir(journal.directory) == []
+
+
+def test_resumed_users_are_recorded_in_the_snapshot(tmp_path):
+    journal = UpdateJournal(str(tmp_path / 'journal'))
+    snapshot = UserSnapshot(str(tmp_path / 'snapshot.db'))
+    with pytest.raises(RuntimeError):
+        agent(CrashingClient(applied=3), journal, snapshot).update_users(batch())
+
+    agent(RecordingClient(), journal, snapshot).update_users(batch())
+    _, stats = snapshot.diff(batch())
+    assert stats == {'new': 0, 'changed': 0, 'unchanged': 5}
+
+
+def test_journal_applies_only_to_the_same_batch(tmp_path):
+    journal = UpdateJournal(str(tmp_path / 'journal'))
+    users = batch()
+    key = journal.batch_key(users)
+    with journal.writer(key) as writer:
+        writer('0', True)
+        writer('1', False)  # failures are not journaled
+
+    assert journal.start(users)[2] == {'resumed': True, 'skipped': 1}
+    changed = table([(str(i), {'name': f"renamed {i}"}) for i in range(5)])
+    assert journal.batch_key(changed) != key
+    assert journal.start(changed)[2] == {'resumed': False, 'skipped': 0}
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    journal = UpdateJournal(str(tmp_path / 'journal'))
+    key = journal.batch_key(batch())
+    with open(os.path.join(journal.directory, f"{key}.jsonl"), 'w', encoding='utf-8') as f:
+        f.write('{"id": "0"}\n{"id": "1"}\n{"id": "2')
+
+    assert journal.completed_ids(key) == {'0', '1'}
+    with journal.writer(key) as writer:
+        writer('2', True)
+    assert journal.completed_ids(key) == {'0', '1', '2'}
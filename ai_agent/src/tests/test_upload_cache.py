@@ -0,0 +1,36 @@
+import os
+import pickle
+
+import pytest
+
+from upload_cache import ParsedUploadCache
+
+
+class Unloadable:
+    """Pickles fine but fails to load, like an entry from an incompatible version."""
+
+    def __reduce__(self):
+        return (int, ("not a number",))
+
+
+@pytest.mark.parametrize('content', [
+    b"truncated",
+    pickle.dumps(Unloadable()),
+    pickle.dumps("not an entry"),
+])
+def test_unreadable_disk_entry_is_dropped(tmp_path, content):
+    cache = ParsedUploadCache(disk_dir=str(tmp_path))
+    path = tmp_path / "key.pkl"
+    path.write_bytes(content)
+
+    assert cache.get("key") is None
+    assert not path.exists()
+    assert cache.stats()['misses'] == 1
+
+
+def test_disk_entry_survives_a_new_cache(tmp_path):
+    users = [{'id': '1', 'data': {'name': "Ann"}}]
+    ParsedUploadCache(disk_dir=str(tmp_path)).put("key", users, [])
+
+    assert ParsedUploadCache(disk_dir=str(tmp_path)).get("key") == (users, [])
+    assert os.listdir(tmp_path) == ["key.pkl"]
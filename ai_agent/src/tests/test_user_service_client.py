@@ -0,0 +1,69 @@
+import time
+
+from stub_server import make_users as users
+from user_service_client import IN_FLIGHT_PER_WORKER
+
+
+def test_batch_reuses_pooled_connections(stub_service, make_client):
+    client = make_client(max_workers=4)
+    assert client.session.get_adapter(stub_service.url)._pool_maxsize == 4
+
+    results = client.patch_users_batch(users(40))
+    assert all(results.values())
+    assert len(stub_service.requests) == 40
+    # Keep-alive: 40 requests over at most one connection per worker
+    assert len({request['port'] for request in stub_service.requests}) <= 4
+
+
+def test_request_timeout_fails_only_that_user(stub_service, make_client):
+    def respond(method, path, body):
+        if path.endswith('/slow'):
+            time.sleep(1)
+        return 200, {}, {'updated': True}
+
+    stub_service.respond = respond
+    client = make_client(max_workers=2, timeout=0.2, max_retries=0)
+    start = time.monotonic()
+    results = client.patch_users_batch([{'id': 'slow', 'data': {}}] + users(3))
+    assert time.monotonic() - start < 0.9
+    assert results == {'slow': False, '0': True, '1': True, '2': True}
+
+
+def test_failing_user_does_not_abort_the_batch(stub_service, make_client):
+    def respond(method, path, body):
+        if path.endswith('/3'):
+            return 400, {}, {'error': 'bad data'}
+        return 200, {}, {'updated': True}
+
+    stub_service.respond = respond
+    client = make_client(max_workers=4)
+    reported = {}
+    results = client.patch_users_batch(users(10), on_result=reported.__setitem__)
+    assert [user_id for user_id, success in results.items() if not success] == ['3']
+    assert len(results) == 10
+    assert reported == results
+    assert stub_service.requests[0]['body'] == {'name': f"user {stub_service.paths()[0].rsplit('/', 1)[1]}"}
+
+
+def test_batch_reads_users_lazily(stub_service, make_client):
+    pulled = []
+    seen_at_first_request = []
+
+    def generate():
+        for user in users(20):
+            pulled.append(user['id'])
+            yield user
+
+    def respond(method, path, body):
+        if not seen_at_first_request:
+            time.sleep(0.2)  # let the submitting thread run ahead as far as it can
+            seen_at_first_request.append(len(pulled))
+        return 200, {}, {'updated': True}
+
+    stub_service.respond = respond
+    client = make_client(max_workers=1)
+    results = client.patch_users_batch(generate())
+
+    assert len(results) == 20 and all(results.values())
+    # One request running plus IN_FLIGHT_PER_WORKER queued, and one more read ahead
+    assert seen_at_first_request[0] <= 1 * IN_FLIGHT_PER_WORKER + 1
@@ -0,0 +1,38 @@
+from fake_clients import RecordingClient, table
+from user_snapshot import UserSnapshot
+
+
+def test_second_import_sends_only_changed_users_and_fields(tmp_path):
+    snapshot = UserSnapshot(str(tmp_path / 'snapshot.db'))
+    client = RecordingClient()
+    first = table([('1', {'name': 'Ann', 'role': 'admin'}), ('2', {'name': 'Bob', 'role': 'user'})])
+    results, stats = snapshot.patch_changed(client, first)
+    assert results == {'1': True, '2': True}
+    assert stats == {'new': 2, 'changed': 0, 'unchanged': 0}
+
+    second = table([('1', {'name': 'Ann', 'role': 'owner'}), ('2', {'name': 'Bob', 'role': 'user'})])
+    results, stats = snapshot.patch_changed(client, second)
+    assert client.sent[-1] == [{'id': '1', 'data': {'role': 'owner'}}]
+    assert results == {'1': True, '2': True}
+    assert stats == {'new': 0, 'changed': 1, 'unchanged': 1}
+
+
+def test_failed_users_are_sent_again(tmp_path):
+    snapshot = UserSnapshot(str(tmp_path / 'snapshot.db'))
+    users = table([('1', {'name': 'Ann'}), ('2', {'name': 'Bob'})])
+    snapshot.patch_changed(RecordingClient(failing={'2'}), users)
+
+    client = RecordingClient()
+    snapshot.patch_changed(client, users)
+    assert client.sent[-1] == [{'id': '2', 'data': {'name': 'Bob'}}]
+
+
+def test_snapshot_survives_reopening(tmp_path):
+    path = str(tmp_path / 'snapshot.db')
+    users = table([('1', {'name': 'Ann'})])
+    UserSnapshot(path).patch_changed(RecordingClient(), users)
+
+    client = RecordingClient()
+    _, stats = UserSnapshot(path).patch_changed(client, users)
+    assert client.sent == []
+    assert stats['unchanged'] == 1
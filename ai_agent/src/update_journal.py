@@ -0,0 +1,132 @@
+"""Append-only journal of applied user updates, so interrupted batches can resume."""
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Set, Tuple
+
+from user_table import UserTable, user_ids
+
+logger = logging.getLogger(__name__)
+
+
+class JournalWriter:
+    """Appends one line per successfully applied user id; use as an on_result callback."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', encoding='utf-8')
+        # Terminate a line torn by a crash, so the next record is not glued to it
+        if self.file.tell() > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self.file.write("\n")
+
+    def __call__(self, user_id, success: bool):
+        if not success:
+            return
+        with self.lock:
+            self.file.write(json.dumps({'id': str(user_id)}) + "\n")
+            # Flushed per line: a crashed process loses at most the line being written
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class UpdateJournal:
+    """
+    Directory of JSONL journals, one per batch of users.
+
+    A batch is identified by a hash of its users (ids and data), so re-running the
+    same import after a crash finds the journal of the interrupted run and skips
+    the users it already applied. The journal is deleted once every user succeeded.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: Directory holding the journal files
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def batch_key(users: List[Dict]) -> str:
+        digest = hashlib.sha256()
+        for user in users:
+            digest.update(json.dumps([user.get('id'), user.get('data', {})], sort_keys=True, default=str).encode('utf-8'))
+            digest.update(b"\n")
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.jsonl")
+
+    def completed_ids(self, key: str) -> Set[str]:
+        """Ids already applied in an earlier run of this batch (empty if there was none)."""
+        completed = set()
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        completed.add(json.loads(line)['id'])
+                    except (ValueError, KeyError):
+                        pass  # torn last line from a crash
+        except FileNotFoundError:
+            pass
+        return completed
+
+    def writer(self, key: str) -> JournalWriter:
+        return JournalWriter(self._path(key))
+
+    def finish(self, key: str):
+        """Delete the journal of a batch that completed without failures."""
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def skipped_users(users: List[Dict], pending: List[Dict]) -> List[Dict]:
+        """The users of a batch that start() left out of pending, as a list or UserTable like users."""
+        if len(pending) == len(users):
+            return users[:0]
+        pending_ids = set(user_ids(pending))
+        if isinstance(users, UserTable):
+            return users.take(~users.frame['id'].isin(list(pending_ids)).to_numpy())
+        return [user for user in users if user.get('id') not in pending_ids]
+
+    def start(self, users: List[Dict]) -> Tuple[str, List[Dict], Dict]:
+        """
+        Look up the journal for a batch.
+
+        Args:
+            users: The full batch of users
+
+        Returns:
+            Tuple of (batch key, users still to apply, resume stats) where stats has
+            'resumed' (whether an earlier run was found) and 'skipped' (users it applied)
+        """
+        key = self.batch_key(users)
+        completed = self.completed_ids(key)
+        if not completed:
+            pending = users
+        elif isinstance(users, UserTable):
+            pending = users.take(~users.frame['id'].isin(list(completed)).to_numpy())
+        else:
+            pending = [user for user in users if str(user.get('id')) not in completed]
+        skipped = len(users) - len(pending)
+        if completed:
+            logger.info(f"Resuming batch {key[:12]}: {skipped} users already applied, {len(pending)} to go")
+        return key, pending, {'resumed': bool(completed), 'skipped': skipped}
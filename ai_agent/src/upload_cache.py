@@ -0,0 +1,192 @@
+"""Content-hash cache for parsed Excel uploads."""
+import copy
+import hashlib
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from excel_processor import ExcelProcessor
+from user_table import UserTable
+
+logger = logging.getLogger(__name__)
+
+
+class ParsedUploadCache:
+    """
+    LRU cache of parsed uploads, keyed by the upload's content hash.
+
+    Each entry holds the converted users together with the rejected-row report.
+
+    The key also covers the sheet name and the processor options, so a change in
+    either re-parses the file. Entries are bounded by count and by total users.
+    An optional on-disk tier keeps evicted entries and survives restarts; it is
+    bounded by file count and total size, least recently used files first.
+    Callers get their own copy of a cached entry.
+
+    Disk entries are pickles, and unpickling runs code: disk_dir must not be
+    writable by any other user.
+    """
+
+    def __init__(self, max_entries: int = 32, max_users: int = 2_000_000, disk_dir: Optional[str] = None,
+                 max_disk_entries: int = 256, max_disk_bytes: int = 2 * 1024 ** 3):
+        """
+        Args:
+            max_entries: Maximum number of uploads kept in memory
+            max_users: Maximum number of users across all in-memory entries
+            disk_dir: Optional directory for the on-disk tier
+            max_disk_entries: Maximum number of uploads kept on disk
+            max_disk_bytes: Maximum total size of the on-disk tier
+        """
+        self.max_entries = max(1, max_entries)
+        self.max_users = max_users
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max(1, max_disk_entries)
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.total_users = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(file_content: bytes, sheet_name: Optional[str], processor: ExcelProcessor) -> str:
+        """Build the cache key from content hash, sheet name and processor options."""
+        digest = hashlib.sha256(file_content)
+        options = (sheet_name, sorted((column, sorted(rules.items())) for column, rules in processor.schema.items()))
+        digest.update(repr(options).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    @staticmethod
+    def _copy(entry: Tuple[List[Dict], List[Dict]]) -> Tuple[List[Dict], List[Dict]]:
+        """Copy of a cached entry, so callers cannot change the cache through it."""
+        users, rejected = entry
+        users = users.copy() if isinstance(users, UserTable) else copy.deepcopy(users)
+        return users, copy.deepcopy(rejected)
+
+    def get(self, key: str) -> Optional[Tuple[List[Dict], List[Dict]]]:
+        """Return the cached (users, rejected rows) for a key, or None on a miss."""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self._copy(self.entries[key])
+
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    entry = pickle.load(f)
+                if not (isinstance(entry, tuple) and len(entry) == 2):
+                    raise pickle.UnpicklingError("not a (users, rejected) entry")
+                os.utime(self._disk_path(key))  # mtime tracks recency for LRU eviction
+                self._store_in_memory(key, entry)
+                with self.lock:
+                    self.hits += 1
+                return self._copy(entry)
+            except Exception as e:
+                # Truncated, corrupt or from an incompatible version: drop it and re-parse
+                logger.warning(f"Dropping unreadable cache file for {key}: {str(e)}")
+                try:
+                    os.remove(self._disk_path(key))
+                except OSError:
+                    pass
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, users: List[Dict], rejected: List[Dict]):
+        """Store a copy of users and rejected rows under a key in memory and, if configured, on disk."""
+        entry = self._copy((users, rejected))
+        self._store_in_memory(key, entry)
+        if self.disk_dir:
+            tmp_path = f"{self._disk_path(key)}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self._disk_path(key))
+            except OSError as e:
+                logger.warning(f"Could not write cache file for {key}: {str(e)}")
+                return
+            self._evict_from_disk()
+
+    def _evict_from_disk(self):
+        """Remove the least recently used cache files beyond the count and size limits."""
+        files = {}
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                files[path] = os.stat(path)
+            except OSError:
+                pass  # removed by another process
+        total_bytes = sum(stat.st_size for stat in files.values())
+        count = len(files)
+        for path in sorted(files, key=lambda path: files[path].st_mtime):
+            if count <= self.max_disk_entries and total_bytes <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            count -= 1
+            total_bytes -= files[path].st_size
+
+    def _store_in_memory(self, key: str, entry: Tuple[List[Dict], List[Dict]]):
+        users = entry[0]
+        if len(users) > self.max_users:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_users -= len(self.entries.pop(key)[0])
+            self.entries[key] = entry
+            self.total_users += len(users)
+            while len(self.entries) > self.max_entries or self.total_users > self.max_users:
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.total_users -= len(evicted)
+
+    def get_or_process_with_report(self, processor: ExcelProcessor, file_content: bytes,
+                                   sheet_name: Optional[str] = None) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Return the converted users and rejected rows for an upload, parsing it only on a cache miss.
+
+        Args:
+            processor: ExcelProcessor used on a miss
+            file_content: Bytes content of the Excel file
+            sheet_name: Optional sheet name to read
+
+        Returns:
+            Tuple of (user dictionaries ready for API calls, rejected row reports)
+        """
+        key = self.make_key(file_content, sheet_name, processor)
+        entry = self.get(key)
+        if entry is None:
+            users, rejected = processor.process_excel_file_with_report(file_content, sheet_name)
+            self.put(key, users, rejected)
+            return users, rejected
+        logger.info(f"Using cached parse of upload {key[:12]} ({len(entry[0])} users)")
+        return entry
+
+    def get_or_process(self, processor: ExcelProcessor, file_content: bytes,
+                       sheet_name: Optional[str] = None) -> List[Dict]:
+        """Like get_or_process_with_report, without the rejected-row report."""
+        users, _ = self.get_or_process_with_report(processor, file_content, sheet_name)
+        return users
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size."""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.entries),
+                'users': self.total_users,
+            }
@@ -1,16 +1,58 @@
 """Client for interacting with the User Service API."""
 import requests
+import json
 import logging
-from typing import Dict, List, Optional
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from config import USER_SERVICE_URL, USER_SERVICE_API_KEY
+from rate_limiter import TokenBucket, AdaptiveConcurrencyLimiter
 
 logger = logging.getLogger(__name__)
 
+# Status codes that indicate a transient condition worth retrying
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+# Requests queued per worker in patch_users_batch; bounds the futures held for a large batch
+IN_FLIGHT_PER_WORKER = 4
+
+
+def encode_json(payload) -> bytes:
+    """JSON request body; values JSON has no type for (dates, Timestamps) are sent as text."""
+    return json.dumps(payload, default=str).encode('utf-8')
+
+
+def bulk_body(encoded_items: List[bytes]) -> bytes:
+    """Bulk request body {"users": [...]} joined from already encoded items."""
+    return b'{"users": [' + b','.join(encoded_items) + b']}'
+
 
 class UserServiceClient:
     """Client for making requests to the User Service."""
     
-    def __init__(self):
+    def __init__(self, max_workers: int = 8, max_connections_per_host: Optional[int] = None, timeout: float = 30,
+                 rate_limit: Optional[float] = None, max_retries: int = 5,
+                 backoff_base: float = 0.5, backoff_max: float = 30,
+                 bulk_url: Optional[str] = None, bulk_max_users: int = 100,
+                 bulk_max_bytes: int = 1_000_000):
+        """
+        Args:
+            max_workers: Maximum number of PATCH requests in flight during a batch
+            max_connections_per_host: Size of the keep-alive connection pool per host
+                (defaults to max_workers, one connection per worker)
+            timeout: Timeout in seconds for each request
+            rate_limit: Optional sustained requests per second (unlimited if None)
+            max_retries: Retries for 429/5xx responses and connection errors
+            backoff_base: Base delay in seconds for exponential backoff
+            backoff_max: Upper bound in seconds for a single backoff delay
+            bulk_url: Optional bulk PATCH endpoint; enables bulk mode when set
+            bulk_max_users: Maximum users packed into one bulk request
+            bulk_max_bytes: Maximum JSON payload size of one bulk request
+        """
         self.base_url = USER_SERVICE_URL
         self.api_key = USER_SERVICE_API_KEY
         self.headers = {
@@ -18,6 +60,102 @@ class UserServiceClient:
         }
         if self.api_key:
             self.headers["Authorization"] = f"Bearer {self.api_key}"
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        
+        # Shared session so connections (and TLS handshakes) are reused across requests.
+        # pool_block caps open connections per host at max_connections_per_host.
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_connections_per_host or self.max_workers), pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        
+        # Retry and throttling: token bucket for the sustained rate, AIMD limiter
+        # that shrinks concurrency when the service starts pushing back
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = TokenBucket(rate_limit) if rate_limit else None
+        self.concurrency_limiter = AdaptiveConcurrencyLimiter(self.max_workers)
+        
+        # Bulk mode: coalesce many users into one request
+        self.bulk_url = bulk_url
+        self.bulk_max_users = max(1, bulk_max_users)
+        self.bulk_max_bytes = bulk_max_bytes
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """Parse the Retry-After header (seconds or HTTP date), if present."""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+    
+    def _request_with_retry(self, method: str, url: str, payload=None, body: Optional[bytes] = None) -> requests.Response:
+        """
+        Send a request, retrying transient failures with jittered exponential backoff.
+        
+        Args:
+            method: HTTP method
+            url: Request URL
+            payload: JSON body, encoded with encode_json
+            body: Already encoded body, sent instead of payload
+            
+        Returns:
+            The final response (which may still be an error response)
+            
+        Raises:
+            requests.exceptions.RequestException: If the connection keeps failing
+        """
+        if body is None:
+            body = encode_json(payload)
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            
+            retry_after = None
+            try:
+                with self.concurrency_limiter:
+                    response = self.session.request(method, url, data=body, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                reason = type(e).__name__
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    if response.ok:
+                        self.concurrency_limiter.on_success()
+                    return response
+                reason = f"HTTP {response.status_code}"
+                retry_after = self._retry_after(response)
+            
+            self.concurrency_limiter.on_throttle()
+            if retry_after is not None:
+                # The server told us when to come back: hold off all workers until then,
+                # but never longer than backoff_max
+                delay = min(self.backoff_max, retry_after + random.uniform(0, self.backoff_base))
+                self.concurrency_limiter.pause(delay)
+                if self.rate_limiter:
+                    self.rate_limiter.pause(delay)
+            else:
+                delay = self._backoff_delay(attempt)
+            
+            attempt += 1
+            logger.warning(f"{method} {url} failed ({reason}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            time.sleep(delay)
     
     def patch_user(self, user_id: str, user_data: Dict) -> Optional[Dict]:
         """
@@ -33,7 +171,7 @@ class UserServiceClient:
         url = f"{self.base_url}/{user_id}"
         
         try:
-            response = requests.patch(url, json=user_data, headers=self.headers, timeout=30)
+            response = self._request_with_retry("PATCH", url, user_data)
             response.raise_for_status()
             logger.info(f"Successfully updated user {user_id}")
             return response.json()
@@ -43,26 +181,148 @@ class UserServiceClient:
                 logger.error(f"Response: {e.response.text}")
             return None
     
-    def patch_users_batch(self, users: List[Dict]) -> Dict[str, bool]:
+    def _pack_bulk_batches(self, users: Iterable[Dict]) -> Iterator[Tuple[List[Dict], List[bytes]]]:
+        """
+        Group users into bulk requests bounded by user count and payload size.
+        
+        Each user is encoded once here; the bulk body is joined from these bytes,
+        so the size that was checked is the size that is sent. Users are read
+        lazily, one bulk request ahead.
+        
+        Args:
+            users: Iterable of dictionaries, each containing 'id' and 'data' keys
+            
+        Yields:
+            (users, their encoded items), one per bulk request
+        """
+        batch, encoded = [], []
+        batch_bytes = len(bulk_body([]))
+        for user in users:
+            item = {'id': user['id'], 'data': user.get('data', {})}
+            item_json = encode_json(item)
+            item_bytes = len(item_json) + 1  # plus the separating comma
+            if batch and (len(batch) >= self.bulk_max_users or batch_bytes + item_bytes > self.bulk_max_bytes):
+                yield batch, encoded
+                batch, encoded = [], []
+                batch_bytes = len(bulk_body([]))
+            batch.append(item)
+            encoded.append(item_json)
+            batch_bytes += item_bytes
+        if batch:
+            yield batch, encoded
+    
+    def patch_users_bulk(self, users: List[Dict], encoded: Optional[List[bytes]] = None) -> Dict[str, bool]:
         """
-        Update multiple users in batch.
+        Update a group of users with a single bulk PATCH request.
+        
+        The request body is {"users": [{"id": ..., "data": {...}}, ...]}. A 2xx
+        response counts as success for every user unless its JSON body lists
+        failures, either as {"failed": [ids]} or {"results": {id: bool}}. When a
+        bulk request fails, the failing users are split in half and retried
+        recursively; a single remaining user falls back to patch_user.
         
         Args:
             users: List of dictionaries, each containing 'id' and 'data' keys
+            encoded: The users' items as encoded by _pack_bulk_batches, if already done
             
         Returns:
             Dictionary mapping user IDs to success status
         """
-        results = {}
-        for user in users:
-            user_id = user.get('id')
-            user_data = user.get('data', {})
-            if user_id:
-                success = self.patch_user(user_id, user_data) is not None
-                results[user_id] = success
+        if len(users) == 1:
+            user = users[0]
+            return {user['id']: self.patch_user(user['id'], user.get('data', {})) is not None}
+        
+        if encoded is None:
+            encoded = [encode_json({'id': user['id'], 'data': user.get('data', {})}) for user in users]
+        failed_ids = None
+        try:
+            response = self._request_with_retry("PATCH", self.bulk_url, body=bulk_body(encoded))
+            response.raise_for_status()
+            body = response.json() if response.content else {}
+            if isinstance(body, dict) and isinstance(body.get('results'), dict):
+                failed_ids = {str(user_id) for user_id, ok in body['results'].items() if not ok}
+            elif isinstance(body, dict) and isinstance(body.get('failed'), list):
+                failed_ids = {str(user_id) for user_id in body['failed']}
             else:
-                logger.warning(f"Skipping user without ID: {user}")
-                results[user.get('id', 'unknown')] = False
+                failed_ids = set()
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Bulk update of {len(users)} users failed, splitting batch: {str(e)}")
+        
+        if failed_ids is not None:
+            results = {user['id']: str(user['id']) not in failed_ids for user in users}
+            retry = [i for i, user in enumerate(users) if not results[user['id']]]
+            logger.info(f"Bulk updated {len(users) - len(retry)}/{len(users)} users")
+            if not retry:
+                return results
+        else:
+            results = {}
+            retry = list(range(len(users)))
+        
+        middle = (len(retry) + 1) // 2
+        for half in (retry[:middle], retry[middle:]):
+            if half:
+                results.update(self.patch_users_bulk([users[i] for i in half], [encoded[i] for i in half]))
         return results
-
-
+    
+    def _patch_one(self, user: Dict) -> Dict[str, bool]:
+        return {user['id']: self.patch_user(user['id'], user.get('data', {})) is not None}
+    
+    def patch_users_batch(self, users: Iterable[Dict],
+                          on_result: Optional[Callable[[str, bool], None]] = None) -> Dict[str, bool]:
+        """
+        Update multiple users concurrently over the pooled session.
+        
+        In bulk mode (bulk_url set) users are coalesced into bulk requests;
+        otherwise each user gets its own PATCH request. Users are read lazily:
+        at most max_workers * IN_FLIGHT_PER_WORKER requests are submitted at a
+        time, and more are read as they complete.
+        
+        Args:
+            users: Iterable (list, UserTable or generator) of dictionaries, each
+                containing 'id' and 'data' keys
+            on_result: Optional callback invoked with (user_id, success) as soon as each
+                user's outcome is known, e.g. to checkpoint progress. Called from the
+                calling thread
+            
+        Returns:
+            Dictionary mapping user IDs to success status
+        """
+        results = {}
+        
+        def valid_users():
+            for user in users:
+                if user.get('id'):
+                    yield user
+                else:
+                    logger.warning(f"Skipping user without ID: {user}")
+                    results[user.get('id', 'unknown')] = False
+        
+        def collect(futures):
+            for future in futures:
+                request_results = future.result()
+                results.update(request_results)
+                if on_result:
+                    for user_id, success in request_results.items():
+                        on_result(user_id, success)
+        
+        if self.bulk_url:
+            tasks = ((self.patch_users_bulk, batch, encoded)
+                     for batch, encoded in self._pack_bulk_batches(valid_users()))
+        else:
+            tasks = ((self._patch_one, user) for user in valid_users())
+        
+        window = self.max_workers * IN_FLIGHT_PER_WORKER
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = set()
+            for task in tasks:
+                if len(in_flight) >= window:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight.add(executor.submit(*task))
+            collect(as_completed(in_flight))
+        
+        return results
+    
+    def close(self):
+        """Close the pooled HTTP session."""
+        self.session.close()
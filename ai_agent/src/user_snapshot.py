@@ -0,0 +1,157 @@
+"""Local snapshot of user data last applied to the user service, for delta-only updates."""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from user_table import user_ids
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of ids per SELECT ... IN (...) query
+LOOKUP_CHUNK_SIZE = 500
+
+
+def normalize_data(data: Dict) -> Dict:
+    """JSON round trip, so values compare the same way before and after being stored."""
+    return json.loads(json.dumps(data, default=str))
+
+
+def hash_data(data: Dict) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class UserSnapshot:
+    """
+    SQLite snapshot of what was last PATCHed successfully, per user id.
+
+    Each row keeps the hash of the last applied sheet data and the merged data
+    known to be in the service. diff() compares new rows against it: unchanged
+    users are skipped, and changed users only carry the fields that differ.
+    Fields missing from a row are never sent, as with a full PATCH.
+    """
+
+    def __init__(self, path: str = "user_snapshot.db"):
+        """
+        Args:
+            path: SQLite database file (use one per user service)
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS user_snapshot (
+                    user_id TEXT PRIMARY KEY,
+                    data_hash TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def _lookup(self, user_ids: List[str]) -> Dict[str, Tuple[str, str]]:
+        found = {}
+        with self.lock:
+            for start in range(0, len(user_ids), LOOKUP_CHUNK_SIZE):
+                chunk = user_ids[start:start + LOOKUP_CHUNK_SIZE]
+                rows = self.conn.execute(
+                    f"SELECT user_id, data_hash, data FROM user_snapshot WHERE user_id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                found.update((user_id, (data_hash, data)) for user_id, data_hash, data in rows)
+        return found
+
+    def diff(self, users: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """
+        Reduce users to what changed since the last successful update.
+
+        Args:
+            users: List of {'id': ..., 'data': {...}} as produced by ExcelProcessor
+
+        Returns:
+            Tuple of (users to send, with only changed fields, stats) where stats
+            counts 'new', 'changed' and 'unchanged' users
+        """
+        snapshot = self._lookup([str(user_id) for user_id in user_ids(users)])
+        delta = []
+        stats = {'new': 0, 'changed': 0, 'unchanged': 0}
+        for user in users:
+            stored = snapshot.get(str(user['id']))
+            if stored is None:
+                delta.append(user)
+                stats['new'] += 1
+                continue
+
+            stored_hash, stored_data = stored
+            if hash_data(user['data']) == stored_hash:
+                stats['unchanged'] += 1
+                continue
+
+            previous = json.loads(stored_data)
+            normalized = normalize_data(user['data'])
+            changed = {
+                field: value for field, value in user['data'].items()
+                if field not in previous or previous[field] != normalized[field]
+            }
+            if changed:
+                delta.append({'id': user['id'], 'data': changed})
+                stats['changed'] += 1
+            else:
+                stats['unchanged'] += 1
+
+        logger.info(f"Snapshot diff: {stats['new']} new, {stats['changed']} changed, {stats['unchanged']} unchanged")
+        return delta, stats
+
+    def record(self, users: List[Dict], results: Dict[str, bool]):
+        """
+        Store the data of users whose update succeeded.
+
+        Args:
+            users: The full (not delta) users that were diffed
+            results: Per-user success flags from the user service client
+        """
+        applied = [user for user in users if results.get(str(user['id'])) or results.get(user['id'])]
+        if not applied:
+            return
+        snapshot = self._lookup([str(user['id']) for user in applied])
+        now = time.time()
+        rows = []
+        for user in applied:
+            merged = json.loads(snapshot[str(user['id'])][1]) if str(user['id']) in snapshot else {}
+            merged.update(normalize_data(user['data']))
+            rows.append((str(user['id']), hash_data(user['data']), json.dumps(merged), now))
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO user_snapshot (user_id, data_hash, data, updated_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+    def patch_changed(self, client, users: List[Dict],
+                      on_result: Optional[Callable[[str, bool], None]] = None) -> Tuple[Dict[str, bool], Dict]:
+        """
+        PATCH only what changed, then record the applied data.
+
+        Args:
+            client: UserServiceClient used for the changed users
+            users: Full list of users from the import
+            on_result: Optional per-user callback passed on to patch_users_batch
+
+        Returns:
+            Tuple of (results for every user, diff stats). Unchanged users count
+            as successful, since their data is already in the service
+        """
+        delta, stats = self.diff(users)
+        results = client.patch_users_batch(delta, on_result=on_result) if delta else {}
+        self.record(users, results)
+        for user_id in user_ids(users):
+            results.setdefault(user_id, True)
+        return results, stats
+
+    def clear(self):
+        """Forget everything, so the next update sends every user in full."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM user_snapshot")
@@ -0,0 +1,123 @@
+"""Column-oriented container for converted users, behaving like a list of user dicts."""
+from collections.abc import Sequence
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+# Rows materialised at a time when iterating
+ITER_CHUNK_SIZE = 1000
+
+
+class UserTable(Sequence):
+    """
+    Users held column-wise in one DataFrame instead of one dict per user.
+
+    It is a read-only sequence of {'id': str, 'data': {...}} dicts, like the list
+    convert_to_user_format used to return. Those dicts are only built on access,
+    a chunk at a time when iterating, and are not kept. Null cells are left out of
+    'data', as before. Slicing returns a plain list of dicts, so previews such as
+    users[:5] serialise as before; use take() for a sub-table.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        """
+        Args:
+            frame: DataFrame with a string 'id' column followed by the data columns,
+                with a default RangeIndex
+        """
+        self.frame = frame
+        self.data_columns = [col for col in frame.columns if col != 'id']
+
+    @classmethod
+    def from_frame(cls, ids: pd.Series, data: pd.DataFrame) -> 'UserTable':
+        """Build a table from user ids and the matching rows of data columns."""
+        frame = data.reset_index(drop=True)
+        frame.insert(0, 'id', ids.astype(str).reset_index(drop=True))
+        return cls(frame)
+
+    @classmethod
+    def from_records(cls, users: Iterable[Dict]) -> 'UserTable':
+        """Build a table from {'id', 'data'} dicts."""
+        users = list(users)
+        data = pd.DataFrame.from_records([user.get('data', {}) for user in users], index=range(len(users)))
+        return cls.from_frame(pd.Series([user['id'] for user in users], dtype=object), data)
+
+    @classmethod
+    def concat(cls, tables: List['UserTable']) -> 'UserTable':
+        """Stack tables; data columns missing from a table are null in its rows."""
+        frames = [table.frame for table in tables if len(table)]
+        if not frames:
+            return cls(pd.DataFrame({'id': pd.Series([], dtype=str)}))
+        return cls(pd.concat(frames, ignore_index=True))
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def _records(self, start: int, stop: int) -> List[Dict]:
+        chunk = self.frame.iloc[start:stop]
+        data = chunk[self.data_columns]
+        # to_dict returns no records at all for a frame without columns
+        records = data.to_dict('records') if self.data_columns else [{} for _ in range(len(chunk))]
+
+        # Drop null values (NaN/None/NaT) only from the rows that contain any
+        present = data.notna().to_numpy()
+        for i in (~present.all(axis=1)).nonzero()[0]:
+            mask = present[i]
+            records[i] = {col: value for col, value, keep in zip(self.data_columns, records[i].values(), mask) if keep}
+
+        return [{'id': user_id, 'data': user_data} for user_id, user_data in zip(chunk['id'].tolist(), records)]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return self._records(start, max(start, stop))
+            return [self[i] for i in range(start, stop, step)]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("UserTable index out of range")
+        return self._records(index, index + 1)[0]
+
+    def __iter__(self) -> Iterator[Dict]:
+        for start in range(0, len(self), ITER_CHUNK_SIZE):
+            yield from self._records(start, start + ITER_CHUNK_SIZE)
+
+    def __repr__(self) -> str:
+        return f"UserTable({len(self)} users, columns={self.data_columns})"
+
+    def ids(self) -> List[str]:
+        return self.frame['id'].tolist()
+
+    def field_values(self, field: str) -> List:
+        """Values of 'id' or a data field for every user, with None for nulls and missing columns."""
+        if field != 'id' and field not in self.data_columns:
+            return [None] * len(self)
+        return self.frame[field].to_numpy(dtype=object, na_value=None).tolist()
+
+    def take(self, positions) -> 'UserTable':
+        """Sub-table with the users at the given positions (or boolean mask)."""
+        positions = np.asarray(positions)
+        if positions.dtype == bool:
+            positions = positions.nonzero()[0]
+        return UserTable(self.frame.iloc[positions].reset_index(drop=True))
+
+    def copy(self) -> 'UserTable':
+        """Table over a shallow copy of the frame; adding or replacing its columns leaves this one unchanged."""
+        return UserTable(self.frame.copy(deep=False))
+
+    def to_list(self) -> List[Dict]:
+        """Materialise every user as a dict (the format of the old list)."""
+        return self._records(0, len(self))
+
+    def memory_bytes(self) -> int:
+        """Memory held by the table's columns, including string contents."""
+        return int(self.frame.memory_usage(deep=True, index=False).sum())
+
+
+def user_ids(users) -> List:
+    """Ids of a UserTable or a list of user dicts, without building the dicts."""
+    if isinstance(users, UserTable):
+        return users.ids()
+    return [user['id'] for user in users]
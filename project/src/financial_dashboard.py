@@ -3,11 +3,13 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import gspread
-from google.oauth2.service_account import Credentials
 import numpy as np
 from datetime import datetime, timedelta
 import os
+from google_sheets_config import get_client_provider, sheet_sync
+from financial_metrics import calculate_metrics
+from sheets_fetch import QuotaLimiter, fetch_worksheets
+from sheets_refresh import BackgroundRefresher, REFRESH_TTL_SECONDS
 
 # Page configuration
 st.set_page_config(
@@ -43,69 +45,103 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 @st.cache_data
-def load_google_sheets_data(sheet_url, worksheet_name="Sheet1"):
+def load_sample_data():
     """
-    Load data from Google Sheets using service account credentials
+    Sample financial data shown when no Google Sheet is configured
     """
-    try:
-        # For demo purposes, we'll create sample data
-        # In production, you would use actual Google Sheets credentials
-        st.info("📝 Note: This is using sample data. To connect to your actual Google Sheet, please provide your credentials.")
-        
-        # Create sample financial data
-        dates = pd.date_range(start='2023-01-01', end='2024-01-01', freq='M')
-        np.random.seed(42)
-        
-        data = {
-            'Date': dates,
-            'Revenue': np.random.normal(100000, 20000, len(dates)),
-            'Expenses': np.random.normal(70000, 15000, len(dates)),
-            'Profit': np.random.normal(30000, 8000, len(dates)),
-            'Cash_Flow': np.random.normal(25000, 10000, len(dates)),
-            'Assets': np.random.normal(500000, 50000, len(dates)),
-            'Liabilities': np.random.normal(200000, 30000, len(dates)),
-            'Equity': np.random.normal(300000, 40000, len(dates))
-        }
-        
-        df = pd.DataFrame(data)
+    # Create sample financial data
+    dates = pd.date_range(start='2023-01-01', end='2024-01-01', freq='M')
+    np.random.seed(42)
+    
+    data = {
+        'Date': dates,
+        'Revenue': np.random.normal(100000, 20000, len(dates)),
+        'Expenses': np.random.normal(70000, 15000, len(dates)),
+        'Profit': np.random.normal(30000, 8000, len(dates)),
+        'Cash_Flow': np.random.normal(25000, 10000, len(dates)),
+        'Assets': np.random.normal(500000, 50000, len(dates)),
+        'Liabilities': np.random.normal(200000, 30000, len(dates)),
+        'Equity': np.random.normal(300000, 40000, len(dates))
+    }
+    
+    return prepare_financial_data(pd.DataFrame(data))
+
+def prepare_financial_data(df):
+    """
+    Parse dates and add the derived ratio columns
+    """
+    if 'Date' in df.columns:
         df['Date'] = pd.to_datetime(df['Date'])
+    if 'Revenue' in df.columns and 'Profit' in df.columns:
         df['Profit_Margin'] = (df['Profit'] / df['Revenue']) * 100
+    if 'Profit' in df.columns and 'Equity' in df.columns:
         df['ROE'] = (df['Profit'] / df['Equity']) * 100
-        
-        return df
+    return df
+
+@st.cache_resource
+def get_sheet_refresher():
+    """
+    Stale-while-revalidate cache of sheet data, shared by every session
+    """
+    provider = get_client_provider()
+    limiter = QuotaLimiter()
+    
+    def load(*targets):
+        # Runs in a background thread: no Streamlit calls in here
+        return prepare_financial_data(fetch_worksheets(sheet_sync, provider.client(), targets, limiter=limiter))
     
-    except Exception as e:
-        st.error(f"Error loading data: {str(e)}")
-        return None
+    return BackgroundRefresher(load)
 
-def calculate_metrics(df):
+def consolidate(df):
     """
-    Calculate key financial metrics
+    Sum the figures of every source per date and recompute the ratios
     """
-    if df is None or df.empty:
-        return {}
-    
-    latest = df.iloc[-1]
-    previous = df.iloc[-2] if len(df) > 1 else latest
-    
-    metrics = {
-        'total_revenue': latest['Revenue'],
-        'total_expenses': latest['Expenses'],
-        'net_profit': latest['Profit'],
-        'profit_margin': latest['Profit_Margin'],
-        'roe': latest['ROE'],
-        'total_assets': latest['Assets'],
-        'total_liabilities': latest['Liabilities'],
-        'equity': latest['Equity'],
-        'cash_flow': latest['Cash_Flow'],
-        
-        # Growth rates
-        'revenue_growth': ((latest['Revenue'] - previous['Revenue']) / previous['Revenue']) * 100,
-        'profit_growth': ((latest['Profit'] - previous['Profit']) / previous['Profit']) * 100,
-        'expense_growth': ((latest['Expenses'] - previous['Expenses']) / previous['Expenses']) * 100,
-    }
+    totals = df.drop(columns=['Source', 'Profit_Margin', 'ROE'], errors='ignore')
+    totals = totals.groupby('Date', as_index=False).sum(numeric_only=True)
+    return prepare_financial_data(totals)
+
+def format_age(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+def load_google_sheets_data(targets, ttl_seconds=REFRESH_TTL_SECONDS):
+    """
+    Load data from Google Sheets using service account credentials
+
+    targets is a list of (sheet URL, worksheet name); they are fetched
+    concurrently and stacked with a Source column (see sheets_fetch.py). The
+    cached copy is returned straight away and refreshed in the background once
+    it is older than ttl_seconds, so the page never waits for the Sheets API
+    (except on the very first load). The data age is shown in the sidebar.
+    """
+    if not targets:
+        st.info("📝 Note: This is using sample data. Enter your Google Sheets URL in the sidebar to load your own data.")
+        return load_sample_data()
+    
+    refresher = get_sheet_refresher()
+    key = tuple(targets)
+    if st.sidebar.button("🔄 Refresh now"):
+        refresher.refresh(key)
+    
+    df, info = refresher.get(key, ttl_seconds)
+    
+    if info['age_seconds'] is not None:
+        st.sidebar.caption(f"🕒 Data age: {format_age(info['age_seconds'])}")
+    if info['refreshing']:
+        st.sidebar.caption("🔄 Refreshing in the background...")
+    if info['error']:
+        if df is None:
+            st.error(f"Error loading data: {info['error']}")
+        else:
+            st.sidebar.warning(f"⚠️ Last refresh failed, showing cached data: {info['error']}")
+    if df is not None:
+        for source, error in df.attrs.get('errors', {}).items():
+            st.sidebar.warning(f"⚠️ Could not load {source}: {error}")
     
-    return metrics
+    return df
 
 def create_revenue_chart(df):
     """
@@ -245,18 +281,55 @@ def main():
         help="Enter your Google Sheets URL here"
     )
     
-    worksheet_name = st.sidebar.text_input(
-        "Worksheet Name",
+    worksheet_names = st.sidebar.text_input(
+        "Worksheet Names",
         value="Sheet1",
-        help="Name of the worksheet containing your data"
+        help="Worksheets containing your data, separated by commas (e.g. one per business unit)"
     )
     
+    more_urls = st.sidebar.text_area(
+        "Additional Google Sheets URLs",
+        help="One URL per line; the same worksheets are loaded from each"
+    )
+    
+    ttl_seconds = st.sidebar.number_input(
+        "Refresh Interval (seconds)",
+        min_value=10,
+        value=int(REFRESH_TTL_SECONDS),
+        step=30,
+        help="Cached data older than this is refreshed in the background"
+    )
+    
+    urls = [url.strip() for url in [sheet_url] + more_urls.splitlines() if url.strip()]
+    names = [name.strip() for name in worksheet_names.split(',') if name.strip()] or ["Sheet1"]
+    targets = [(url, name) for url in urls for name in names]
+    
     # Load data
-    df = load_google_sheets_data(sheet_url, worksheet_name)
+    df = load_google_sheets_data(targets, ttl_seconds)
+    
+    if df is not None and 'Source' in df.columns and 'Date' in df.columns and df['Source'].nunique() > 1:
+        view = st.sidebar.selectbox(
+            "View",
+            ["Consolidated"] + df['Source'].cat.categories.tolist(),
+            help="All sources summed per date, or a single worksheet"
+        )
+        if view == "Consolidated":
+            df = consolidate(df)
+        else:
+            df = df[df['Source'] == view].reset_index(drop=True)
     
     if df is not None:
-        # Calculate metrics
-        metrics = calculate_metrics(df)
+        # Calculate metrics (computed once per dataset; picking a period is a lookup)
+        period = -1
+        if 'Date' in df.columns and len(df) > 1:
+            period = st.selectbox(
+                "Metrics Period",
+                range(len(df)),
+                index=len(df) - 1,
+                format_func=lambda i: str(df['Date'].iloc[i])[:10],
+                help="Period whose metrics are shown, compared with the period before it"
+            )
+        metrics = calculate_metrics(df, period)
         
         # Key Metrics Section
         st.header("📈 Key Financial Metrics")
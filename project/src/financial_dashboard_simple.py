@@ -5,6 +5,8 @@ import plotly.graph_objects as go
 import numpy as np
 from datetime import datetime
 import io
+from financial_metrics import calculate_metrics
+from tabular_reader import read_table, SUPPORTED_UPLOAD_TYPES
 
 # Page configuration
 st.set_page_config(
@@ -45,8 +47,8 @@ def load_excel_data(uploaded_file):
     """
     try:
         if uploaded_file is not None:
-            # Read Excel file
-            df = pd.read_excel(uploaded_file, engine='openpyxl')
+            # Read Excel, CSV, Parquet or Arrow file
+            df = read_table(uploaded_file)
             
             # Convert date column if it exists
             if 'Date' in df.columns:
@@ -66,60 +68,6 @@ def load_excel_data(uploaded_file):
         st.error(f"Error loading Excel file: {str(e)}")
         return None
 
-def calculate_metrics(df):
-    """
-    Calculate key financial metrics
-    """
-    if df is None or df.empty:
-        return {}
-    
-    latest = df.iloc[-1]
-    previous = df.iloc[-2] if len(df) > 1 else latest
-    
-    metrics = {}
-    
-    # Basic metrics
-    if 'Revenue' in df.columns:
-        metrics['total_revenue'] = latest['Revenue']
-        if len(df) > 1:
-            metrics['revenue_growth'] = ((latest['Revenue'] - previous['Revenue']) / previous['Revenue']) * 100
-        else:
-            metrics['revenue_growth'] = 0
-    
-    if 'Expenses' in df.columns:
-        metrics['total_expenses'] = latest['Expenses']
-        if len(df) > 1:
-            metrics['expense_growth'] = ((latest['Expenses'] - previous['Expenses']) / previous['Expenses']) * 100
-        else:
-            metrics['expense_growth'] = 0
-    
-    if 'Profit' in df.columns:
-        metrics['net_profit'] = latest['Profit']
-        if len(df) > 1:
-            metrics['profit_growth'] = ((latest['Profit'] - previous['Profit']) / previous['Profit']) * 100
-        else:
-            metrics['profit_growth'] = 0
-    
-    if 'Profit_Margin' in df.columns:
-        metrics['profit_margin'] = latest['Profit_Margin']
-    
-    if 'ROE' in df.columns:
-        metrics['roe'] = latest['ROE']
-    
-    if 'Assets' in df.columns:
-        metrics['total_assets'] = latest['Assets']
-    
-    if 'Liabilities' in df.columns:
-        metrics['total_liabilities'] = latest['Liabilities']
-    
-    if 'Equity' in df.columns:
-        metrics['equity'] = latest['Equity']
-    
-    if 'Cash_Flow' in df.columns:
-        metrics['cash_flow'] = latest['Cash_Flow']
-    
-    return metrics
-
 def create_revenue_chart(df):
     """
     Create revenue trend chart
@@ -260,8 +208,8 @@ def main():
     st.header("📁 Upload Your Financial Data")
     
     uploaded_file = st.file_uploader(
-        "Choose an Excel file",
-        type=['xlsx', 'xls'],
+        "Choose an Excel, CSV, Parquet or Arrow file",
+        type=SUPPORTED_UPLOAD_TYPES,
         help="Upload your financial data Excel file. Make sure it has columns like Date, Revenue, Expenses, Profit, etc."
     )
     
@@ -276,8 +224,17 @@ def main():
             st.subheader("📋 Data Preview")
             st.dataframe(df.head(), use_container_width=True)
             
-            # Calculate metrics
-            metrics = calculate_metrics(df)
+            # Calculate metrics (computed once per dataset; picking a period is a lookup)
+            period = -1
+            if 'Date' in df.columns and len(df) > 1:
+                period = st.selectbox(
+                    "Metrics Period",
+                    range(len(df)),
+                    index=len(df) - 1,
+                    format_func=lambda i: str(df['Date'].iloc[i])[:10],
+                    help="Period whose metrics are shown, compared with the period before it"
+                )
+            metrics = calculate_metrics(df, period)
             
             if metrics:
                 # Key Metrics Section
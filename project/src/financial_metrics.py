@@ -0,0 +1,205 @@
+"""
+Precomputed financial metrics shared by the dashboards.
+
+compute_metrics() derives every KPI for every period (row) of a financial frame
+in one vectorized pass:
+
+- the value of each metric column (total_revenue, net_profit, roe, ...)
+- period-over-period growth in % (revenue_growth, expense_growth, ...)
+- year-over-year growth in % against the period dated one year earlier (revenue_yoy, ...)
+- the rolling mean over the last ROLLING_WINDOW periods (revenue_rolling, ...)
+- cumulative and year-to-date totals of the flow columns (revenue_cumulative, revenue_ytd, ...)
+
+The result is cached on a fingerprint of the frame, so Streamlit reruns with
+the same data reuse it, and any period's metrics are then an index lookup. The
+fingerprint itself is remembered per frame object: a rerun that passes the same
+frame (e.g. from the background refresher) does not hash it again, so frames
+must not be changed in place once their metrics are computed.
+"""
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Periods averaged by the rolling metrics
+ROLLING_WINDOW = int(os.getenv('METRICS_ROLLING_WINDOW', '3'))
+# Computed frames kept in the cache
+MAX_CACHED_METRICS = 8
+
+# Metric key of each column's value
+VALUE_METRICS = {
+    'Revenue': 'total_revenue',
+    'Expenses': 'total_expenses',
+    'Profit': 'net_profit',
+    'Profit_Margin': 'profit_margin',
+    'ROE': 'roe',
+    'Assets': 'total_assets',
+    'Liabilities': 'total_liabilities',
+    'Equity': 'equity',
+    'Cash_Flow': 'cash_flow',
+}
+# Prefix of the growth, rolling and cumulative metrics of each column
+METRIC_PREFIXES = {
+    'Revenue': 'revenue',
+    'Expenses': 'expense',
+    'Profit': 'profit',
+    'Cash_Flow': 'cash_flow',
+    'Assets': 'assets',
+    'Liabilities': 'liabilities',
+    'Equity': 'equity',
+}
+# Columns measured over a period, which add up over time (the rest are balances)
+FLOW_COLUMNS = ['Revenue', 'Expenses', 'Profit', 'Cash_Flow']
+
+_cache = OrderedDict()
+# id(frame) -> (weak reference to the frame, its fingerprint); frames are not hashable
+_fingerprints = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def fingerprint(df):
+    """
+    Hash of a frame's columns, index and values
+    """
+    digest = hashlib.sha1(str(list(df.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def frame_fingerprint(df):
+    """
+    fingerprint(df), hashed once per frame object
+    """
+    with _cache_lock:
+        known = _fingerprints.get(id(df))
+        # The id of a collected frame can be reused, hence the reference check
+        if known is not None and known[0]() is df:
+            _fingerprints.move_to_end(id(df))
+            return known[1]
+
+    key = fingerprint(df)
+    with _cache_lock:
+        _fingerprints[id(df)] = (weakref.ref(df), key)
+        while len(_fingerprints) > 4 * MAX_CACHED_METRICS:
+            _fingerprints.popitem(last=False)
+    return key
+
+
+def percent_change(values, previous):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (values - previous) / previous * 100
+
+
+class FinancialMetrics:
+    """
+    Metrics of every period of a frame, looked up by position or date
+    """
+
+    def __init__(self, df):
+        self.table = self._compute(df)
+        self.columns = {key: self.table[key].to_numpy() for key in self.table.columns}
+        self.dates = None
+        if 'Date' in df.columns:
+            # Index of the distinct dates (the last period of each), for hash lookups
+            dates = pd.Index(pd.to_datetime(df['Date'], errors='coerce'))
+            keep = dates.notna() & ~dates.duplicated(keep='last')
+            self.dates = dates[keep]
+            self.date_positions = np.flatnonzero(keep)
+
+    @staticmethod
+    def _compute(df):
+        values = {}
+        for col, key in VALUE_METRICS.items():
+            if col in df.columns:
+                values[key] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+
+        columns = [col for col in METRIC_PREFIXES if col in df.columns]
+        if not columns:
+            return pd.DataFrame(values)
+        data = df[columns].apply(pd.to_numeric, errors='coerce').astype(float).reset_index(drop=True)
+
+        growth = percent_change(data, data.shift(1))
+        # The first period has nothing to compare with
+        growth.iloc[:1] = 0
+
+        rolling = data.rolling(ROLLING_WINDOW, min_periods=1).mean()
+
+        if 'Date' in df.columns:
+            dates = pd.to_datetime(df['Date'], errors='coerce').reset_index(drop=True)
+            by_date = data.set_index(dates)
+            # The last period of each date, as in the lookup index of __init__
+            by_date = by_date[by_date.index.notna() & ~by_date.index.duplicated(keep='last')]
+            year_ago = by_date.reindex(dates - pd.DateOffset(years=1)).reset_index(drop=True)
+            yoy = percent_change(data, year_ago)
+            years = dates.dt.year
+        else:
+            yoy = pd.DataFrame(np.nan, index=data.index, columns=columns)
+            years = pd.Series(0, index=data.index)
+
+        flows = [col for col in FLOW_COLUMNS if col in columns]
+        cumulative = data[flows].cumsum()
+        ytd = data[flows].groupby(years.to_numpy()).cumsum()
+
+        for col in columns:
+            prefix = METRIC_PREFIXES[col]
+            values[f"{prefix}_growth"] = growth[col].to_numpy()
+            values[f"{prefix}_yoy"] = yoy[col].to_numpy()
+            values[f"{prefix}_rolling"] = rolling[col].to_numpy()
+            if col in flows:
+                values[f"{prefix}_cumulative"] = cumulative[col].to_numpy()
+                values[f"{prefix}_ytd"] = ytd[col].to_numpy()
+        return pd.DataFrame(values)
+
+    def __len__(self):
+        return len(self.table)
+
+    def period(self, position=-1):
+        """
+        Metrics of the period at a row position (default: the latest)
+        """
+        if not len(self.table):
+            return {}
+        return {key: values[position].item() for key, values in self.columns.items()}
+
+    def for_date(self, date):
+        """
+        Metrics of the (last) period with the given date, or {} if there is none
+        """
+        if self.dates is None:
+            return {}
+        found = self.dates.get_indexer([pd.Timestamp(date)])[0]
+        return {} if found < 0 else self.period(self.date_positions[found])
+
+
+def compute_metrics(df):
+    """
+    FinancialMetrics of a frame, reused while the frame's content is unchanged
+    """
+    key = frame_fingerprint(df)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    metrics = FinancialMetrics(df)
+    with _cache_lock:
+        _cache[key] = metrics
+        while len(_cache) > MAX_CACHED_METRICS:
+            _cache.popitem(last=False)
+    return metrics
+
+
+def calculate_metrics(df, period=-1):
+    """
+    Calculate key financial metrics
+
+    Returns the metrics of one period (default: the latest) as a dict; only
+    metrics of columns present in df are included.
+    """
+    if df is None or df.empty:
+        return {}
+    return compute_metrics(df).period(period)
@@ -5,33 +5,30 @@ This file contains the configuration for connecting to Google Sheets.
 Follow the setup instructions below to connect your dashboard to your Google Sheets.
 """
 
-import gspread
-from google.oauth2.service_account import Credentials
-import pandas as pd
 import streamlit as st
+from sheets_client import SheetsClientProvider
+from sheets_sync import SheetSync
+
+# Local cache of loaded worksheets, shared by all sessions
+sheet_sync = SheetSync()
+
+@st.cache_resource
+def get_client_provider():
+    """
+    Google Sheets client provider shared by every session and rerun
+    """
+    return SheetsClientProvider()
 
 def setup_google_sheets_connection():
     """
     Setup Google Sheets connection using service account credentials
+
+    The client is authorized once per process and reused afterwards (see sheets_client.py).
+    You need to create a service account and download the JSON key file; its path
+    is read from GOOGLE_SERVICE_ACCOUNT_FILE (default: service_account_key.json).
     """
     try:
-        # Define the scope
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        
-        # Load credentials from service account file
-        # You need to create a service account and download the JSON key file
-        credentials = Credentials.from_service_account_file(
-            'service_account_key.json',  # Replace with your key file path
-            scopes=scope
-        )
-        
-        # Authorize the clientsheet
-        client = gspread.authorize(credentials)
-        
-        return client
+        return get_client_provider().client()
     
     except FileNotFoundError:
         st.error("❌ Service account key file not found. Please follow the setup instructions.")
@@ -40,27 +37,22 @@ def setup_google_sheets_connection():
         st.error(f"❌ Error setting up Google Sheets connection: {str(e)}")
         return None
 
-def load_sheet_data(client, sheet_url, worksheet_name="Sheet1"):
+def get_connection_stats():
+    """
+    Auth latency and token refresh metrics of the shared client
+    """
+    return dict(get_client_provider().stats)
+
+def load_sheet_data(client, sheet_url, worksheet_name="Sheet1", append_only=False):
     """
     Load data from Google Sheets
+
+    Values are only read when the spreadsheet changed since the last load;
+    otherwise the locally cached copy is returned (see sheets_sync.py).
+    Set append_only when rows are only ever added at the bottom of the sheet.
     """
     try:
-        # Extract sheet ID from URL
-        sheet_id = sheet_url.split('/d/')[1].split('/')[0]
-        
-        # Open the spreadsheet
-        spreadsheet = client.open_by_key(sheet_id)
-        
-        # Select the worksheet
-        worksheet = spreadsheet.worksheet(worksheet_name)
-        
-        # Get all values
-        data = worksheet.get_all_records()
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(data)
-        
-        return df
+        return sheet_sync.load(client, sheet_url, worksheet_name, append_only=append_only)
     
     except Exception as e:
         st.error(f"❌ Error loading data from Google Sheets: {str(e)}")
@@ -90,7 +82,7 @@ SETUP_INSTRUCTIONS = """
 
 ### 4. Configure the Dashboard
 1. Place the downloaded JSON key file in your project directory
-2. Update the file path in `google_sheets_config.py`
+2. Set `GOOGLE_SERVICE_ACCOUNT_FILE` to its path (default: `service_account_key.json`)
 3. Run the dashboard with: `streamlit run financial_dashboard.py`
 
 ### 5. Expected Data Format
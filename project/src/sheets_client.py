@@ -0,0 +1,166 @@
+"""
+Process-wide Google Sheets client.
+
+Authorizing gspread means reading the service account key, signing a JWT and
+exchanging it for an access token. SheetsClientProvider does that once and
+hands out the same authorized client afterwards. A background thread refreshes
+the token REFRESH_MARGIN_SECONDS before it expires, so requests never wait for
+a refresh. The client's HTTP session keeps up to POOL_SIZE keep-alive
+connections to the Google APIs.
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+
+import gspread
+import requests
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+
+logger = logging.getLogger(__name__)
+
+SCOPES = [
+    'https://spreadsheets.google.com/feeds',
+    'https://www.googleapis.com/auth/drive'
+]
+KEY_FILE = os.getenv('GOOGLE_SERVICE_ACCOUNT_FILE', 'service_account_key.json')
+# Refresh the access token this long before it expires
+REFRESH_MARGIN_SECONDS = float(os.getenv('SHEETS_TOKEN_REFRESH_MARGIN', '300'))
+# Keep-alive connections kept open to the Google APIs
+POOL_SIZE = int(os.getenv('SHEETS_HTTP_POOL_SIZE', '10'))
+# Wait before retrying a failed background refresh
+RETRY_SECONDS = 30
+
+
+def utcnow():
+    # google-auth keeps expiry as a naive UTC datetime
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def pooled_adapter(pool_size=POOL_SIZE):
+    """
+    HTTP adapter keeping pool_size connections alive, retrying failed connects
+    """
+    return requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+
+
+class SheetsClientProvider:
+    """
+    Authorizes once and shares the gspread client, refreshing its token ahead of expiry
+    """
+
+    def __init__(self, key_file=KEY_FILE, scopes=SCOPES, refresh_margin=REFRESH_MARGIN_SECONDS, pool_size=POOL_SIZE):
+        self.key_file = key_file
+        self.scopes = scopes
+        self.refresh_margin = datetime.timedelta(seconds=refresh_margin)
+        self.pool_size = pool_size
+        self.credentials = None
+        self._client = None
+        self.token_session = requests.Session()
+        self.token_session.mount('https://', pooled_adapter(pool_size))
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.refresher = None
+        self.stats = {
+            'authorizations': 0,
+            'last_auth_seconds': None,
+            'total_auth_seconds': 0.0,
+            'refreshes': 0,
+            'last_refresh_seconds': None,
+            'refresh_failures': 0,
+            'client_requests': 0,
+            'token_expiry': None,
+        }
+
+    def client(self):
+        """
+        The shared gspread client, authorizing on first use
+        """
+        with self.lock:
+            if self._client is None:
+                self._authorize()
+            client = self._client
+            self.stats['client_requests'] += 1
+        try:
+            # Only needed if the background refresh fell behind
+            self._refresh()
+        except Exception as e:
+            # The token is still valid within the margin; the client refreshes it itself once expired
+            with self.lock:
+                self.stats['refresh_failures'] += 1
+            logger.warning(f"Token refresh failed: {e}")
+        return client
+
+    def _needs_refresh(self):
+        expiry = self.credentials.expiry
+        return expiry is None or expiry - utcnow() <= self.refresh_margin
+
+    def _authorize(self):
+        start = time.perf_counter()
+        credentials = Credentials.from_service_account_file(self.key_file, scopes=self.scopes)
+        credentials.refresh(Request(session=self.token_session))
+        client = gspread.authorize(credentials)
+
+        # gspread 6 keeps its session on client.http_client, gspread 5 on the client
+        session = getattr(client, 'http_client', client).session
+        session.mount('https://', pooled_adapter(self.pool_size))
+
+        elapsed = time.perf_counter() - start
+        # Called with self.lock held, which also guards the stats
+        self.credentials = credentials
+        self._client = client
+        self.stats['authorizations'] += 1
+        self.stats['last_auth_seconds'] = elapsed
+        self.stats['total_auth_seconds'] += elapsed
+        self.stats['token_expiry'] = credentials.expiry
+        logger.info(f"Authorized Google Sheets client in {elapsed:.2f}s")
+
+        if self.refresher is None:
+            self.refresher = threading.Thread(target=self._refresh_loop, name='sheets-token-refresh', daemon=True)
+            self.refresher.start()
+
+    def _refresh(self):
+        """
+        Refresh the access token if it expires within the margin
+        """
+        with self.refresh_lock:
+            if self.credentials is None or not self._needs_refresh():
+                return
+            credentials = self.credentials
+            start = time.perf_counter()
+            credentials.refresh(Request(session=self.token_session))
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.stats['refreshes'] += 1
+                self.stats['last_refresh_seconds'] = elapsed
+                self.stats['token_expiry'] = credentials.expiry
+
+    def _refresh_loop(self):
+        wait = 0
+        while not self.stop_event.wait(wait):
+            try:
+                self._refresh()
+                credentials = self.credentials
+                if credentials is None:
+                    return
+                wait = (credentials.expiry - utcnow() - self.refresh_margin).total_seconds()
+            except Exception as e:
+                # The client also refreshes on its own when a request finds the token expired
+                with self.lock:
+                    self.stats['refresh_failures'] += 1
+                logger.warning(f"Background token refresh failed: {e}")
+                wait = RETRY_SECONDS
+            wait = max(wait, 1)
+
+    def close(self):
+        """
+        Stop the refresh thread and drop the client
+        """
+        self.stop_event.set()
+        with self.lock:
+            self._client = None
+            self.credentials = None
+        self.token_session.close()
@@ -0,0 +1,178 @@
+"""
+Concurrent fetching of many worksheets across several spreadsheets.
+
+fetch_worksheets() takes (sheet URL, worksheet name) targets, groups them by
+spreadsheet and loads each group with SheetSync.load_many(): one revision check
+and one values.batchGet request per spreadsheet. Spreadsheets are fetched in
+parallel, at most MAX_CONCURRENT_FETCHES at a time. Every API request goes
+through a QuotaLimiter that keeps within the per-minute read quota and retries
+rate-limited requests with backoff. The results are stacked into one DataFrame
+with a Source column naming the worksheet each row came from.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from sheets_sync import WorksheetNotFound, sheet_id_from_url
+
+logger = logging.getLogger(__name__)
+
+# Spreadsheets fetched at the same time
+MAX_CONCURRENT_FETCHES = int(os.getenv('SHEETS_MAX_CONCURRENT_FETCHES', '4'))
+# Sheets API read quota per user per minute
+REQUESTS_PER_MINUTE = int(os.getenv('SHEETS_REQUESTS_PER_MINUTE', '60'))
+# Retries of a request rejected with HTTP 429
+MAX_RETRIES = 4
+MAX_BACKOFF_SECONDS = 32
+# Column naming the worksheet each row came from
+SOURCE_COLUMN = 'Source'
+
+
+def is_rate_limited(error):
+    """
+    Whether an API error is a quota rejection (HTTP 429)
+    """
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) == 429
+
+
+class QuotaLimiter:
+    """
+    Token bucket of API requests shared by all fetch threads
+
+    Up to requests_per_minute requests may go out at once; after that, requests
+    wait for the bucket to refill at requests_per_minute / 60 per second.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, max_retries=MAX_RETRIES):
+        self.capacity = max(1, requests_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'waited_seconds': 0.0, 'retries': 0}
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Take the token now, even if it is still to come, so waiters queue up in order
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+            self.stats['requests'] += 1
+            self.stats['waited_seconds'] += wait
+        if wait:
+            time.sleep(wait)
+
+    def call(self, func, *args, **kwargs):
+        """
+        Run one API request within the quota, retrying it with backoff on HTTP 429
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not is_rate_limited(e):
+                    raise
+                backoff = min(2 ** attempt + random.random(), MAX_BACKOFF_SECONDS)
+                with self.lock:
+                    self.stats['retries'] += 1
+                logger.warning(f"Sheets API quota exceeded, retrying in {backoff:.1f}s")
+                time.sleep(backoff)
+
+
+def target_labels(targets):
+    """
+    Source label of each target: its worksheet name, or sheet id/worksheet where names repeat
+    """
+    names = [worksheet_name for _, worksheet_name in targets]
+    return [
+        worksheet_name if names.count(worksheet_name) == 1 else f"{sheet_id_from_url(sheet_url)}/{worksheet_name}"
+        for sheet_url, worksheet_name in targets
+    ]
+
+
+def with_types(df):
+    """
+    Convert text columns holding only numbers to numbers, and Source to a category
+    """
+    for col in df.columns:
+        if col == SOURCE_COLUMN or pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        numbers = pd.to_numeric(df[col], errors='coerce')
+        if numbers.notna().sum() == df[col].notna().sum():
+            df[col] = numbers
+    df[SOURCE_COLUMN] = df[SOURCE_COLUMN].astype('category')
+    return df
+
+
+def fetch_worksheets(sync, client, targets, append_only=False, max_workers=MAX_CONCURRENT_FETCHES, limiter=None):
+    """
+    Fetch (sheet URL, worksheet name) targets concurrently into one DataFrame
+
+    Rows keep the target order and get a Source column (a sheet's own Source
+    column is renamed Source_original). Targets that fail, including worksheets
+    missing from their spreadsheet, are left out and listed in df.attrs['errors']
+    as {label: message}; the other worksheets of the same spreadsheet still load.
+    If every target fails, the first error is raised.
+    """
+    targets = [tuple(target) for target in dict.fromkeys(tuple(target) for target in targets)]
+    if not targets:
+        raise ValueError("No worksheets to fetch")
+    limiter = limiter or QuotaLimiter()
+
+    groups = OrderedDict()
+    for sheet_url, worksheet_name in targets:
+        groups.setdefault(sheet_id_from_url(sheet_url), (sheet_url, []))[1].append(worksheet_name)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(groups)))) as pool:
+        futures = {
+            sheet_id: pool.submit(sync.load_many, client, sheet_url, worksheet_names, append_only, limiter)
+            for sheet_id, (sheet_url, worksheet_names) in groups.items()
+        }
+        results = {}
+        failures = {}
+        for sheet_id, future in futures.items():
+            try:
+                results[sheet_id] = future.result()
+            except Exception as e:
+                failures[sheet_id] = e
+
+    frames = []
+    errors = {}
+    first_error = None
+    for (sheet_url, worksheet_name), label in zip(targets, target_labels(targets)):
+        sheet_id = sheet_id_from_url(sheet_url)
+        if sheet_id in failures:
+            first_error = first_error or failures[sheet_id]
+            errors[label] = str(failures[sheet_id])
+            continue
+        df = results[sheet_id].get(worksheet_name)
+        if df is None:
+            error = WorksheetNotFound(f"Worksheet not found: {worksheet_name}")
+            first_error = first_error or error
+            errors[label] = str(error)
+            continue
+        if SOURCE_COLUMN in df.columns:
+            # Keep the sheet's own column under another name
+            df = df.rename(columns={SOURCE_COLUMN: f"{SOURCE_COLUMN}_original"})
+        df.insert(0, SOURCE_COLUMN, label)
+        frames.append(df)
+
+    if not frames:
+        raise first_error
+    logger.info(f"Fetched {len(frames)} worksheets from {len(groups)} spreadsheets in {time.perf_counter() - start:.2f}s")
+
+    combined = with_types(pd.concat(frames, ignore_index=True))
+    combined.attrs['errors'] = errors
+    return combined
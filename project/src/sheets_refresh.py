@@ -0,0 +1,124 @@
+"""
+Stale-while-revalidate cache for data loaded from Google Sheets.
+
+get() returns the cached frame immediately. Once it is older than the TTL, a
+background thread reloads it, and the reloaded frame is served from the next
+call on. Only the very first load of a key waits for the Sheets API. If a
+refresh fails, the last good frame keeps being served and the error is reported
+with it.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Age after which a cached frame is refreshed in the background
+REFRESH_TTL_SECONDS = float(os.getenv('SHEETS_REFRESH_TTL_SECONDS', '300'))
+# Keys whose frames are kept; the least recently used are dropped
+MAX_REFRESH_ENTRIES = 16
+
+
+class RefreshEntry:
+    """
+    Cached frame of one key plus its refresh state
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.loaded_at = None
+        self.attempted_at = None
+        self.error = None
+        self.refreshing = False
+        self.load_lock = threading.Lock()
+
+    def info(self):
+        now = time.time()
+        return {
+            'loaded_at': self.loaded_at,
+            'age_seconds': now - self.loaded_at if self.loaded_at is not None else None,
+            'refreshing': self.refreshing,
+            'error': self.error,
+        }
+
+
+class BackgroundRefresher:
+    """
+    Serves cached frames and refreshes them in the background once older than the TTL
+    """
+
+    def __init__(self, load, ttl_seconds=REFRESH_TTL_SECONDS, max_entries=MAX_REFRESH_ENTRIES):
+        """
+        load is called with the key's items and returns the frame; it runs in
+        background threads, so it must not call Streamlit
+        """
+        self.load = load
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _entry(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = RefreshEntry()
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                # A refresh still running for a dropped key just finishes unseen
+                self.entries.popitem(last=False)
+            return entry
+
+    def _load(self, key, entry):
+        entry.attempted_at = time.time()
+        start = time.perf_counter()
+        try:
+            frame = self.load(*key)
+        except Exception as e:
+            entry.error = str(e)
+            logger.warning(f"Refreshing {key} failed: {e}")
+            return
+        entry.frame = frame
+        entry.loaded_at = time.time()
+        entry.error = None
+        logger.info(f"Refreshed {key} in {time.perf_counter() - start:.2f}s")
+
+    def _refresh_in_background(self, key, entry):
+        try:
+            with entry.load_lock:
+                self._load(key, entry)
+        finally:
+            entry.refreshing = False
+
+    def refresh(self, key):
+        """
+        Start a background refresh of key unless one is already running
+
+        Does nothing for a key that has not been loaded yet: its first load
+        happens in get().
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.attempted_at is None or entry.refreshing:
+                return
+            entry.refreshing = True
+        threading.Thread(target=self._refresh_in_background, args=(key, entry), daemon=True).start()
+
+    def get(self, key, ttl_seconds=None):
+        """
+        Cached frame of key (None if it never loaded) and its info dict
+
+        The first call for a key loads it synchronously; later calls never wait.
+        """
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        entry = self._entry(key)
+        if entry.frame is None and entry.attempted_at is None:
+            with entry.load_lock:
+                if entry.attempted_at is None:
+                    self._load(key, entry)
+        elif time.time() - entry.attempted_at >= ttl:
+            # Timed from the last attempt, so a failing source is retried once per TTL
+            self.refresh(key)
+        return entry.frame, entry.info()
@@ -0,0 +1,380 @@
+"""
+Incremental Google Sheets sync with a local columnar cache.
+
+Each worksheet is kept as a DataFrame in memory and, when pyarrow is installed,
+as a Parquet file on disk, together with the spreadsheet revision (its Drive
+modified time) it was read at. A load first checks that revision: if the
+spreadsheet has not changed since the last sync, the cached frame is returned
+without reading any values.
+
+When it has changed, the header and data rows are read with one values.batchGet
+request, and the rows are hashed in blocks of BLOCK_ROWS. With append_only=True
+only the header, the last cached block and the rows after it are read; if those
+show that anything but new rows changed, a full read follows. Edits above the last
+block are then picked up by the next full read, at most FULL_SYNC_SECONDS later.
+
+Several worksheets of one spreadsheet can be loaded together with load_many():
+one revision check and one values.batchGet request cover all of them.
+
+The client only needs gspread's open_by_key(), Spreadsheet.worksheets(),
+Spreadsheet.values_batch_get() and lastUpdateTime (or get_lastUpdateTime() in
+gspread 6), so a local fake client works as well.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:  # optional: needed to keep the cache on disk between restarts
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# Rows per block; a block is the unit of change detection
+BLOCK_ROWS = int(os.getenv('SHEETS_SYNC_BLOCK_ROWS', '500'))
+# Longest time append-only syncs may go without a full read
+FULL_SYNC_SECONDS = float(os.getenv('SHEETS_FULL_SYNC_SECONDS', '3600'))
+# Directory of the on-disk cache; empty to keep it in memory only
+CACHE_DIR = os.getenv('SHEETS_CACHE_DIR', '.sheets_cache')
+# Worksheets kept in memory
+MAX_CACHED_SHEETS = 16
+# Locks serialising loads of the same worksheet; keys share them by hash, so their number stays fixed
+LOCK_STRIPES = 64
+
+# Numbers as numbers, dates as the text shown in the sheet
+VALUE_PARAMS = {'valueRenderOption': 'UNFORMATTED_VALUE', 'dateTimeRenderOption': 'FORMATTED_STRING'}
+
+
+def sheet_id_from_url(sheet_url):
+    """
+    Spreadsheet id from a Google Sheets URL (a bare id is returned as is)
+    """
+    if '/d/' in sheet_url:
+        return sheet_url.split('/d/')[1].split('/')[0]
+    return sheet_url.strip()
+
+
+def get_revision(spreadsheet):
+    """
+    Last modified time of the spreadsheet, or None if it cannot be read
+    """
+    try:
+        if hasattr(spreadsheet, 'get_lastUpdateTime'):
+            return spreadsheet.get_lastUpdateTime()
+        return spreadsheet.lastUpdateTime
+    except Exception as e:
+        logger.warning(f"Could not read spreadsheet revision: {e}")
+        return None
+
+
+def row_range(title, first_row, last_row):
+    """
+    A1 range of whole rows, e.g. 'Sheet1'!2:501
+    """
+    quoted = title.replace("'", "''")
+    return f"'{quoted}'!{first_row}:{last_row}"
+
+
+def call(limiter, func, *args, **kwargs):
+    """
+    Run an API request, through the limiter if there is one
+    """
+    if limiter is None:
+        return func(*args, **kwargs)
+    return limiter.call(func, *args, **kwargs)
+
+
+def block_hash(rows):
+    return hashlib.sha1(json.dumps(rows, default=str).encode('utf-8')).hexdigest()
+
+
+def split_blocks(rows, block_rows):
+    return [rows[start:start + block_rows] for start in range(0, len(rows), block_rows)]
+
+
+def rows_to_frame(header, rows):
+    """
+    DataFrame from rows of cell values, like get_all_records: blank and missing cells are ''
+    """
+    width = len(header)
+    padded = [list(row[:width]) + [''] * (width - len(row)) for row in rows]
+    return pd.DataFrame(padded, columns=header).infer_objects()
+
+
+class WorksheetNotFound(ValueError):
+    """
+    Raised when a requested worksheet does not exist in the spreadsheet
+    """
+
+
+class SheetCache:
+    """
+    Cached copy of one worksheet
+    """
+
+    def __init__(self, header, frame, block_hashes, revision, full_synced_at):
+        self.header = header
+        self.frame = frame
+        self.block_hashes = block_hashes
+        self.revision = revision
+        self.full_synced_at = full_synced_at
+        self.synced_at = time.time()
+
+
+class SheetSync:
+    """
+    Loads worksheets into DataFrames, reading only what changed since the last load
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, block_rows=BLOCK_ROWS):
+        self.cache_dir = cache_dir if pyarrow is not None else None
+        self.block_rows = max(1, block_rows)
+        self.sheets = OrderedDict()  # (sheet id, worksheet name) -> SheetCache
+        self.locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self.lock = threading.Lock()
+        self.stats = {
+            'loads': 0,
+            'unchanged': 0,
+            'full_syncs': 0,
+            'append_syncs': 0,
+            'requests': 0,
+            'rows_fetched': 0,
+        }
+
+    def _count(self, **counts):
+        """
+        Add to the stats; loads run in several threads at once
+        """
+        with self.lock:
+            for name, count in counts.items():
+                self.stats[name] += count
+
+    def _key_locks(self, keys):
+        """
+        The lock stripes of the keys, each once and in a fixed order, so concurrent loads cannot deadlock
+        """
+        return [self.locks[index] for index in sorted({hash(key) % len(self.locks) for key in keys})]
+
+    def _paths(self, key):
+        name = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()[:16]
+        base = os.path.join(self.cache_dir, name)
+        return f"{base}.parquet", f"{base}.json"
+
+    def _get_cached(self, key):
+        with self.lock:
+            entry = self.sheets.get(key)
+            if entry is not None:
+                self.sheets.move_to_end(key)
+                return entry
+        if not self.cache_dir:
+            return None
+
+        frame_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            frame = pd.read_parquet(frame_path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable sheet cache {meta_path}: {e}")
+            return None
+        entry = SheetCache(meta['header'], frame, meta['block_hashes'], meta['revision'], meta['full_synced_at'])
+        self._remember(key, entry, persist=False)
+        return entry
+
+    def _remember(self, key, entry, persist=True):
+        with self.lock:
+            self.sheets[key] = entry
+            self.sheets.move_to_end(key)
+            while len(self.sheets) > MAX_CACHED_SHEETS:
+                self.sheets.popitem(last=False)
+        if not (persist and self.cache_dir):
+            return
+
+        frame_path, meta_path = self._paths(key)
+        meta = {
+            'header': entry.header,
+            'block_hashes': entry.block_hashes,
+            'revision': entry.revision,
+            'full_synced_at': entry.full_synced_at,
+        }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            entry.frame.to_parquet(frame_path, index=False)
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        except Exception as e:
+            # Mixed-type columns cannot be written to Parquet; the memory cache still works
+            logger.warning(f"Could not write sheet cache {frame_path}: {e}")
+
+    def _read(self, spreadsheet, plans, limiter=None):
+        """
+        Values of every range of every plan ({key: ranges}) from one values.batchGet request
+        """
+        ranges = [a1 for plan in plans.values() for a1 in plan]
+        response = call(limiter, spreadsheet.values_batch_get, ranges, params=VALUE_PARAMS)
+        values = [value_range.get('values', []) for value_range in response.get('valueRanges', [])]
+        values += [[] for _ in range(len(ranges) - len(values))]
+        self._count(requests=1, rows_fetched=sum(len(rows) for rows in values))
+
+        results = {}
+        position = 0
+        for key, plan in plans.items():
+            results[key] = values[position:position + len(plan)]
+            position += len(plan)
+        return results
+
+    def _full_ranges(self, worksheet):
+        return [
+            row_range(worksheet.title, 1, 1),
+            row_range(worksheet.title, 2, max(worksheet.row_count, 2)),
+        ]
+
+    def _full_result(self, values, revision):
+        header_rows, rows = values
+        header = [str(name) for name in header_rows[0]] if header_rows else []
+        self._count(full_syncs=1)
+        return SheetCache(header, rows_to_frame(header, rows),
+                          [block_hash(block) for block in split_blocks(rows, self.block_rows)], revision, time.time())
+
+    def _append_ranges(self, worksheet, entry):
+        """
+        The header plus everything from the last cached block on
+        """
+        first_row = 2 + max(len(entry.block_hashes) - 1, 0) * self.block_rows
+        return [
+            row_range(worksheet.title, 1, 1),
+            row_range(worksheet.title, first_row, max(worksheet.row_count, first_row)),
+        ]
+
+    def _append_result(self, values, entry, revision):
+        """
+        Cache with the new rows appended; None if the header or older rows changed
+        """
+        header_rows, tail = values
+        header = [str(name) for name in header_rows[0]] if header_rows else []
+        if header != entry.header:
+            return None
+
+        kept_blocks = max(len(entry.block_hashes) - 1, 0)
+        cached_tail = len(entry.frame) - kept_blocks * self.block_rows
+        if entry.block_hashes and block_hash(tail[:cached_tail]) != entry.block_hashes[-1]:
+            return None
+
+        self._count(append_syncs=1)
+        head = entry.frame.iloc[:kept_blocks * self.block_rows]
+        frame = pd.concat([head, rows_to_frame(header, tail)], ignore_index=True).infer_objects()
+        block_hashes = entry.block_hashes[:kept_blocks] + [block_hash(block) for block in split_blocks(tail, self.block_rows)]
+        return SheetCache(header, frame, block_hashes, revision, entry.full_synced_at)
+
+    def _worksheets(self, spreadsheet, names, limiter=None):
+        """
+        The worksheets among names that exist, from one metadata request
+        """
+        worksheets = {worksheet.title: worksheet for worksheet in call(limiter, spreadsheet.worksheets)}
+        return {name: worksheets[name] for name in names if name in worksheets}
+
+    def _sync(self, spreadsheet, stale, entries, revision, append_only, limiter=None):
+        """
+        Read the changed worksheets: append-only reads first, then full reads, one batch each
+        """
+        worksheets = self._worksheets(spreadsheet, [key[1] for key in stale], limiter)
+        stale = [key for key in stale if key[1] in worksheets]
+        now = time.time()
+        appends = {
+            key: self._append_ranges(worksheets[key[1]], entries[key]) for key in stale
+            if entries[key] is not None and append_only and now - entries[key].full_synced_at < FULL_SYNC_SECONDS
+        }
+        updated = {}
+        if appends:
+            for key, values in self._read(spreadsheet, appends, limiter).items():
+                result = self._append_result(values, entries[key], revision)
+                if result is not None:
+                    updated[key] = result
+
+        fulls = {key: self._full_ranges(worksheets[key[1]]) for key in stale if key not in updated}
+        if fulls:
+            for key, values in self._read(spreadsheet, fulls, limiter).items():
+                updated[key] = self._full_result(values, revision)
+        return updated
+
+    def load_many(self, client, sheet_url, worksheet_names, append_only=False, limiter=None):
+        """
+        Load several worksheets of one spreadsheet, as {worksheet name: DataFrame}
+
+        The spreadsheet is opened and its revision checked once, and the changed
+        worksheets are read together in one values.batchGet request. Worksheets
+        that do not exist are left out of the result. limiter, if given, is a
+        QuotaLimiter (see sheets_fetch.py) every API request goes through.
+        """
+        sheet_id = sheet_id_from_url(sheet_url)
+        keys = [(sheet_id, name) for name in dict.fromkeys(worksheet_names)]
+        self._count(loads=len(keys))
+
+        with ExitStack() as stack:
+            for lock in self._key_locks(keys):
+                stack.enter_context(lock)
+
+            entries = {key: self._get_cached(key) for key in keys}
+            spreadsheet = call(limiter, client.open_by_key, sheet_id)
+            revision = call(limiter, get_revision, spreadsheet)
+
+            frames = {}
+            stale = []
+            for key in keys:
+                entry = entries[key]
+                if entry is not None and revision is not None and entry.revision == revision:
+                    self._count(unchanged=1)
+                    entry.synced_at = time.time()
+                    frames[key[1]] = entry.frame.copy()
+                else:
+                    stale.append(key)
+            if not stale:
+                return frames
+
+            updated = self._sync(spreadsheet, stale, entries, revision, append_only, limiter)
+            for key in updated:
+                entry = entries[key]
+                if entry is not None:
+                    changed = sum(
+                        1 for i, digest in enumerate(updated[key].block_hashes)
+                        if i >= len(entry.block_hashes) or entry.block_hashes[i] != digest
+                    )
+                    logger.info(f"Synced {key[1]}: {changed} of {len(updated[key].block_hashes)} blocks changed")
+                self._remember(key, updated[key])
+                frames[key[1]] = updated[key].frame.copy()
+            return frames
+
+    def load(self, client, sheet_url, worksheet_name="Sheet1", append_only=False, limiter=None):
+        """
+        Load a worksheet as a DataFrame, reading values only if the spreadsheet changed
+
+        With append_only, a changed sheet is first read from its last cached block on.
+        """
+        frames = self.load_many(client, sheet_url, [worksheet_name], append_only, limiter)
+        if worksheet_name not in frames:
+            raise WorksheetNotFound(f"Worksheet not found: {worksheet_name}")
+        return frames[worksheet_name]
+
+    def invalidate(self, sheet_url, worksheet_name="Sheet1"):
+        """
+        Forget the cached copy of a worksheet, so the next load reads it in full
+        """
+        key = (sheet_id_from_url(sheet_url), worksheet_name)
+        with self.lock:
+            self.sheets.pop(key, None)
+        if self.cache_dir:
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
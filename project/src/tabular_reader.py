@@ -0,0 +1,66 @@
+"""
+Format-sniffing reader for uploaded financial data files.
+
+Excel uploads are parsed with openpyxl. CSV, Parquet and Arrow IPC (Feather)
+uploads go through the much faster columnar readers. The format is detected
+from the file's leading bytes, not from its name.
+"""
+import pandas as pd
+from io import BytesIO
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # optional: needed for Parquet/Arrow uploads and the fast CSV engine
+    pa = None
+
+SUPPORTED_UPLOAD_TYPES = ['xlsx', 'xls', 'csv', 'parquet', 'arrow', 'feather']
+
+# Leading bytes identifying each binary format; anything else is read as CSV
+FILE_SIGNATURES = [
+    (b'PK\x03\x04', 'xlsx'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'xls'),
+    (b'PAR1', 'parquet'),
+    (b'ARROW1', 'arrow'),
+    (b'\xff\xff\xff\xff', 'arrow_stream'),
+]
+
+
+def detect_format(content):
+    """
+    Sniff the file format from its leading bytes
+    """
+    for signature, file_format in FILE_SIGNATURES:
+        if content.startswith(signature):
+            return file_format
+    return 'csv'
+
+
+def read_table(uploaded_file, index_col=None):
+    """
+    Read an uploaded Excel, CSV, Parquet or Arrow file into a DataFrame
+
+    index_col selects the column (by position) to use as the index, as in pd.read_excel.
+    """
+    content = uploaded_file.getvalue() if hasattr(uploaded_file, 'getvalue') else uploaded_file.read()
+    file_format = detect_format(content)
+
+    if file_format == 'xlsx':
+        return pd.read_excel(BytesIO(content), engine='openpyxl', index_col=index_col)
+    if file_format == 'xls':
+        return pd.read_excel(BytesIO(content), index_col=index_col)
+    if file_format == 'csv':
+        return pd.read_csv(BytesIO(content), index_col=index_col, engine='pyarrow' if pa is not None else 'c')
+
+    if pa is None:
+        raise ValueError(f"Reading {file_format} files requires pyarrow")
+    if file_format == 'parquet':
+        df = pd.read_parquet(BytesIO(content))
+    elif file_format == 'arrow':
+        df = pd.read_feather(BytesIO(content))
+    else:
+        df = pa.ipc.open_stream(pa.BufferReader(content)).read_all().to_pandas()
+
+    if index_col is not None:
+        df = df.set_index(df.columns[index_col])
+    return df
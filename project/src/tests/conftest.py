@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The dashboard modules are run as top-level scripts from project/src
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
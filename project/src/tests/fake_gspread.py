@@ -0,0 +1,62 @@
+"""
+In-memory stand-in for the parts of gspread that sheets_sync.py uses.
+
+Every values_batch_get() request is recorded in Spreadsheet.requests, and any
+change to the cells moves lastUpdateTime on, like the Drive modified time.
+"""
+import re
+
+RANGE = re.compile(r"^'(?P<title>(?:[^']|'')*)'!(?P<first>\d+):(?P<last>\d+)$")
+
+
+class FakeWorksheet:
+    def __init__(self, title, rows, row_count=1000):
+        self.title = title
+        self.rows = [list(row) for row in rows]
+        self.row_count = row_count
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheets):
+        self.sheets = {worksheet.title: worksheet for worksheet in worksheets}
+        self.revision = 1
+        self.requests = []
+
+    @property
+    def lastUpdateTime(self):
+        return f"2024-01-01T00:00:{self.revision:02d}Z"
+
+    def worksheets(self):
+        return list(self.sheets.values())
+
+    def worksheet(self, title):
+        return self.sheets[title]
+
+    def values_batch_get(self, ranges, params=None):
+        self.requests.append(list(ranges))
+        value_ranges = []
+        for a1 in ranges:
+            match = RANGE.match(a1)
+            rows = self.sheets[match['title'].replace("''", "'")].rows
+            values = [list(row) for row in rows[int(match['first']) - 1:int(match['last'])]]
+            value_range = {'range': a1}
+            if values:
+                value_range['values'] = values
+            value_ranges.append(value_range)
+        return {'valueRanges': value_ranges}
+
+    def append_rows(self, title, rows):
+        self.sheets[title].rows.extend(list(row) for row in rows)
+        self.revision += 1
+
+    def update_row(self, title, row_number, values):
+        self.sheets[title].rows[row_number - 1] = list(values)
+        self.revision += 1
+
+
+class FakeClient:
+    def __init__(self, spreadsheets):
+        self.spreadsheets = spreadsheets
+
+    def open_by_key(self, key):
+        return self.spreadsheets[key]
@@ -0,0 +1,29 @@
+import pandas as pd
+
+import financial_metrics
+from financial_metrics import compute_metrics
+
+
+def test_yoy_compares_with_the_last_period_of_the_date_a_year_before():
+    df = pd.DataFrame({
+        'Date': ['2023-01-31', '2023-01-31', '2024-01-31'],
+        'Revenue': [50, 100, 150],
+    })
+    metrics = compute_metrics(df)
+    assert metrics.period(-1)['revenue_yoy'] == 50.0
+    assert metrics.for_date('2023-01-31')['total_revenue'] == 100.0
+
+
+def test_same_frame_is_hashed_once(monkeypatch):
+    df = pd.DataFrame({'Date': ['2024-01-31', '2024-02-29'], 'Revenue': [1, 2]})
+    calls = []
+    original = financial_metrics.fingerprint
+    monkeypatch.setattr(financial_metrics, 'fingerprint', lambda frame: calls.append(1) or original(frame))
+
+    first = compute_metrics(df)
+    assert compute_metrics(df) is first
+    assert len(calls) == 1
+
+    # An equal copy is a different object: hashed, but its metrics are reused
+    assert compute_metrics(df.copy()) is first
+    assert len(calls) == 2
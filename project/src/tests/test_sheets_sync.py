@@ -0,0 +1,115 @@
+import pandas as pd
+import pytest
+
+from fake_gspread import FakeClient, FakeSpreadsheet, FakeWorksheet
+from sheets_sync import SheetSync, WorksheetNotFound
+
+SHEET_URL = 'https://docs.google.com/spreadsheets/d/abc123/edit#gid=0'
+HEADER = ['Date', 'Revenue']
+
+
+def make_rows(count, start=0):
+    return [[f"2024-01-{day + 1:02d}", 100 + day] for day in range(start, start + count)]
+
+
+@pytest.fixture
+def spreadsheet():
+    return FakeSpreadsheet([FakeWorksheet('Data', [HEADER] + make_rows(5))])
+
+
+@pytest.fixture
+def client(spreadsheet):
+    return FakeClient({'abc123': spreadsheet})
+
+
+def test_unchanged_revision_reads_no_values(spreadsheet, client):
+    sync = SheetSync(cache_dir='', block_rows=2)
+    first = sync.load(client, SHEET_URL, 'Data')
+    assert len(spreadsheet.requests) == 1
+
+    second = sync.load(client, SHEET_URL, 'Data')
+    assert len(spreadsheet.requests) == 1
+    assert sync.stats['unchanged'] == 1
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_append_reads_only_the_tail(spreadsheet, client):
+    sync = SheetSync(cache_dir='', block_rows=2)
+    sync.load(client, SHEET_URL, 'Data', append_only=True)
+    spreadsheet.append_rows('Data', make_rows(2, start=5))
+
+    frame = sync.load(client, SHEET_URL, 'Data', append_only=True)
+    # Rows 2-6 were cached in blocks of 2, so the last block starts at row 6
+    assert spreadsheet.requests[-1] == ["'Data'!1:1", "'Data'!6:1000"]
+    assert len(spreadsheet.requests) == 2
+    assert sync.stats['append_syncs'] == 1
+    assert sync.stats['full_syncs'] == 1
+    assert frame['Revenue'].tolist() == [100, 101, 102, 103, 104, 105, 106]
+
+
+def test_tail_edit_falls_back_to_a_full_read(spreadsheet, client):
+    sync = SheetSync(cache_dir='', block_rows=2)
+    sync.load(client, SHEET_URL, 'Data', append_only=True)
+    spreadsheet.update_row('Data', 6, ['2024-01-05', 999])
+
+    frame = sync.load(client, SHEET_URL, 'Data', append_only=True)
+    assert spreadsheet.requests[1:] == [
+        ["'Data'!1:1", "'Data'!6:1000"],
+        ["'Data'!1:1", "'Data'!2:1000"],
+    ]
+    assert sync.stats['append_syncs'] == 0
+    assert sync.stats['full_syncs'] == 2
+    assert frame['Revenue'].tolist() == [100, 101, 102, 103, 999]
+
+
+def test_reload_from_parquet_cache(spreadsheet, client, tmp_path):
+    pytest.importorskip('pyarrow')
+    first = SheetSync(cache_dir=str(tmp_path), block_rows=2).load(client, SHEET_URL, 'Data')
+    assert len(spreadsheet.requests) == 1
+
+    # A new process starts with an empty memory cache
+    sync = SheetSync(cache_dir=str(tmp_path), block_rows=2)
+    frame = sync.load(client, SHEET_URL, 'Data')
+    assert len(spreadsheet.requests) == 1
+    assert sync.stats['unchanged'] == 1
+    pd.testing.assert_frame_equal(frame, first)
+
+    spreadsheet.append_rows('Data', make_rows(1, start=5))
+    frame = sync.load(client, SHEET_URL, 'Data', append_only=True)
+    assert spreadsheet.requests[-1] == ["'Data'!1:1", "'Data'!6:1000"]
+    assert len(frame) == 6
+
+
+def test_missing_worksheet_leaves_the_others(spreadsheet, client):
+    sync = SheetSync(cache_dir='', block_rows=2)
+    frames = sync.load_many(client, SHEET_URL, ['Data', 'Missing'])
+    assert list(frames) == ['Data']
+    with pytest.raises(WorksheetNotFound):
+        sync.load(client, SHEET_URL, 'Missing')
+
+
+def test_blank_cells_are_empty_strings_like_get_all_records(client):
+    spreadsheet = FakeSpreadsheet([FakeWorksheet('Data', [HEADER + ['Note'], ['2024-01-01', 100, ''], ['2024-01-02', '']])])
+    frame = SheetSync(cache_dir='').load(FakeClient({'abc123': spreadsheet}), SHEET_URL, 'Data')
+    assert frame.to_dict('records') == [
+        {'Date': '2024-01-01', 'Revenue': 100, 'Note': ''},
+        {'Date': '2024-01-02', 'Revenue': '', 'Note': ''},
+    ]
+
+
+def test_append_and_full_reads_give_the_same_frame(spreadsheet, client):
+    sync = SheetSync(cache_dir='', block_rows=2)
+    sync.load(client, SHEET_URL, 'Data', append_only=True)
+    spreadsheet.append_rows('Data', make_rows(2, start=5))
+    appended = sync.load(client, SHEET_URL, 'Data', append_only=True)
+    assert sync.stats['append_syncs'] == 1
+
+    full = SheetSync(cache_dir='', block_rows=2).load(client, SHEET_URL, 'Data')
+    pd.testing.assert_frame_equal(appended, full)
+
+
+def test_worksheet_locks_do_not_grow_with_keys(client):
+    sync = SheetSync(cache_dir='')
+    locks = list(sync.locks)
+    sync.load_many(client, SHEET_URL, [f"Sheet{i}" for i in range(200)] + ['Data'])
+    assert sync.locks == locks